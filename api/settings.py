@@ -16,6 +16,7 @@ import os
 from pathlib import Path
 import dj_database_url
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 env = environ.Env(  # <-- Updated!
     # set casting, default value
@@ -57,6 +58,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'drf_spectacular',
     'authentication',
@@ -111,6 +113,17 @@ DATABASES = {
     "default": env.db()
     }
 
+# Cache
+# Listing versions, feeds and payment stats live in the cache, so every gunicorn
+# worker and the payment worker must share it: set CACHE_URL (e.g. redis://host:6379/0).
+# The per process locmem cache is only good enough for DEBUG.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+if not DEBUG and CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    raise ImproperlyConfigured('CACHE_URL must point at a cache shared between processes (e.g. redis://) '
+                               'when DEBUG is off')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -224,6 +237,7 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 
 APP_DOMAIN = os.environ.get('APP_DOMAIN', "http://localhost:8000")
 FILE_UPLOAD_STORAGE = os.environ.get('FILE_UPLOAD_STORAGE', 'local')
+GEOCODER_BACKEND = os.environ.get('GEOCODER_BACKEND', 'utils.geocoding.StubGeocoder')
 
 if FILE_UPLOAD_STORAGE == 'local':
     # Local File Storage Settings
@@ -240,7 +254,13 @@ if FILE_UPLOAD_STORAGE == 's3':
     AWS_S3_FILE_OVERWRITE = False
     AWS_DEFAULT_ACL = None
     AWS_S3_VERIFY = True
-    DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+    # Point at a local S3 stand-in (minio, moto) for development and tests
+    AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL')
+    # DEFAULT_FILE_STORAGE was removed in Django 5.1
+    STORAGES = {
+        'default': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
 
 # Use Timezones for dates
 USE_TZ = True
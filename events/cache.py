@@ -0,0 +1,92 @@
+import hashlib
+import time
+from django.core.cache import cache
+
+from utils.conditional import make_etag
+from utils.constants import EVENT_LISTING_CACHE_TTL
+
+
+LISTING_VERSION_KEY = 'events:listings:version'
+LISTING_STATS_KEYS = {
+    'hits': 'events:listings:stats:hits',
+    'misses': 'events:listings:stats:misses',
+    'invalidations': 'events:listings:stats:invalidations',
+}
+
+
+def _incr(key: str) -> int:
+    ## incr fails on a missing key, add() is a no-op on an existing one
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def get_listing_version() -> int:
+    version = cache.get(LISTING_VERSION_KEY)
+    if version is None:
+        cache.add(LISTING_VERSION_KEY, 1, timeout=None)
+        version = cache.get(LISTING_VERSION_KEY, 1)
+    return version
+
+
+def bump_listing_version() -> int:
+    """
+    Invalidate every cached listing page at once.
+    Old entries are never read again and simply age out on their TTL.
+    """
+    _incr(LISTING_STATS_KEYS['invalidations'])
+    get_listing_version()
+    return _incr(LISTING_VERSION_KEY)
+
+
+def listing_cache_key(request, params, case_insensitive_params=()) -> str:
+    """
+    Build a cache key from the params the listing actually reads, so unrelated
+    or reordered query params share an entry. Filter values are matched with
+    iexact/icontains, so they are normalized to lower case.
+    """
+    normalized = []
+    for name in sorted(params):
+        value = request.query_params.get(name)
+        if value is None or value.strip() == '':
+            continue
+        value = value.strip()
+        if name in case_insensitive_params:
+            value = value.lower()
+        normalized.append(f'{name}={value}')
+
+    ## pagination links are absolute urls, so the host is part of the response
+    raw_key = '&'.join([request.get_host(), *normalized])
+    digest = hashlib.md5(raw_key.encode()).hexdigest()
+    return f'events:listings:v{get_listing_version()}:{digest}'
+
+
+def listing_etag(key: str) -> str:
+    """
+    The cache key already carries the listing version and the params. Time based
+    filters (upcoming) and late image variants change a page without a bump, so
+    the ETag also rolls over once per cache TTL.
+    """
+    return make_etag(key, int(time.time() // EVENT_LISTING_CACHE_TTL))
+
+
+def get_cached_listing(key: str):
+    data = cache.get(key)
+    _incr(LISTING_STATS_KEYS['hits'] if data is not None else LISTING_STATS_KEYS['misses'])
+    return data
+
+
+def set_cached_listing(key: str, data) -> None:
+    cache.set(key, data, timeout=EVENT_LISTING_CACHE_TTL)
+
+
+def get_listing_cache_stats() -> dict:
+    stats = {name: cache.get(key, 0) for name, key in LISTING_STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    stats['version'] = get_listing_version()
+    stats['ttl'] = EVENT_LISTING_CACHE_TTL
+    return stats
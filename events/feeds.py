@@ -0,0 +1,106 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import dateparse, timezone
+
+from .models import EVENT_STATUS_CHOICES, Event
+from .serializers import EventListingSerializer
+from utils.constants import UPCOMING_FEED_DAYS, UPCOMING_FEED_SIZE
+
+
+ALL_COUNTRIES = 'all'
+UPCOMING_FEED_KEY = 'events:upcoming:{country}'
+## countries the last full rebuild found upcoming events in, only those get a feed
+UPCOMING_FEED_COUNTRIES_KEY = 'events:upcoming:countries'
+
+
+def normalize_country(country) -> str:
+    country = (country or '').strip().lower()
+    return country or ALL_COUNTRIES
+
+
+def build_upcoming_feed(country=None) -> dict:
+    """
+    Serialize the active events starting in the next UPCOMING_FEED_DAYS for one
+    country (or every country) and store it without expiry. Feeds are replaced
+    by rebuild_upcoming_feeds on a schedule and after event writes.
+    """
+    country = normalize_country(country)
+    now = timezone.now()
+
+    events = Event.objects.filter(
+        status=EVENT_STATUS_CHOICES[1][0],
+        start_date__gte=now,
+        start_date__lt=now + timedelta(days=UPCOMING_FEED_DAYS),
+    )
+    if country != ALL_COUNTRIES:
+        events = events.filter(country__iexact=country)
+    events = events.order_by('start_date', 'id')[:UPCOMING_FEED_SIZE]
+
+    feed = {
+        'country': country,
+        'generated_at': now.isoformat(),
+        'results': EventListingSerializer(events, many=True).data,
+    }
+    cache.set(UPCOMING_FEED_KEY.format(country=country), feed, timeout=None)
+    return feed
+
+
+def empty_upcoming_feed(country) -> dict:
+    return {'country': country, 'generated_at': timezone.now().isoformat(), 'results': []}
+
+
+def get_upcoming_feed(country=None) -> dict:
+    """
+    The cached feed of `country`. A feed missing from the cache is only built
+    for a country the last full rebuild knows about (it was evicted), any other
+    country has no upcoming events and gets an empty feed that isn't cached.
+    """
+    country = normalize_country(country)
+    feed = cache.get(UPCOMING_FEED_KEY.format(country=country))
+    if feed is None:
+        countries = cache.get(UPCOMING_FEED_COUNTRIES_KEY)
+        if countries is None:
+            ## cold cache, one full rebuild covers every country with events
+            countries = rebuild_upcoming_feeds()
+            feed = cache.get(UPCOMING_FEED_KEY.format(country=country))
+        if feed is None:
+            if country not in countries:
+                return empty_upcoming_feed(country)
+            feed = build_upcoming_feed(country)
+
+    ## events that started since the last rebuild drop out without touching the table
+    now = timezone.now()
+    results = [event for event in feed['results']
+               if dateparse.parse_datetime(event['start_date']) >= now]
+    return {**feed, 'results': results}
+
+
+def rebuild_upcoming_feeds(countries=None) -> list:
+    """
+    Rebuild the feeds of `countries` (and the all-countries feed). Without
+    `countries` every country with upcoming events is rebuilt, becomes the
+    known set, and feeds of countries that no longer have any are dropped.
+    A partial rebuild adds `countries` to the known set.
+    """
+    full_rebuild = countries is None
+    if full_rebuild:
+        countries = Event.objects.filter(
+            status=EVENT_STATUS_CHOICES[1][0],
+            start_date__gte=timezone.now(),
+        ).values_list('country', flat=True).distinct()
+
+    rebuilt = {ALL_COUNTRIES} | {normalize_country(country) for country in countries}
+    for country in rebuilt:
+        build_upcoming_feed(country)
+
+    known = cache.get(UPCOMING_FEED_COUNTRIES_KEY)
+    if full_rebuild:
+        stale = set(known or ()) - rebuilt
+        cache.delete_many([UPCOMING_FEED_KEY.format(country=country) for country in stale])
+        cache.set(UPCOMING_FEED_COUNTRIES_KEY, sorted(rebuilt), timeout=None)
+    elif known is not None:
+        ## an event written in a new country has a feed from now on. Without a
+        ## known set the next read does a full rebuild, which finds it anyway
+        cache.set(UPCOMING_FEED_COUNTRIES_KEY, sorted(set(known) | rebuilt), timeout=None)
+
+    return sorted(rebuilt)
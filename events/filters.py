@@ -0,0 +1,104 @@
+import re
+from functools import reduce
+from operator import or_
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q, Subquery, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import SEARCH_CONFIG
+from utils import geohash
+from utils.constants import (DEFAULT_EVENT_SEARCH_RADIUS_KM, EVENT_SEARCH_CANDIDATES,
+                             MAXIMUM_EVENT_SEARCH_RADIUS_KM)
+
+
+class EventSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over Event.search_vector (GIN indexed).
+    Every term is prefix matched so partial words from the search box still hit.
+    Only the EVENT_SEARCH_CANDIDATES newest matches are ranked: a short prefix
+    matches a large part of the table and ranking all of it is what made search
+    slow, so results are the best of the newest matches, ordered by rank.
+    """
+
+    search_param = 'search'
+    search_term_pattern = re.compile(r'\w+')
+
+    def get_search_query(self, request):
+        params = request.query_params.get(self.search_param, '')
+        terms = self.search_term_pattern.findall(params.replace('_', ' '))
+        if not terms:
+            return None
+
+        ## "lag conc" => "lag:* & conc:*"
+        raw_query = ' & '.join(f'{term}:*' for term in terms)
+        return SearchQuery(raw_query, search_type='raw', config=SEARCH_CONFIG)
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if query is None:
+            return queryset
+
+        candidates = queryset.filter(
+            search_vector=query
+        ).order_by('-created_at', '-id').values('id')[:EVENT_SEARCH_CANDIDATES]
+
+        return queryset.filter(
+            id__in=Subquery(candidates)
+        ).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-created_at')
+
+
+class EventProximityFilter(BaseFilterBackend):
+    """
+    `?near=lat,lon&radius=km` filter.
+    Candidates come from a prefix match on the geohash cells covering the circle
+    (indexed), then an exact haversine distance drops the corners of the cells.
+    """
+
+    near_param = 'near'
+    radius_param = 'radius'
+
+    def get_point(self, request):
+        near = request.query_params.get(self.near_param)
+        if not near:
+            return None
+
+        try:
+            latitude, longitude = (float(value) for value in near.split(','))
+            radius = float(request.query_params.get(self.radius_param, DEFAULT_EVENT_SEARCH_RADIUS_KM))
+        except ValueError:
+            raise ParseError(f"'{self.near_param}' must be 'lat,lon' and '{self.radius_param}' a number of km")
+
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ParseError(f"'{self.near_param}' is out of range")
+        if not (0 < radius <= MAXIMUM_EVENT_SEARCH_RADIUS_KM):
+            raise ParseError(
+                f"'{self.radius_param}' must be between 0 and {MAXIMUM_EVENT_SEARCH_RADIUS_KM} km")
+
+        return latitude, longitude, radius
+
+    @staticmethod
+    def distance_expression(latitude, longitude):
+        ## haversine in km
+        half_dlat = Radians(F('latitude') - Value(latitude)) / 2
+        half_dlon = Radians(F('longitude') - Value(longitude)) / 2
+        a = Power(Sin(half_dlat), 2) + Cos(Radians(Value(latitude))) \
+            * Cos(Radians(F('latitude'))) * Power(Sin(half_dlon), 2)
+        return 2 * geohash.EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+    def filter_queryset(self, request, queryset, view):
+        point = self.get_point(request)
+        if point is None:
+            return queryset
+
+        latitude, longitude, radius = point
+        cells = geohash.covering_cells(latitude, longitude, radius)
+
+        return queryset.filter(
+            reduce(or_, (Q(geohash__startswith=cell) for cell in cells))
+        ).annotate(
+            distance=self.distance_expression(latitude, longitude)
+        ).filter(distance__lte=radius)
@@ -0,0 +1,131 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from events.filters import EventSearchFilter
+from events.models import EVENT_CATEGORY_CHOICES, EVENT_STATUS_CHOICES, Event
+from users.models import User
+
+
+WORDS = [
+    'lagos', 'abuja', 'nairobi', 'accra', 'london', 'music', 'concert', 'festival', 'comedy', 'night',
+    'live', 'jazz', 'afrobeats', 'summit', 'tech', 'startup', 'fashion', 'week', 'gallery', 'art',
+    'film', 'premiere', 'marathon', 'football', 'derby', 'workshop', 'masterclass', 'business', 'expo',
+    'conference', 'party', 'beach', 'rooftop', 'acoustic', 'orchestra', 'theatre', 'poetry', 'book',
+    'launch', 'hackathon', 'design', 'photography', 'food', 'market', 'wine', 'tasting', 'gospel',
+    'choir', 'dance', 'battle', 'carnival', 'parade', 'charity', 'gala', 'awards', 'summer', 'winter',
+    'sunset', 'sessions', 'unplugged',
+]
+LOCATIONS = [('Lagos', 'Lagos', 'Nigeria'), ('Ikeja', 'Lagos', 'Nigeria'), ('Abuja', 'FCT', 'Nigeria'),
+             ('Nairobi', 'Nairobi', 'Kenya'), ('Accra', 'Greater Accra', 'Ghana'),
+             ('London', 'England', 'United Kingdom')]
+
+
+class SearchFilterView:
+    ## what EventListingViewset used before EventSearchFilter
+    search_fields = ['title']
+
+
+class Command(BaseCommand):
+    help = ('Benchmark event search (EventSearchFilter) against the old SearchFilter on title, fails if '
+            'it is slower at p50 or p95. Seeds events in a transaction that is rolled back, nothing is kept.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=200, help='Searches timed per backend.')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--max-p95-ms', type=float,
+                            help='Fail when the full-text search p95 is above this.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def seed(self, events):
+        user = User.objects.create_user(email='search-benchmark@example.com', role='CREATOR')
+        categories = [choice[0] for choice in EVENT_CATEGORY_CHOICES]
+        statuses = [choice[0] for choice in EVENT_STATUS_CHOICES]
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO events (id, title, description, user_id, status, category, address, city, state,
+                                    country, default_image_variants, price, currency, payment_plan,
+                                    total_tickets, tickets_sold, tickets_held, created_at, updated_at)
+                SELECT gen_random_uuid(),
+                       initcap(w[1 + (random() * (n - 1))::int] || ' ' || w[1 + (random() * (n - 1))::int]
+                               || ' ' || w[1 + (random() * (n - 1))::int]),
+                       w[1 + (random() * (n - 1))::int] || ' ' || w[1 + (random() * (n - 1))::int]
+                               || ' with ' || w[1 + (random() * (n - 1))::int],
+                       %(user)s,
+                       -- mostly active, like production
+                       CASE WHEN random() < 0.8 THEN 'ACTIVE' ELSE s[1 + (random() * (array_length(s, 1) - 1))::int] END,
+                       c[1 + (random() * (array_length(c, 1) - 1))::int],
+                       'Benchmark address', l[1 + (g %% array_length(l, 1))][1], l[1 + (g %% array_length(l, 1))][2],
+                       l[1 + (g %% array_length(l, 1))][3], '{}', 0, 'NGN', 'FREE', 0, 0, 0,
+                       now() - (g || ' seconds')::interval, now()
+                FROM generate_series(1, %(events)s) g,
+                     (SELECT %(words)s::text[] w, %(n)s n, %(statuses)s::text[] s, %(categories)s::text[] c,
+                             %(locations)s::text[][] l) lists
+            """, {
+                'user': user.id, 'events': events, 'words': WORDS, 'n': len(WORDS),
+                'statuses': statuses, 'categories': categories, 'locations': [list(l) for l in LOCATIONS],
+            })
+            cursor.execute('ANALYZE events')
+
+    def time_searches(self, terms, build, page_size):
+        timings = []
+        for term in terms:
+            request = Request(APIRequestFactory().get('/', {'search': term}))
+            queryset = build(request, Event.objects.filter(
+                status=EVENT_STATUS_CHOICES[1][0]).order_by('-created_at', '-id'))
+            started = time.perf_counter()
+            list(queryset.values_list('id', flat=True)[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    @staticmethod
+    def summary(timings):
+        timings = sorted(timings)
+        return {
+            'p50': statistics.median(timings),
+            'p95': timings[max(int(len(timings) * 0.95) - 1, 0)],
+            'max': timings[-1],
+        }
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ## what a search box sends: whole words, prefixes and two-word queries
+        terms = []
+        for _ in range(options['queries']):
+            word = rng.choice(WORDS)
+            terms.append(rng.choice([word, word[:max(3, len(word) // 2)], f'{word} {rng.choice(WORDS)[:4]}']))
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.seed(options['events'])
+            self.stdout.write(f"Seeded {options['events']} events in {time.perf_counter() - started:.1f}s")
+
+            backends = {
+                'EventSearchFilter': lambda request, queryset: EventSearchFilter().filter_queryset(
+                    request, queryset, None),
+                'SearchFilter(title)': lambda request, queryset: SearchFilter().filter_queryset(
+                    request, queryset, SearchFilterView()),
+            }
+            results = {}
+            for name, build in backends.items():
+                ## one untimed pass warms the cache so both backends are measured the same way
+                self.time_searches(terms[:10], build, options['page_size'])
+                results[name] = self.summary(self.time_searches(terms, build, options['page_size']))
+                self.stdout.write('{:<20} p50 {p50:8.2f}ms  p95 {p95:8.2f}ms  max {max:8.2f}ms'.format(
+                    name, **results[name]))
+
+            transaction.set_rollback(True)
+
+        new, old = results['EventSearchFilter'], results['SearchFilter(title)']
+        slower = [name for name in ('p50', 'p95') if new[name] > old[name]]
+        if slower:
+            raise CommandError(f"EventSearchFilter is slower than SearchFilter at {', '.join(slower)}")
+        if options['max_p95_ms'] is not None and new['p95'] > options['max_p95_ms']:
+            raise CommandError(f"EventSearchFilter p95 {new['p95']:.2f}ms is above {options['max_p95_ms']}ms")
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, seeded events were rolled back'))
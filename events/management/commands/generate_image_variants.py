@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from events.models import Event
+from users.models import User
+from utils.images import generate_image_variants
+
+
+## name: (model, image field)
+IMAGE_FIELDS = {
+    'events': (Event, 'default_image'),
+    'users': (User, 'display_photo'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Build the image variants of rows that have an image but no variants, e.g. uploads from before '
+            'the variant pipeline or ones whose background build failed. --all rebuilds every image.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=list(IMAGE_FIELDS), help='Only this kind of image.')
+        parser.add_argument('--all', action='store_true', help='Rebuild images that already have variants.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        names = [options['only']] if options['only'] else list(IMAGE_FIELDS)
+        for name in names:
+            model, field_name = IMAGE_FIELDS[name]
+            rows = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+            if not options['all']:
+                rows = rows.filter(**{f'{field_name}_variants': {}})
+
+            built = failed = 0
+            for pk in rows.values_list('pk', flat=True).iterator(chunk_size=options['chunk_size']):
+                try:
+                    built += generate_image_variants(model, pk, field_name)
+                except Exception as error:
+                    ## a missing or broken original shouldn't stop the backfill
+                    failed += 1
+                    self.stderr.write(f'{name} {pk}: {error}')
+
+            self.stdout.write(self.style.SUCCESS(f'Built image variants for {built} {name}, {failed} failed'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from events.models import EVENT_STATUS_CHOICES, Event, SimilarEvent
+from events.similarity import refresh_similar_events
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the similar_events lookup table for every active event.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        ## neighbours of inactive events are never served
+        SimilarEvent.objects.exclude(event__status=EVENT_STATUS_CHOICES[1][0]).delete()
+
+        event_ids = Event.objects.filter(
+            status=EVENT_STATUS_CHOICES[1][0]
+        ).values_list('id', flat=True).iterator(chunk_size=options['chunk_size'])
+
+        total = 0
+        for event_id in event_ids:
+            refresh_similar_events(event_id)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt similar events for {total} events'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from events.feeds import rebuild_upcoming_feeds
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached "upcoming this week" feeds. Run on a schedule, e.g. hourly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--country', action='append', dest='countries',
+                            help='Only rebuild the feed for this country, may be repeated.')
+
+    def handle(self, *args, **options):
+        countries = rebuild_upcoming_feeds(options['countries'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt upcoming feeds: {", ".join(countries)}'))
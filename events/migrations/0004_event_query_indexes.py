@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    ## build on large live tables without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('events', '0003_event_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['-created_at', '-id'], name='events_active_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['user', 'status'], name='events_user_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='events_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:32
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_listed_events(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Event = apps.get_model('events', 'Event')
+
+    active_events = Event.objects.filter(
+        user=OuterRef('pk'), status='ACTIVE'
+    ).order_by().values('user').annotate(total=Count('id')).values('total')
+
+    User.objects.update(listed_events=Coalesce(Subquery(active_events), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_query_indexes'),
+        ('users', '0002_user_listed_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_listed_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_backfill_listed_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_events', to='events.event')),
+                ('similar_event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='events.event')),
+            ],
+            options={
+                'db_table': 'similar_events',
+                'indexes': [models.Index(fields=['event', '-score'], name='similar_events_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'similar_event'), name='similar_events_pair_unique')],
+            },
+        ),
+    ]
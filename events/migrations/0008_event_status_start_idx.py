@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:35
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('events', '0007_event_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['status', 'start_date'], name='events_status_start_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_status_start_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='default_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_event_tickets_sold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='tickets_held',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
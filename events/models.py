@@ -1,8 +1,11 @@
 import uuid
 from django.db import models
+from django.db.models import F, Q
 from django.utils import timezone
 from users.models import User
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
 
 EVENT_STATUS_CHOICES = [
@@ -41,6 +44,8 @@ CURRENCY_CHOICES = [
     ('KES', 'Kenyan Shilling'),
 ]
 
+SEARCH_CONFIG = 'english'
+
 def get_default_image_upload_path(instance, filename):
     name = "events"
     date = str(timezone.now().date())
@@ -66,11 +71,17 @@ class Event(models.Model):
     city = models.CharField(max_length=50, blank=True, null=True)
     state = models.CharField(max_length=50, blank=False)
     country = models.CharField(max_length=50, blank=False)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    ## utils.geohash cell of (latitude, longitude), prefix searched by proximity queries
+    geohash = models.CharField(max_length=12, null=True, blank=True)
 
     start_date = models.DateTimeField(null=True)
     end_date = models.DateTimeField(null=True)
 
     default_image = models.ImageField(upload_to=get_default_image_upload_path, null=True)
+    ## {variant: {format: storage name}}, filled in by utils.images
+    default_image_variants = models.JSONField(default=dict, blank=True)
 
     price = models.PositiveBigIntegerField(default=0)
     currency = models.CharField(
@@ -82,13 +93,98 @@ class Event(models.Model):
         max_length=255, 
         default=EVENT_PAYMENT_PLAN_CHOICES[0][0])
     ticket_link = models.URLField(max_length=500, null=True, blank=True)
+    ## 0 means unlimited
     total_tickets = models.PositiveIntegerField(default=0)
+    ## only ever changed through the ticket methods below and transactions.models.TicketHold
+    tickets_sold = models.PositiveIntegerField(default=0)
+    tickets_held = models.PositiveIntegerField(default=0)
+
+    ## maintained by postgres on every write, weighted title > description > location/category
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('city', 'state', 'category', weight='C', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'events'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='events_search_vector_idx'),
+            ## public listings only ever read active events, newest first
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(status=EVENT_STATUS_CHOICES[1][0]),
+                name='events_active_created_idx'),
+            models.Index(fields=['user', 'status'], name='events_user_status_idx'),
+            models.Index(fields=['status', 'start_date'], name='events_status_start_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='events_user_created_idx'),
+            models.Index(
+                fields=['geohash'],
+                opclasses=['varchar_pattern_ops'],
+                condition=models.Q(status=EVENT_STATUS_CHOICES[1][0]),
+                name='events_active_geohash_idx'),
+        ]
+
+    @staticmethod
+    def listed_events_delta(previous_status, status) -> int:
+        active = EVENT_STATUS_CHOICES[1][0]
+        return int(status == active) - int(previous_status == active)
+
+    @classmethod
+    def adjust_listed_events(cls, user_id, delta: int):
+        """
+        Keep User.listed_events in step with the creator's ACTIVE events. The
+        user's updated_at is not bumped, their If-Match would fail over a write
+        they didn't make; EventDetailView puts listed_events in its ETag.
+        """
+        if not delta:
+            return 0
+
+        return User.objects.filter(id=user_id).update(listed_events=F('listed_events') + delta)
+
+    @property
+    def tickets_available(self):
+        """None when the event is unlimited."""
+        if not self.total_tickets:
+            return None
+        return max(self.total_tickets - self.tickets_sold - self.tickets_held, 0)
+
+    @classmethod
+    def _with_capacity_for(cls, event_id, quantity: int):
+        return cls.objects.filter(
+            Q(total_tickets=0)
+            | Q(total_tickets__gte=F('tickets_sold') + F('tickets_held') + quantity),
+            id=event_id,
+        )
+
+    @classmethod
+    def reserve_tickets(cls, event_id, quantity: int) -> bool:
+        """
+        Take `quantity` tickets in one conditional UPDATE. Postgres rechecks the
+        capacity after waiting on a concurrent buyer's row lock, so the event can
+        never be oversold. False when there are not enough tickets left.
+        """
+        return cls._with_capacity_for(event_id, quantity).update(
+            tickets_sold=F('tickets_sold') + quantity) == 1
+
+    @classmethod
+    def hold_tickets(cls, event_id, quantity: int) -> bool:
+        """Same check as reserve_tickets, the tickets are counted as held instead."""
+        return cls._with_capacity_for(event_id, quantity).update(
+            tickets_held=F('tickets_held') + quantity) == 1
+
+    @classmethod
+    def release_tickets(cls, event_id, quantity: int) -> int:
+        """Give back tickets of a purchase that did not go through."""
+        return cls.objects.filter(
+            id=event_id, tickets_sold__gte=quantity
+        ).update(tickets_sold=F('tickets_sold') - quantity)
 
 
 class Review(models.Model):
@@ -99,4 +195,24 @@ class Review(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        db_table = 'reviews'
\ No newline at end of file
+        db_table = 'reviews'
+
+
+class SimilarEvent(models.Model):
+    """Precomputed top neighbours of an event, maintained by events.similarity."""
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='similar_events')
+    similar_event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'similar_events'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['event', 'similar_event'], name='similar_events_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['event', '-score'], name='similar_events_score_idx'),
+        ]
@@ -1,4 +1,5 @@
 import json
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.exceptions import ParseError
 
@@ -8,13 +9,23 @@ from users.models import User
 from utils.constants import (
     ALLOWABLE_NUMBER_OF_DOCUMENTS, ALLOWABLE_NUMBER_OF_IMAGES, ALLOWABLE_DOCUMENT_TYPES)
 from utils.date import (greater_than_today)
+from utils.constants import EVENT_GEOHASH_PRECISION, MAXIMUM_BULK_EVENT_IDS, MAXIMUM_IMAGE_UPLOAD_SIZE
+from utils.geocoding import get_geocoder
+from utils import geohash
+from utils.db import update_returning
+from utils.exceptions import PreconditionFailed
+from utils.images import ImageVariantField
+
+
+## search_vector is maintained by postgres and never returned to clients
+EVENT_VALUE_FIELDS = [field.attname for field in Event._meta.concrete_fields if not field.generated]
 
 
 
 class NewEventSerializer (serializers.ModelSerializer):
 
     def validate_file_size(value):
-        max_size = 8388608
+        max_size = MAXIMUM_IMAGE_UPLOAD_SIZE
         if value.size > max_size:
             raise serializers.ValidationError('Maximum file size is 8MB')
 
@@ -31,6 +42,8 @@ class NewEventSerializer (serializers.ModelSerializer):
     city = serializers.CharField(required=False)
     state = serializers.CharField(required=False)
     country = serializers.CharField(required=False)
+    latitude = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    longitude = serializers.FloatField(required=False, min_value=-180, max_value=180)
     start_date = serializers.DateTimeField(required=False)
     end_date = serializers.DateTimeField(required=False)
     price = serializers.IntegerField(required=False)
@@ -45,7 +58,7 @@ class NewEventSerializer (serializers.ModelSerializer):
         model = Event
         # fields = '__all__'
         fields = ['id','title', 'description', 'status', 'category', 'address', 'city',
-        'state','country', 'start_date', 'end_date', 'price', 'currency', 'payment_plan', 'total_tickets',
+        'state','country', 'latitude', 'longitude', 'start_date', 'end_date', 'price', 'currency', 'payment_plan', 'total_tickets',
         'default_image', 'total_tickets', 
         ]
         read_only_fields=['id' ]
@@ -68,55 +81,143 @@ class NewEventSerializer (serializers.ModelSerializer):
             raise serializers.ValidationError("start_date must be a future date")
         if end_date and start_date and end_date <= start_date:
             raise serializers.ValidationError("end_date must be greater than start_date")
+        if ('latitude' in attrs) != ('longitude' in attrs):
+            raise serializers.ValidationError("latitude and longitude must be provided together")
+        total_tickets = attrs.get('total_tickets')
+        if total_tickets and self.instance and total_tickets < self.instance.tickets_sold:
+            raise serializers.ValidationError(
+                f"total_tickets cannot be less than the {self.instance.tickets_sold} tickets already sold")
 
         return attrs
+
+    def set_location(self, validated_data, instance=None):
+        """
+        Fill latitude, longitude and geohash. Coordinates sent by the client win,
+        otherwise the location is geocoded whenever the address changes.
+        """
+        location_fields = ['address', 'city', 'state', 'country']
+        latitude = validated_data.get('latitude')
+        longitude = validated_data.get('longitude')
+
+        if latitude is None or longitude is None:
+            if instance is not None and not any(field in validated_data for field in location_fields):
+                return validated_data
+
+            location = {field: validated_data.get(field, getattr(instance, field, None))
+                        for field in location_fields}
+            coordinates = get_geocoder().geocode(**location)
+            latitude, longitude = coordinates if coordinates else (None, None)
+
+        validated_data['latitude'] = latitude
+        validated_data['longitude'] = longitude
+        validated_data['geohash'] = geohash.encode(
+            latitude, longitude, EVENT_GEOHASH_PRECISION) if latitude is not None else None
+
+        return validated_data
             
     def create(self, validated_data):
-        return Event.objects.create(**validated_data)
+        validated_data = self.set_location(validated_data)
+        event = Event.objects.create(**validated_data)
+        Event.adjust_listed_events(
+            event.user_id, Event.listed_events_delta(None, event.status))
 
+        return event
 
-    def update(self, instance, validated_data):
 
+    def update(self, instance, validated_data):
+        """
+        One UPDATE ... RETURNING. With context['if_match'] (updated_at values from
+        If-Match) the row is only written if it is still at one of those versions,
+        otherwise PreconditionFailed. Returns the written row as a values() dict.
+        """
+        validated_data = self.set_location(validated_data, instance)
         updatable_fields = {}
         for key in validated_data: 
             updatable_fields[key] = validated_data.get(key)
 
-        return Event.objects.filter(id=instance.id).update(**updatable_fields)
+        default_image = updatable_fields.pop('default_image', None)
+        if default_image is not None:
+            ## update() skips FileField.pre_save, so store the upload first
+            instance.default_image.save(default_image.name, default_image, save=False)
+            updatable_fields['default_image'] = instance.default_image.name
+            updatable_fields['default_image_variants'] = {}
+
+        events = Event.objects.filter(id=instance.id)
+        versions = self.context.get('if_match')
+        if versions is not None:
+            events = events.filter(updated_at__in=versions)
+
+        ## update() skips auto_now, updated_at backs the ETag of the event
+        updatable_fields['updated_at'] = timezone.now()
+        rows = update_returning(events, EVENT_VALUE_FIELDS, **updatable_fields)
+        if not rows:
+            if default_image is not None:
+                instance.default_image.delete(save=False)
+            raise PreconditionFailed()
+
+        if 'status' in updatable_fields:
+            Event.adjust_listed_events(
+                instance.user_id,
+                Event.listed_events_delta(instance.status, updatable_fields['status']))
+
+        return rows[0]
 
 
 class EventSerializer (serializers.ModelSerializer):
 
+    image = ImageVariantField('default_image', 'full')
+    tickets_available = serializers.ReadOnlyField()
+
     class Meta:
         model = Event
-        fields = '__all__'
+        exclude = ['search_vector', 'default_image_variants']
 
 
 class SimilarEventListSerializer (serializers.ModelSerializer):
 
+    image = ImageVariantField('default_image', 'card')
+
     class Meta:
         model = Event
         fields = ['id', 'title', 'created_at', 'city', 'state', 'country', 'payment_plan',
-                  'status', 'category', 'price', 'currency', 'start_date', 'end_date']
+                  'status', 'category', 'price', 'currency', 'start_date', 'end_date', 'image']
 
 class EventTableSerializer (serializers.ModelSerializer):
 
+    image = ImageVariantField('default_image', 'thumbnail')
+
     class Meta:
         model = Event
         fields = ['id', 'title', 'created_at', 'city', 'state', 'country', 'payment_plan',
-                  'status', 'category', 'price', 'currency', 'start_date', 'end_date']
+                  'status', 'category', 'price', 'currency', 'start_date', 'end_date', 'image']
 
 class EventListingSerializer (serializers.ModelSerializer):
 
+    image = ImageVariantField('default_image', 'card')
+
     class Meta:
         model = Event
         fields = ['id', 'title', 'created_at', 'city', 'state', 'country', 'payment_plan',
-                  'status', 'category', 'price', 'currency', 'start_date', 'end_date']
+                  'status', 'category', 'price', 'currency', 'start_date', 'end_date', 'image']
         
 
+class BulkEventStatusSerializer(serializers.Serializer):
+    event_ids = serializers.ListField(
+        child=serializers.UUIDField(), allow_empty=False, max_length=MAXIMUM_BULK_EVENT_IDS)
+    status = serializers.ChoiceField(choices=EVENT_STATUS_CHOICES)
+
+    def validate_event_ids(self, value):
+        ## keep the request order for the results, drop repeats
+        return list(dict.fromkeys(value))
+
+
 class ReviewersSerializer(serializers.ModelSerializer):
+
+    avatar = ImageVariantField('display_photo', 'thumbnail')
+
     class Meta:
         model = User
-        fields = ['id', 'display_photo', 'display_name']
+        fields = ['id', 'display_photo', 'display_name', 'avatar']
 
 
 class ReviewsSerializer(serializers.ModelSerializer):
@@ -0,0 +1,182 @@
+import math
+import re
+import threading
+from django.db import connections, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import EVENT_STATUS_CHOICES, Event, SimilarEvent
+from utils.constants import MAXIMUM_SIMILAR_PROPERTIES, SIMILAR_EVENTS_CANDIDATE_POOL
+
+
+SIMILARITY_WEIGHTS = {
+    'category': 3.0,
+    'city': 2.0,
+    'state': 1.5,
+    'country': 1.0,
+    'payment_plan': 1.0,
+    'price_band': 1.0,
+    'title': 3.0,
+}
+SCORING_FIELDS = ['id', 'title', 'category', 'city', 'state', 'country',
+                  'payment_plan', 'price', 'currency', 'status']
+
+
+def trigrams(text: str) -> set:
+    """Word trigrams the way pg_trgm builds them: lower case, two leading and one trailing blank."""
+    grams = set()
+    for word in re.findall(r'\w+', (text or '').lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def trigram_similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def price_band(event: Event):
+    ## free, then one band per order of magnitude in the event's currency
+    if not event.price:
+        return (event.currency, 0)
+    return (event.currency, int(math.log10(event.price)) + 1)
+
+
+def _same(a, b) -> bool:
+    return bool(a) and bool(b) and a.strip().lower() == b.strip().lower()
+
+
+def similarity_score(event: Event, other: Event, event_trigrams: set = None) -> float:
+    if event_trigrams is None:
+        event_trigrams = trigrams(event.title)
+
+    score = SIMILARITY_WEIGHTS['title'] * trigram_similarity(event_trigrams, trigrams(other.title))
+    if event.category and event.category == other.category:
+        score += SIMILARITY_WEIGHTS['category']
+    if _same(event.city, other.city):
+        score += SIMILARITY_WEIGHTS['city']
+    if _same(event.state, other.state):
+        score += SIMILARITY_WEIGHTS['state']
+    if _same(event.country, other.country):
+        score += SIMILARITY_WEIGHTS['country']
+    if event.payment_plan == other.payment_plan:
+        score += SIMILARITY_WEIGHTS['payment_plan']
+    if price_band(event) == price_band(other):
+        score += SIMILARITY_WEIGHTS['price_band']
+
+    return round(score, 6)
+
+
+def get_candidates(event: Event):
+    """
+    Most recent active events sharing a category or a country with `event`,
+    read newest first through the partial index on active events.
+    """
+    active = Event.objects.filter(
+        status=EVENT_STATUS_CHOICES[1][0]
+    ).exclude(id=event.id).only(*SCORING_FIELDS).order_by('-created_at', '-id')
+
+    lookups = []
+    if event.category:
+        lookups.append(Q(category=event.category))
+    if event.country:
+        lookups.append(Q(country__iexact=event.country))
+
+    candidates = {}
+    for lookup in lookups:
+        for candidate in active.filter(lookup)[:SIMILAR_EVENTS_CANDIDATE_POOL]:
+            candidates[candidate.id] = candidate
+
+    return list(candidates.values())
+
+
+def trim_neighbours(event_ids):
+    """Drop everything past the top MAXIMUM_SIMILAR_PROPERTIES for the given events."""
+    overflow = SimilarEvent.objects.filter(
+        event_id__in=event_ids
+    ).annotate(
+        position=Window(RowNumber(), partition_by=[F('event_id')], order_by=[F('score').desc(), F('id')])
+    ).filter(position__gt=MAXIMUM_SIMILAR_PROPERTIES).values_list('id', flat=True)
+
+    return SimilarEvent.objects.filter(id__in=list(overflow)).delete()
+
+
+@transaction.atomic
+def refresh_similar_events(event_id):
+    """
+    Recompute the neighbours of one event and offer it as a neighbour to every
+    candidate it was scored against. Called after an event is written, usually
+    from SimilarEventsThread. Refreshes of neighbouring events can race on the
+    same pairs, a pair already written by the other one is kept.
+    """
+    event = Event.objects.filter(id=event_id).only(*SCORING_FIELDS).first()
+    if event is None:
+        return
+
+    if event.status != EVENT_STATUS_CHOICES[1][0]:
+        SimilarEvent.objects.filter(Q(event=event) | Q(similar_event=event)).delete()
+        return
+
+    event_trigrams = trigrams(event.title)
+    scored = [
+        (similarity_score(event, candidate, event_trigrams), candidate)
+        for candidate in get_candidates(event)
+    ]
+    scored = [(score, candidate) for score, candidate in scored if score > 0]
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    SimilarEvent.objects.filter(event=event).delete()
+    SimilarEvent.objects.bulk_create([
+        SimilarEvent(event=event, similar_event=candidate, score=score)
+        for score, candidate in scored[:MAXIMUM_SIMILAR_PROPERTIES]
+    ], ignore_conflicts=True)
+
+    ## the score is symmetric, so the same numbers update the candidates' lists.
+    ## Events outside the candidate pool that already list this one are rescored
+    ## too, otherwise dropping their pair would shrink their lists for good.
+    holders = Event.objects.filter(
+        similar_events__similar_event=event
+    ).exclude(id__in=[candidate.id for _, candidate in scored]).only(*SCORING_FIELDS)
+    rescored = scored + [
+        (similarity_score(event, holder, event_trigrams), holder) for holder in holders
+    ]
+
+    SimilarEvent.objects.filter(similar_event=event).delete()
+    SimilarEvent.objects.bulk_create([
+        SimilarEvent(event=candidate, similar_event=event, score=score)
+        for score, candidate in rescored if score > 0
+    ], ignore_conflicts=True)
+    trim_neighbours([candidate.id for _, candidate in scored])
+
+
+def refresh_many_similar_events(event_ids):
+    """
+    Bulk status changes: events that are no longer active leave every list in one
+    delete, the active ones are rescored one by one.
+    """
+    active = set(Event.objects.filter(
+        id__in=event_ids, status=EVENT_STATUS_CHOICES[1][0]
+    ).values_list('id', flat=True))
+    inactive = [event_id for event_id in event_ids if event_id not in active]
+
+    if inactive:
+        SimilarEvent.objects.filter(
+            Q(event_id__in=inactive) | Q(similar_event_id__in=inactive)).delete()
+    for event_id in active:
+        refresh_similar_events(event_id)
+
+
+class SimilarEventsThread(threading.Thread):
+    """Run refresh_many_similar_events off the request."""
+
+    def __init__(self, event_ids):
+        self.event_ids = list(event_ids)
+        threading.Thread.__init__(self, daemon=True)
+
+    def run(self):
+        try:
+            refresh_many_similar_events(self.event_ids)
+        finally:
+            connections.close_all()
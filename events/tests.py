@@ -1,3 +1,424 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image
+from botocore.exceptions import ClientError
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .feeds import UPCOMING_FEED_COUNTRIES_KEY, UPCOMING_FEED_KEY, get_upcoming_feed, rebuild_upcoming_feeds
+from .models import EVENT_STATUS_CHOICES, Event, SimilarEvent
+from .similarity import refresh_similar_events
+from .views import UpdateEventAPIView
+from users.models import User
+from utils.constants import IMAGE_VARIANT_SIZES
+from utils.images import generate_image_variants
+from utils.testing import QueryPlanAssertions
+
+
+class EventQueryPlanTests(QueryPlanAssertions, TestCase):
+    """The read endpoints of events must search their indexes, not scan the table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creators = [User.objects.create_user(email=f'creator{index}@example.com', role='CREATOR')
+                    for index in range(20)]
+        cls.creator = creators[0]
+        statuses = [choice[0] for choice in EVENT_STATUS_CHOICES]
+        words = ['music', 'comedy', 'art', 'tech', 'fashion', 'food', 'film', 'sports']
+        Event.objects.bulk_create([
+            Event(title=f'Lagos {words[index % len(words)] if index % 50 != 1 else "masquerade"} night {index}',
+                  description='Live afrobeats', user=creators[index % len(creators)], address='1 Broad Street',
+                  state='Lagos', country='Nigeria',
+                  ## mostly active, like production
+                  status=statuses[1] if index % 5 else statuses[index // 5 % len(statuses)])
+            for index in range(4000)
+        ])
+        cls.event = Event.objects.filter(status=EVENT_STATUS_CHOICES[1][0]).first()
+        SimilarEvent.objects.bulk_create([
+            SimilarEvent(event=event, similar_event=similar_event, score=1)
+            for event in Event.objects.filter(status=EVENT_STATUS_CHOICES[1][0])[:200]
+            for similar_event in Event.objects.filter(status=EVENT_STATUS_CHOICES[1][0])[200:210]
+        ])
+        with connection.cursor() as cursor:
+            ## what autovacuum does to the GIN index in production
+            cursor.execute("SELECT gin_clean_pending_list('events_search_vector_idx')")
+            cursor.execute('ANALYZE events')
+            cursor.execute('ANALYZE similar_events')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def get(self, path, data=None, indexes=()):
+        response = self.assertSelectsUseIndexes(lambda: self.client.get(path, data), *indexes)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_listing_uses_indexes(self):
+        self.get('/api/v1/events/listings/', indexes=['events_active_created_idx'])
+        self.get('/api/v1/events/listings/', {'pagination': 'cursor'}, indexes=['events_active_created_idx'])
+
+    def test_listing_search_uses_indexes(self):
+        self.get('/api/v1/events/listings/', {'search': 'masquerade'}, indexes=['events_search_vector_idx'])
+
+    def test_creator_events_use_indexes(self):
+        self.get('/api/v1/events/', indexes=['events_user_created_idx'])
+
+    def test_detail_uses_indexes(self):
+        self.get(f'/api/v1/events/single/{self.event.id}/', indexes=['events_pkey', 'users_pkey'])
+
+    def test_similar_events_use_indexes(self):
+        self.get(f'/api/v1/events/similar_events/{self.event.id}/', indexes=['similar_events_score_idx'])
+
+
+class EventDetailTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        cls.event = Event.objects.create(
+            title='Lagos music night', user=cls.creator, address='1 Broad Street', state='Lagos',
+            country='Nigeria', status=EVENT_STATUS_CHOICES[1][0])
+
+    def test_detail_is_one_query(self):
+        client = APIClient()
+        with self.assertNumQueries(1):
+            response = client.get(f'/api/v1/events/single/{self.event.id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['user']['id'], self.creator.id)
+
+    def test_status_change_moves_listed_events(self):
+        Event.adjust_listed_events(self.creator.id, 1)
+        client = APIClient()
+        client.force_authenticate(self.creator)
+
+        response = client.patch(f'/api/v1/events/update/{self.event.id}/',
+                                {'status': EVENT_STATUS_CHOICES[0][0]}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.creator.refresh_from_db()
+        self.assertEqual(self.creator.listed_events, 0)
+
+    def test_background_writes_change_the_etag_but_not_the_version(self):
+        client = APIClient()
+        client.force_authenticate(self.creator)
+        etag = client.get(f'/api/v1/events/single/{self.event.id}/')['ETag']
+
+        ## what the variant pipeline and another event's status change write
+        Event.objects.filter(id=self.event.id).update(
+            default_image_variants={'full': {'webp': 'events/full.webp'}})
+        Event.adjust_listed_events(self.creator.id, 1)
+
+        response = client.get(f'/api/v1/events/single/{self.event.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = client.patch(f'/api/v1/events/update/{self.event.id}/', {'title': 'Lagos jazz night'},
+                                format='multipart', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class SimilarEventRefreshTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        cls.event, cls.holder = [
+            Event.objects.create(
+                title=title, user=creator, address='1 Broad Street', state='Lagos', country='Nigeria',
+                status=EVENT_STATUS_CHOICES[1][0])
+            for title in ('Lagos music night', 'Abuja music night')
+        ]
+
+    def test_refresh_keeps_the_event_in_lists_outside_the_candidate_pool(self):
+        SimilarEvent.objects.create(event=self.holder, similar_event=self.event, score=1)
+
+        ## the holder fell out of the event's candidate pool
+        with mock.patch('events.similarity.get_candidates', return_value=[]):
+            refresh_similar_events(self.event.id)
+
+        pair = SimilarEvent.objects.get(event=self.holder, similar_event=self.event)
+        self.assertGreater(pair.score, 1)
+        self.assertFalse(SimilarEvent.objects.filter(event=self.event).exists())
+
+
+def jpeg_bytes(size=(800, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class ImageVariantTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.event = Event.objects.create(
+            title='Lagos music night', user=self.creator, address='1 Broad Street', state='Lagos',
+            country='Nigeria', status=EVENT_STATUS_CHOICES[1][0])
+        self.event.default_image.save('flyer.jpg', ContentFile(jpeg_bytes()))
+
+    def variant_names(self):
+        self.event.refresh_from_db()
+        return [name for names in self.event.default_image_variants.values() for name in names.values()]
+
+    def test_command_backfills_images_without_variants(self):
+        call_command('generate_image_variants', '--only', 'events', stdout=StringIO())
+
+        self.event.refresh_from_db()
+        self.assertEqual(set(self.event.default_image_variants), set(IMAGE_VARIANT_SIZES))
+        self.assertEqual(len(self.variant_names()), len(IMAGE_VARIANT_SIZES) * 2)
+        self.assertTrue(all(default_storage.exists(name) for name in self.variant_names()))
+
+        ## rows that have variants are left alone
+        output = StringIO()
+        call_command('generate_image_variants', '--only', 'events', stdout=output)
+        self.assertIn('for 0 events', output.getvalue())
+
+    def test_rebuild_deletes_the_previous_variants(self):
+        generate_image_variants(Event, self.event.id, 'default_image')
+        previous = self.variant_names()
+
+        call_command('generate_image_variants', '--only', 'events', '--all', stdout=StringIO())
+        self.assertFalse(set(previous) & set(self.variant_names()))
+        self.assertFalse(any(default_storage.exists(name) for name in previous))
+
+    def test_replacing_the_image_deletes_the_previous_variants(self):
+        generate_image_variants(Event, self.event.id, 'default_image')
+        previous = self.variant_names()
+
+        client = APIClient()
+        client.force_authenticate(self.creator)
+        image = SimpleUploadedFile('poster.jpg', jpeg_bytes((400, 400)), content_type='image/jpeg')
+        with mock.patch('utils.images.ImageVariantThread.start') as start:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.patch(f'/api/v1/events/update/{self.event.id}/', {'default_image': image},
+                                        format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        start.assert_called_once()
+        self.assertEqual(self.variant_names(), [])
+        self.assertFalse(any(default_storage.exists(name) for name in previous))
+
+    def test_variants_of_a_replaced_image_are_not_recorded(self):
+        def build_while_replaced(image):
+            ## a newer upload lands while the variants are built
+            Event.objects.filter(id=self.event.id).update(default_image='events/newer.jpg')
+            return {'full': {'webp': default_storage.save('events/stale.webp', ContentFile(b'x'))}}
+
+        with mock.patch('utils.images.build_image_variants', side_effect=build_while_replaced):
+            self.assertFalse(generate_image_variants(Event, self.event.id, 'default_image'))
+        self.assertEqual(self.variant_names(), [])
+        self.assertFalse(default_storage.exists('events/stale.webp'))
+
+
+class StubS3Client:
+    """What confirm_upload calls on the boto3 client, backed by a dict of keys to bytes."""
+
+    def __init__(self):
+        self.objects = {}
+        self.ranges = []
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn, HttpMethod):
+        return f"https://{Params['Bucket']}.s3.example.com/{Params['Key']}?signature=stub"
+
+    def get(self, key):
+        if key not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return self.objects[key]
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.get(Key))}
+
+    def get_object(self, Bucket, Key, Range):
+        self.ranges.append(Range)
+        first, last = map(int, Range.removeprefix('bytes=').split('-'))
+        return {'Body': BytesIO(self.get(Key)[first:last + 1])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+class EventImageDirectUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        cls.event = Event.objects.create(
+            title='Lagos music night', user=cls.creator, address='1 Broad Street', state='Lagos',
+            country='Nigeria')
+
+    def setUp(self):
+        self.s3 = StubS3Client()
+        for patcher in (mock.patch('utils.uploads._s3_client', return_value=self.s3),
+                        mock.patch('utils.uploads.default_storage', mock.Mock(bucket_name='codli'))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings = self.settings(FILE_UPLOAD_STORAGE='s3')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def slot(self, content_type, size):
+        response = self.client.post(f'/api/v1/events/image-upload/{self.event.id}/',
+                                    {'content_type': content_type, 'size': size})
+        self.assertEqual(response.status_code, 200, response.content)
+        key = response.data['upload_url'].split('.com/')[1].split('?')[0]
+        return key, response.data['token']
+
+    def confirm(self, token, event=None):
+        event = event or self.event
+        return self.client.post(f'/api/v1/events/image-upload/{event.id}/confirm/', {'token': token})
+
+    def test_confirm_records_a_matching_upload(self):
+        image = jpeg_bytes()
+        key, token = self.slot('image/jpeg', len(image))
+        self.s3.objects[key] = image
+
+        response = self.confirm(token)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['default_image'], key)
+        ## only the magic number is downloaded
+        self.assertEqual(self.s3.ranges, ['bytes=0-7'])
+
+    def test_confirm_deletes_an_upload_of_another_type(self):
+        image = jpeg_bytes()
+        key, token = self.slot('image/png', len(image))
+        self.s3.objects[key] = image
+
+        self.assertEqual(self.confirm(token).status_code, 400)
+        self.assertNotIn(key, self.s3.objects)
+
+    def test_confirm_deletes_an_upload_of_another_size(self):
+        image = jpeg_bytes()
+        key, token = self.slot('image/jpeg', len(image) - 1)
+        self.s3.objects[key] = image
+
+        self.assertEqual(self.confirm(token).status_code, 400)
+        self.assertNotIn(key, self.s3.objects)
+
+    def test_confirm_needs_the_upload_and_its_own_slot(self):
+        image = jpeg_bytes()
+        key, token = self.slot('image/jpeg', len(image))
+        self.assertEqual(self.confirm(token).status_code, 400)
+
+        self.s3.objects[key] = image
+        other_event = Event.objects.create(
+            title='Abuja music night', user=self.creator, address='1 Broad Street', state='Abuja',
+            country='Nigeria')
+        self.assertEqual(self.confirm(token, other_event).status_code, 400)
+        other_event.refresh_from_db()
+        self.assertFalse(other_event.default_image)
+
+
+class EventImageMultipartUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        cls.event = Event.objects.create(
+            title='Lagos music night', user=cls.creator, address='1 Broad Street', state='Lagos',
+            country='Nigeria')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def upload(self, name, content):
+        image = SimpleUploadedFile(name, content, content_type='image/jpeg')
+        return self.client.patch(f'/api/v1/events/update/{self.event.id}/', {'default_image': image},
+                                 format='multipart')
+
+    def test_image_is_stored(self):
+        response = self.upload('flyer.jpg', jpeg_bytes())
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(default_storage.exists(response.data['default_image']))
+
+    def test_oversized_file_is_rejected_while_streaming(self):
+        image = jpeg_bytes((2000, 2000))
+        with mock.patch.object(UpdateEventAPIView, 'upload_max_size', len(image) // 2):
+            response = self.upload('flyer.jpg', image)
+        self.assertEqual(response.status_code, 413, response.content)
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.default_image)
+
+    def test_oversized_body_is_rejected_from_its_content_length(self):
+        with mock.patch.object(UpdateEventAPIView, 'upload_max_size', 1024), \
+                self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024), \
+                mock.patch('utils.upload_handlers.LimitedUploadHandler.receive_data_chunk') as receive:
+            response = self.upload('flyer.jpg', jpeg_bytes((2000, 2000)))
+        self.assertEqual(response.status_code, 413, response.content)
+        receive.assert_not_called()
+
+    def test_file_of_another_type_is_rejected(self):
+        ## a jpg name and content type don't matter, the bytes are a PDF
+        response = self.upload('flyer.jpg', b'%PDF-1.7\n' + b'0' * 4096)
+        self.assertEqual(response.status_code, 415, response.content)
+
+        ## shorter than any magic number
+        self.assertEqual(self.upload('flyer.jpg', b'\xff\xd8').status_code, 415)
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.default_image)
+
+
+class UpcomingFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        Event.objects.create(
+            title='Lagos music night', user=creator, address='1 Broad Street', state='Lagos',
+            country='Nigeria', status=EVENT_STATUS_CHOICES[1][0], start_date=timezone.now() + timedelta(days=2))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unknown_country_gets_an_uncached_empty_feed(self):
+        self.assertEqual(get_upcoming_feed('Atlantis')['results'], [])
+        self.assertIsNone(cache.get(UPCOMING_FEED_KEY.format(country='atlantis')))
+
+    def test_known_country_is_built_on_a_miss(self):
+        self.assertEqual(len(get_upcoming_feed('nigeria')['results']), 1)
+
+        cache.delete(UPCOMING_FEED_KEY.format(country='nigeria'))
+        self.assertEqual(len(get_upcoming_feed('Nigeria')['results']), 1)
+
+    def test_full_rebuild_drops_feeds_of_countries_without_events(self):
+        rebuild_upcoming_feeds()
+        Event.objects.update(status=EVENT_STATUS_CHOICES[2][0])
+        self.assertEqual(rebuild_upcoming_feeds(), ['all'])
+        self.assertIsNone(cache.get(UPCOMING_FEED_KEY.format(country='nigeria')))
+        self.assertEqual(get_upcoming_feed('nigeria')['results'], [])
+
+    def test_partial_rebuild_adds_new_countries(self):
+        rebuild_upcoming_feeds()
+        Event.objects.update(country='Ghana')
+        self.assertEqual(rebuild_upcoming_feeds(['Ghana']), ['all', 'ghana'])
+        self.assertEqual(cache.get(UPCOMING_FEED_COUNTRIES_KEY), ['all', 'ghana', 'nigeria'])
+
+        ## evicted, and still rebuilt on a miss
+        cache.delete(UPCOMING_FEED_KEY.format(country='ghana'))
+        self.assertEqual(len(get_upcoming_feed('Ghana')['results']), 1)
@@ -1,7 +1,9 @@
 from django.urls import path
 from .views import (EventListView, EventListingViewset, NewEventAPIView, 
                     ReviewCreateView, ReviewListView, SimilarEventView,
-                    EventDetailView, UpdateEventAPIView
+                    EventDetailView, UpdateEventAPIView, EventListingCacheStatsView,
+                    UpcomingEventsView, EventImageUploadSlotView, EventImageUploadConfirmView,
+                    BulkEventStatusView
                     )
 
 urlpatterns = [
@@ -9,9 +11,17 @@ urlpatterns = [
         '', EventListView.as_view({'get': 'list'}), name='all_events'),
     path(
         'listings/', EventListingViewset.as_view({'get': 'list'}), name='event_listing'),
+    path(
+        'listings/cache-stats/', EventListingCacheStatsView.as_view(), name='event_listing_cache_stats'),
+    path('upcoming/', UpcomingEventsView.as_view(), name='upcoming_events'),
     path('new/', NewEventAPIView.as_view(), name='new_event'),
+    path('image-upload/<event_id>/',
+         EventImageUploadSlotView.as_view(), name='event_image_upload'),
+    path('image-upload/<event_id>/confirm/',
+         EventImageUploadConfirmView.as_view(), name='event_image_upload_confirm'),
     path('single/<event_id>/', EventDetailView.as_view(), name='single_event'),
     path('update/<event_id>/', UpdateEventAPIView.as_view(), name='update_event'),
+    path('bulk-status/', BulkEventStatusView.as_view(), name='bulk_event_status'),
     path('similar_events/<event_id>/',
          SimilarEventView.as_view(), name='similar_event'),
     path('reviews/',
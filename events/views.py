@@ -1,20 +1,35 @@
 import json
+import os
+from functools import partial
 from rest_framework import (views, permissions, parsers)
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
 from django.db import transaction
-from rest_framework.filters import SearchFilter
+from django.utils import timezone
 from rest_framework.viewsets import ReadOnlyModelViewSet
-from django.db.models import Q
 
-from .serializers import (EventListingSerializer, EventSerializer, EventTableSerializer, NewEventSerializer,
+from .serializers import (EVENT_VALUE_FIELDS, BulkEventStatusSerializer, EventListingSerializer,
+                          EventSerializer, EventTableSerializer, NewEventSerializer,
                           ReviewsSerializer, SimilarEventListSerializer)
-from .models import EVENT_STATUS_CHOICES, Event, Review
+from .models import EVENT_STATUS_CHOICES, Event, Review, SimilarEvent, get_default_image_upload_path
+from .filters import EventProximityFilter, EventSearchFilter
+from .cache import (bump_listing_version, get_cached_listing, get_listing_cache_stats,
+                    listing_cache_key, listing_etag, set_cached_listing)
+from .similarity import SimilarEventsThread
+from .feeds import get_upcoming_feed, rebuild_upcoming_feeds
 from notifications.models import Notifications
 from utils.pagination import CustomPagination
+from utils.conditional import (if_match_versions, not_modified_response, set_validators,
+                               version_etag)
 from utils.constants import (MAXIMUM_SIMILAR_PROPERTIES)
-from utils.date import (convert_datetime_to_readable_date)
+from utils.db import update_returning
+from utils.date import (convert_datetime_to_readable_date, parse_query_datetime)
+from utils.images import image_variant_urls, schedule_image_variants
+from utils.upload_handlers import LimitedUploadMixin
+from utils.uploads import (UploadConfirmSerializer, UploadSlotSerializer, confirm_upload,
+                           create_upload_slot)
 
-class NewEventAPIView(views.APIView):
+class NewEventAPIView(LimitedUploadMixin, views.APIView):
 
     serializer_class = NewEventSerializer
     parser_classes = [parsers.FormParser, parsers.MultiPartParser]
@@ -28,37 +43,65 @@ class NewEventAPIView(views.APIView):
 
         with transaction.atomic():
             event=serializer.save(user = request.user)
-            event = Event.objects.filter(id=event.id).values()[0]
+            event = Event.objects.filter(id=event.id).values(*EVENT_VALUE_FIELDS)[0]
+
+            if event['default_image']:
+                schedule_image_variants(Event, event['id'], 'default_image')
 
             ## notify agent
             notificationMessage = f'New Event Added. {event["title"]}'
             Notifications.new_entry(user= request.user, message=notificationMessage)
 
+            if event['status'] == EVENT_STATUS_CHOICES[1][0]:
+                transaction.on_commit(bump_listing_version)
+                transaction.on_commit(SimilarEventsThread([event['id']]).start)
+                transaction.on_commit(partial(rebuild_upcoming_feeds, [event['country']]))
+
         return Response(event, status=200)
 
 
 class EventListView(ReadOnlyModelViewSet):
 
-    filter_backends = [SearchFilter]
+    filter_backends = [EventSearchFilter]
     serializer_class = EventTableSerializer
     permission_classes = [permissions.IsAuthenticated]
-    search_fields = ['title']
     pagination_class = CustomPagination
 
     def get_queryset(self):
         user_id = self.request.user.id
         return Event.objects.filter(
             user=user_id
-        ).order_by('-created_at')
+        ).order_by('-created_at', '-id')
 
 
 class EventListingViewset(ReadOnlyModelViewSet):
 
-    filter_backends = [SearchFilter]
+    filter_backends = [EventSearchFilter, EventProximityFilter]
     serializer_class = EventListingSerializer
-    search_fields = ['title']
     pagination_class = CustomPagination
 
+    ## query params that shape the response, anything else is ignored by the cache key
+    filter_query_params = ['country', 'state', 'status', 'category', 'payment_plan', 'upcoming']
+    cache_query_params = filter_query_params + ['search', 'near', 'radius', 'starts_after', 'starts_before',
+                                                'page', 'limit', 'pagination', 'cursor']
+
+    def list(self, request, *args, **kwargs):
+        cache_key = listing_cache_key(
+            request, self.cache_query_params, case_insensitive_params=self.filter_query_params)
+
+        etag = listing_etag(cache_key)
+        not_modified = not_modified_response(request, etag)
+        if not_modified:
+            return not_modified
+
+        data = get_cached_listing(cache_key)
+        if data is not None:
+            return set_validators(Response(data, status=200), etag)
+
+        response = super().list(request, *args, **kwargs)
+        set_cached_listing(cache_key, response.data)
+        return set_validators(response, etag)
+
     def get_queryset(self):
         queryset = Event.objects.filter(
             status=EVENT_STATUS_CHOICES[1][0],            
@@ -83,13 +126,32 @@ class EventListingViewset(ReadOnlyModelViewSet):
         payment_plan = self.request.query_params.get('payment_plan')
         if payment_plan is not None:
             queryset = queryset.filter(payment_plan__iexact=payment_plan)
-        
 
+        for param, lookup in (('starts_after', 'start_date__gte'), ('starts_before', 'start_date__lt')):
+            value = self.request.query_params.get(param)
+            if value is not None:
+                start_date = parse_query_datetime(value)
+                if start_date is None:
+                    raise ParseError(f"'{param}' must be an ISO 8601 date or datetime")
+                queryset = queryset.filter(**{lookup: start_date})
+
+        upcoming = self.request.query_params.get('upcoming')
+        if upcoming is not None and upcoming.lower() in ('true', '1'):
+            queryset = queryset.filter(start_date__gte=timezone.now())
 
-        queryset = queryset.order_by('-created_at')
+
+        queryset = queryset.order_by('-created_at', '-id')
         return queryset
 
 
+class UpcomingEventsView(views.APIView):
+
+    def get(self, request):
+        ## served from the precomputed feed, see events.feeds
+        feed = get_upcoming_feed(request.query_params.get('country'))
+        return Response(feed, status=200)
+
+
 class SimilarEventView(views.APIView):
 
     serializer_class = SimilarEventListSerializer
@@ -97,19 +159,19 @@ class SimilarEventView(views.APIView):
 
     def get(self, request, event_id):
 
-        events = Event.objects.filter(id=event_id)
-        if len(events) < 1:
+        ## neighbours are precomputed by events.similarity, this is one indexed read
+        neighbours = SimilarEvent.objects.filter(
+            event_id=event_id,
+            similar_event__status=EVENT_STATUS_CHOICES[1][0]
+        ).select_related('similar_event').order_by('-score')[:MAXIMUM_SIMILAR_PROPERTIES]
+        events = [neighbour.similar_event for neighbour in neighbours]
+
+        if not events and not Event.objects.filter(id=event_id).exists():
             return Response({
                 'status_code': 400,
                 'error': 'No event with that ID',
                 'payload': ['No event with that ID']}, status=400)
 
-        events = Event.objects.filter(
-            ~Q(id=event_id),
-            name__icontains=events[0].nameame,
-            status=EVENT_STATUS_CHOICES[1][0]
-        )[:MAXIMUM_SIMILAR_PROPERTIES]
-
         serializer = self.serializer_class(events, many=True)
 
         return Response(serializer.data, status=200)
@@ -121,63 +183,218 @@ class EventDetailView(views.APIView):
 
     def get(self, request, event_id):
 
-        events = Event.objects.filter(id=event_id)
-        if len(events) < 1:
+        ## event and creator in a single query, listed_events is denormalized on the user
+        event = Event.objects.select_related('user').filter(id=event_id).first()
+        if event is None:
             return Response({
                 'status_code': 400,
                 'error': 'No event with that ID',
                 'payload': ['No event with that ID']}, status=400)
 
-        event = events[0]
+        ## the creator block is part of the payload, so their row counts too.
+        ## ticket sales, image variants and listed_events don't touch updated_at
+        ## (that would fail the creator's If-Match), so they are parts of the ETag
+        last_modified = max(event.updated_at, event.user.updated_at)
+        etag = version_etag(event.updated_at, event.user.id, event.user.updated_at.isoformat(),
+                            event.tickets_sold, event.tickets_held, event.default_image_variants,
+                            event.user.display_photo_variants, event.user.listed_events)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
 
         serializer = self.serializer_class(event)
 
         output = serializer.data
-        number_of_listed_events = Event.objects.filter(
-            user=event.user, status=EVENT_STATUS_CHOICES[1][0]).count()
-
         output['user'] = {
             'id': event.user.id,
             'display_name': event.user.display_name,
             'display_photo': event.user.display_photo.url if event.user.display_photo else None,
+            'avatar': image_variant_urls(event.user, 'display_photo', 'thumbnail'),
             'country': event.user.country,
             'email': event.user.email,
             'job_name': event.user.job_name,
-            'listed_events': number_of_listed_events
+            'listed_events': event.user.listed_events
         }
 
-        return Response(output, status=200)
+        return set_validators(Response(output, status=200), etag, last_modified)
 
 
-class UpdateEventAPIView(views.APIView):
+class UpdateEventAPIView(LimitedUploadMixin, views.APIView):
 
     serializer_class = NewEventSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def patch(self, request, event_id):
 
-        events = Event.objects.filter(id=event_id)
-        if len(events) < 1:
-            return Response({
-                'status_code': 400,
-                'error': 'No event with that ID',
-                'payload': ['No event with that ID']}, status=400)
+        with transaction.atomic():
+            ## locked, so the status the listed_events delta is taken from can't change under us
+            event, error_response = get_owned_event(request, event_id, for_update=True)
+            if error_response:
+                return error_response
 
-        event = events[0]
-        if event.user != request.user:
-            return Response({
-                'status_code': 400,
-                'error': 'This resource belongs to another user',
-                'payload': ['This resource belongs to another user']}, status=400)
+            ## If-Match is checked by the UPDATE itself, a stale version writes nothing
+            serializer = self.serializer_class(
+                event, data=request.data, context={'if_match': if_match_versions(request)})
+            serializer.is_valid(raise_exception=True)
+
+            previous_status, previous_country = event.status, event.country
+            previous_variants = event.default_image_variants
+            event = serializer.save()
+
+            if 'default_image' in serializer.validated_data:
+                schedule_image_variants(Event, event['id'], 'default_image', previous_variants)
+
+            if EVENT_STATUS_CHOICES[1][0] in (previous_status, event['status']):
+                transaction.on_commit(bump_listing_version)
+                transaction.on_commit(SimilarEventsThread([event['id']]).start)
+                transaction.on_commit(
+                    partial(rebuild_upcoming_feeds, {previous_country, event['country']}))
+
+        return set_validators(Response(event, status=200), version_etag(event['updated_at']))
+
+
+class BulkEventStatusView(views.APIView):
+    """
+    Move up to MAXIMUM_BULK_EVENT_IDS of the user's events to one status.
+    One read of the current statuses, one UPDATE, one notification; every id
+    comes back as 'updated', 'unchanged' or 'not_found' (missing or not owned).
+    """
+
+    serializer_class = BulkEventStatusSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-        serializer = self.serializer_class(event, data=request.data)
+    def post(self, request):
+
+        serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
+        event_ids = serializer.validated_data['event_ids']
+        status = serializer.validated_data['status']
 
         with transaction.atomic():
-            serializer.save()
-            event = Event.objects.filter(id=event.id).values()[0]
+            ## lock the rows so concurrent batches can't double count listed_events
+            owned = {
+                event_id: (previous_status, country)
+                for event_id, previous_status, country in Event.objects.select_for_update().filter(
+                    id__in=event_ids, user=request.user
+                ).values_list('id', 'status', 'country')
+            }
+            changed = [event_id for event_id, (previous_status, _) in owned.items()
+                       if previous_status != status]
+
+            if changed:
+                Event.objects.filter(
+                    id__in=changed, user=request.user
+                ).update(status=status, updated_at=timezone.now())
+
+                Event.adjust_listed_events(request.user.id, sum(
+                    Event.listed_events_delta(owned[event_id][0], status) for event_id in changed))
+
+                Notifications.new_bulk_entry([{
+                    'user': request.user,
+                    'message': f'{len(changed)} event(s) moved to {status.lower()}'}])
+
+                active = EVENT_STATUS_CHOICES[1][0]
+                touched = [event_id for event_id in changed
+                           if active in (owned[event_id][0], status)]
+                if touched:
+                    transaction.on_commit(bump_listing_version)
+                    transaction.on_commit(lambda: SimilarEventsThread(touched).start())
+                    transaction.on_commit(partial(
+                        rebuild_upcoming_feeds, {owned[event_id][1] for event_id in touched}))
+
+        changed = set(changed)
+        results = [{
+            'id': event_id,
+            'result': 'not_found' if event_id not in owned
+                      else 'updated' if event_id in changed else 'unchanged',
+        } for event_id in event_ids]
+
+        return Response({
+            'status': status,
+            'updated': len(changed),
+            'results': results}, status=200)
+
+
+def get_owned_event(request, event_id, for_update=False):
+    """
+    Returns (event, None) or (None, error response) for events of request.user.
+    With `for_update` the row stays locked until the surrounding transaction ends.
+    """
+    events = Event.objects.select_for_update() if for_update else Event.objects
+    event = events.filter(id=event_id).first()
+    if event is None:
+        return None, Response({
+            'status_code': 400,
+            'error': 'No event with that ID',
+            'payload': ['No event with that ID']}, status=400)
+
+    if event.user_id != request.user.id:
+        return None, Response({
+            'status_code': 400,
+            'error': 'This resource belongs to another user',
+            'payload': ['This resource belongs to another user']}, status=400)
+
+    return event, None
+
+
+class EventImageUploadSlotView(views.APIView):
+
+    serializer_class = UploadSlotSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-        return Response(event, status=200)
+    def post(self, request, event_id):
+
+        event, error_response = get_owned_event(request, event_id)
+        if error_response:
+            return error_response
+
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        slot = create_upload_slot(
+            request.user,
+            target=f'event:{event.id}',
+            directory=os.path.dirname(get_default_image_upload_path(event, '')),
+            **serializer.validated_data)
+
+        return Response(slot, status=200)
+
+
+class EventImageUploadConfirmView(views.APIView):
+
+    serializer_class = UploadConfirmSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, event_id):
+
+        event, error_response = get_owned_event(request, event_id)
+        if error_response:
+            return error_response
+
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        key = confirm_upload(request.user, f'event:{event.id}', serializer.validated_data['token'])
+
+        with transaction.atomic():
+            previous_variants = event.default_image_variants
+            event = update_returning(
+                Event.objects.filter(id=event.id), EVENT_VALUE_FIELDS,
+                default_image=key, default_image_variants={}, updated_at=timezone.now())[0]
+
+            schedule_image_variants(Event, event['id'], 'default_image', previous_variants)
+            if event['status'] == EVENT_STATUS_CHOICES[1][0]:
+                transaction.on_commit(bump_listing_version)
+
+        return set_validators(Response(event, status=200), version_etag(event['updated_at']))
+
+
+class EventListingCacheStatsView(views.APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_listing_cache_stats(), status=200)
 
 
 class ReviewListView(views.APIView):
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    ## build on large live tables without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('notifications', '0003_alter_notifications_user_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notifications',
+            index=models.Index(fields=['user', '-created_at'], name='notifications_user_created_idx'),
+        ),
+    ]
@@ -27,6 +27,9 @@ class Notifications(models.Model):
 
     class Meta:
         db_table = "Notifications"
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notifications_user_created_idx'),
+        ]
 
     @classmethod
     @transaction.atomic
@@ -1,3 +1,29 @@
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import Notifications
+from users.models import User
+from utils.testing import QueryPlanAssertions
+
+
+class NotificationQueryPlanTests(QueryPlanAssertions, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(email=f'user{index}@example.com', role='CONSUMER')
+                     for index in range(50)]
+        Notifications.objects.bulk_create([
+            Notifications(user=cls.users[index % len(cls.users)], message=f'Notification {index}')
+            for index in range(4000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE "Notifications"')
+
+    def test_notifications_use_indexes(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = self.assertSelectsUseIndexes(lambda: client.get('/api/v1/notifications/'),
+                                                 ('notifications_user_created_idx', 'Notifications_user_id_aab33185'))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.data), 80)
@@ -0,0 +1,72 @@
+import csv
+import io
+from datetime import datetime
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import TransactionLog
+from utils.constants import TRANSACTION_EXPORT_CHUNK_SIZE
+
+
+EXPORT_FIELDS = ['reference', 'event_id', 'event_name', 'user_id', 'payed_by_id', 'amount', 'currency',
+                 'fee', 'quantity', 'status', 'payment_method', 'created_at', 'updated_at']
+## export type => content type
+EXPORT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_queryset(user=None):
+    """Every log of one creator (oldest first, on their index) or, for finance, every log by id."""
+    if user is None:
+        return TransactionLog.objects.order_by('id')
+    return TransactionLog.objects.filter(user=user).order_by('created_at', 'id')
+
+
+def _chunks(rows, chunk_size):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_chunks(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows([_csv_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    ## only the header when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows, chunk_size):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(f'{encoder.encode(dict(zip(EXPORT_FIELDS, row)))}\n' for row in chunk)
+
+
+def export_chunks(queryset, export_type, chunk_size=TRANSACTION_EXPORT_CHUNK_SIZE):
+    """
+    Yield the queryset as `export_type` text, one string per `chunk_size` rows.
+    Rows come from a server-side cursor, so memory stays flat however many
+    there are. The cursor lives in a transaction so Postgres streams it
+    instead of materializing the whole result first (WITH HOLD).
+    """
+    encode = _csv_chunks if export_type == 'csv' else _ndjson_chunks
+    with transaction.atomic():
+        rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+        yield from encode(rows, chunk_size)
@@ -0,0 +1,42 @@
+import uuid
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import CHOICES_FOR_STATUS
+from utils.date import parse_query_datetime
+
+
+class TransactionLogFilter(BaseFilterBackend):
+    """
+    `?event=<id>&status=<status>&created_after=<date>&created_before=<date>` on a
+    history already narrowed to one user, so it stays on that user's
+    (created_at, id) index.
+    """
+
+    statuses = [choice[0] for choice in CHOICES_FOR_STATUS]
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        event = params.get('event')
+        if event:
+            try:
+                queryset = queryset.filter(event_id=uuid.UUID(event))
+            except ValueError:
+                raise ParseError("'event' must be an event ID")
+
+        status = params.get('status')
+        if status:
+            if status not in self.statuses:
+                raise ParseError(f"'status' must be one of {', '.join(self.statuses)}")
+            queryset = queryset.filter(status=status)
+
+        for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+            value = params.get(param)
+            if value is not None:
+                created_at = parse_query_datetime(value)
+                if created_at is None:
+                    raise ParseError(f"'{param}' must be an ISO 8601 date or datetime")
+                queryset = queryset.filter(**{lookup: created_at})
+
+        return queryset
@@ -0,0 +1,57 @@
+import hashlib
+import json
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from utils.constants import MAXIMUM_IDEMPOTENCY_KEY_LENGTH
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def get_idempotency_key(request):
+    key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+    if not key:
+        return None
+    if len(key) > MAXIMUM_IDEMPOTENCY_KEY_LENGTH:
+        raise ParseError(f'{IDEMPOTENCY_HEADER} must be at most {MAXIMUM_IDEMPOTENCY_KEY_LENGTH} characters')
+    return key
+
+
+def request_hash(request) -> str:
+    data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+    raw = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def replay_response(request, key: str):
+    """
+    The stored response for `key`, or None when the key is new. One lookup on
+    the (user, key) unique index.
+    """
+    stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+    if stored is None:
+        return None
+
+    if stored.request_hash != request_hash(request):
+        raise ParseError(f'{IDEMPOTENCY_HEADER} was already used for a different request')
+
+    return Response(stored.response, status=stored.status_code, headers={
+        **stored.response_headers, REPLAYED_HEADER: 'true'})
+
+
+def store_response(request, key: str, response) -> IdempotencyKey:
+    """
+    Save inside the transaction that did the work. A concurrent request with the
+    same key blocks on the unique index until this commits, then fails with
+    IntegrityError and can replay.
+    """
+    return IdempotencyKey.objects.create(
+        user=request.user,
+        key=key,
+        request_hash=request_hash(request),
+        status_code=response.status_code,
+        response=response.data,
+        response_headers={name: response[name] for name in ('Location',) if response.has_header(name)})
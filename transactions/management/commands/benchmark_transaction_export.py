@@ -0,0 +1,78 @@
+import os
+import resource
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from events.models import EVENT_STATUS_CHOICES, Event
+from transactions.exports import EXPORT_TYPES, export_chunks, export_queryset
+from transactions.models import CHOICES_FOR_PAYMENT_METHOD, CHOICES_FOR_STATUS
+from users.models import User
+from utils.constants import TRANSACTION_EXPORT_CHUNK_SIZE
+
+
+def peak_rss_mb() -> float:
+    ## ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the streaming transaction export: seeds transaction logs in a transaction that is '
+            'rolled back, exports them and reports the time and the peak RSS of the process.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000000)
+        parser.add_argument('--type', choices=list(EXPORT_TYPES), default='csv')
+        parser.add_argument('--chunk-size', type=int, default=TRANSACTION_EXPORT_CHUNK_SIZE)
+        parser.add_argument('--output', default=os.devnull, help='Where the export is written.')
+        parser.add_argument('--max-rss-mb', type=float, default=256,
+                            help='Fail when the peak RSS of the process is above this.')
+
+    def seed(self, rows):
+        creator = User.objects.create_user(email='export-benchmark-creator@example.com', role='CREATOR')
+        consumer = User.objects.create_user(email='export-benchmark-consumer@example.com', role='CONSUMER')
+        event = Event.objects.create(
+            title='Export benchmark', user=creator, address='Benchmark address', state='Lagos',
+            country='Nigeria', status=EVENT_STATUS_CHOICES[1][0], price=5000)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO transaction_logs (event_name, reference, event_id, user_id, payed_by_id, amount,
+                                              currency, fee, quantity, status, payment_method, created_at,
+                                              updated_at)
+                SELECT %(title)s, 'export_benchmark_' || g, %(event)s, %(creator)s, %(consumer)s, 500000,
+                       'NGN', 7500, 1 + g %% 4, (%(statuses)s::text[])[1 + g %% 3], %(payment_method)s,
+                       now() - (g || ' seconds')::interval, now()
+                FROM generate_series(1, %(rows)s) g
+            """, {
+                'title': event.title, 'event': event.id, 'creator': creator.id, 'consumer': consumer.id,
+                'statuses': [choice[0] for choice in CHOICES_FOR_STATUS],
+                'payment_method': CHOICES_FOR_PAYMENT_METHOD[0][0], 'rows': rows,
+            })
+            cursor.execute('ANALYZE transaction_logs')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.seed(options['rows'])
+            self.stdout.write(f"Seeded {options['rows']} transaction logs in {time.perf_counter() - started:.1f}s")
+
+            rss_before = peak_rss_mb()
+            started = time.perf_counter()
+            first_chunk, written = None, 0
+            with open(options['output'], 'w', newline='') as output:
+                for chunk in export_chunks(export_queryset(), options['type'], options['chunk_size']):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                    output.write(chunk)
+                    written += len(chunk)
+            elapsed = time.perf_counter() - started
+            rss_after = peak_rss_mb()
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{options['type']}: {written / 1024 ** 2:.0f}MB in {elapsed:.1f}s, first chunk after "
+            f"{first_chunk or 0:.2f}s, peak RSS {rss_before:.0f}MB before the export, {rss_after:.0f}MB after")
+        if rss_after > options['max_rss_mb']:
+            raise CommandError(f"peak RSS {rss_after:.0f}MB is above {options['max_rss_mb']}MB")
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, seeded transaction logs were rolled back'))
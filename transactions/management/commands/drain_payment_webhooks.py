@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+
+from transactions.webhooks import drain_payment_webhooks
+from utils.constants import PAYMENT_WEBHOOK_BATCH_SIZE, PAYMENT_WORKER_POLL_SECONDS
+
+
+class Command(BaseCommand):
+    help = 'Settle transaction logs from received Paystack webhooks. Runs until stopped, several can run side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PAYMENT_WEBHOOK_BATCH_SIZE)
+        parser.add_argument('--poll', type=float, default=PAYMENT_WORKER_POLL_SECONDS,
+                            help='Seconds to wait when the inbox is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the inbox once and exit instead of polling.')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            drained = drain_payment_webhooks(options['batch_size'])
+            processed += drained
+
+            if not drained:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} webhooks'))
@@ -0,0 +1,38 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.exports import EXPORT_TYPES, export_chunks, export_queryset
+from utils.constants import TRANSACTION_EXPORT_CHUNK_SIZE
+from utils.date import parse_query_datetime
+
+
+class Command(BaseCommand):
+    help = 'Stream transaction logs as CSV or NDJSON to a file or stdout, with flat memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=list(EXPORT_TYPES), default='csv')
+        parser.add_argument('--output', help='File to write, stdout when omitted.')
+        parser.add_argument('--user', type=int, help='Only the logs of this creator.')
+        parser.add_argument('--created-after', help='ISO 8601 date or datetime, inclusive.')
+        parser.add_argument('--created-before', help='ISO 8601 date or datetime, exclusive.')
+        parser.add_argument('--chunk-size', type=int, default=TRANSACTION_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = export_queryset()
+        if options['user']:
+            queryset = queryset.filter(user_id=options['user'])
+
+        for option, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+            if options[option]:
+                created_at = parse_query_datetime(options[option])
+                if created_at is None:
+                    raise CommandError(f"--{option.replace('_', '-')} must be an ISO 8601 date or datetime")
+                queryset = queryset.filter(**{lookup: created_at})
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in export_chunks(queryset, options['type'], options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,51 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions.partitions import (add_months, archive_partition, detach_partition, ensure_partitions,
+                                     list_partitions, month_start, partition_name)
+from utils.constants import TRANSACTION_LOG_PARTITIONS_AHEAD
+
+
+class Command(BaseCommand):
+    help = ('Create the monthly transaction_logs partitions ahead of time and archive old ones. '
+            'Run on a schedule, e.g. daily.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=TRANSACTION_LOG_PARTITIONS_AHEAD,
+                            help='Months past the current one to have partitions for.')
+        parser.add_argument('--archive-older-than', type=int, metavar='MONTHS',
+                            help='Archive partitions that ended more than this many months ago.')
+        parser.add_argument('--archive-dir', help='Directory the gzipped CSV of each archived partition goes to.')
+        parser.add_argument('--detach-only', action='store_true',
+                            help='Detach old partitions and keep them as plain tables instead of archiving.')
+
+    def handle(self, *args, **options):
+        for month in ensure_partitions(options['ahead']):
+            self.stdout.write(f'Created {partition_name(month)}')
+
+        months = options['archive_older_than']
+        if months is None:
+            self.stdout.write(self.style.SUCCESS('Transaction log partitions are up to date'))
+            return
+        if months < 1:
+            raise CommandError('--archive-older-than must be at least 1 month')
+        if not options['detach_only'] and not options['archive_dir']:
+            raise CommandError('--archive-dir is required unless --detach-only is given')
+        if options['archive_dir']:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+
+        ## a partition is old once its whole range is before the cutoff
+        cutoff = add_months(month_start(timezone.now()), -months)
+        for month in list_partitions():
+            if add_months(month, 1) > cutoff:
+                break
+
+            if options['detach_only']:
+                detach_partition(month)
+                self.stdout.write(f'Detached {partition_name(month)}')
+            else:
+                rows = archive_partition(month, options['archive_dir'])
+                self.stdout.write(f'Archived {partition_name(month)} ({rows} rows)')
+
+        self.stdout.write(self.style.SUCCESS('Transaction log partitions are up to date'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from utils.paystack_stub import PaystackStubServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local Paystack stub. Point PAYSTACK_BASE_URL at it for development and load tests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency-ms', type=float, default=0,
+                            help='Mean response time, each response takes 0.5x to 1.5x of it.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered 503.')
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of charges declined.')
+
+    def handle(self, *args, **options):
+        server = PaystackStubServer(
+            (options['host'], options['port']),
+            latency_ms=options['latency_ms'],
+            error_rate=options['error_rate'],
+            decline_rate=options['decline_rate'],
+            verbose=options['verbosity'] > 1)
+
+        self.stdout.write(self.style.SUCCESS(f'Paystack stub listening on {server.url}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+
+from transactions.payments import process_pending_payments
+from utils.constants import PAYMENT_WORKER_BATCH_SIZE, PAYMENT_WORKER_POLL_SECONDS
+
+
+class Command(BaseCommand):
+    help = 'Charge queued ticket purchases. Runs until stopped, several workers can run side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PAYMENT_WORKER_BATCH_SIZE)
+        parser.add_argument('--poll', type=float, default=PAYMENT_WORKER_POLL_SECONDS,
+                            help='Seconds to wait when the queue is empty or Paystack is down.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit instead of polling.')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            charged = process_pending_payments(options['batch_size'])
+            processed += charged
+
+            if not charged:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} payments'))
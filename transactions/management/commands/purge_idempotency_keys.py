@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from transactions.models import IdempotencyKey
+from utils.constants import IDEMPOTENCY_KEY_PURGE_BATCH_SIZE, IDEMPOTENCY_KEY_TTL_HOURS
+
+
+class Command(BaseCommand):
+    help = f'Delete idempotency keys older than {IDEMPOTENCY_KEY_TTL_HOURS}h. Run on a schedule, e.g. hourly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=IDEMPOTENCY_KEY_PURGE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        purged = IdempotencyKey.purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} idempotency keys'))
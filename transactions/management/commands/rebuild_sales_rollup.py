@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse
+
+from transactions.models import DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = 'Backfill (or repair) the daily sales rollup from transaction logs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day (YYYY-MM-DD, UTC) to rebuild, every day when omitted.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = dateparse.parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a YYYY-MM-DD date')
+
+        written = DailySalesRollup.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily sales rollup rows'))
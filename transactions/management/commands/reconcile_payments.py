@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions.models import ReconciliationCheckpoint
+from transactions.reconciliation import find_unrecorded_charges, reconcile_pending_logs
+from utils.constants import RECONCILIATION_CHUNK_SIZE, RECONCILIATION_WORKERS
+from utils.date import parse_query_datetime
+from utils.paystack import PaystackError, paystack_enabled
+
+
+class Command(BaseCommand):
+    help = ('Reconcile transaction logs with Paystack: settle PENDING logs Paystack has an outcome for, '
+            'requeue the ones it never received and report charges with no log. '
+            'Interrupted runs resume from their checkpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', default='default', help='Checkpoint name, runs with different names are independent.')
+        parser.add_argument('--restart', action='store_true', help='Discard the checkpoint and start over.')
+        parser.add_argument('--since', help='Only logs and charges created from this ISO 8601 date or datetime.')
+        parser.add_argument('--chunk-size', type=int, default=RECONCILIATION_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=RECONCILIATION_WORKERS,
+                            help='Concurrent Paystack requests.')
+        parser.add_argument('--skip-unrecorded', action='store_true',
+                            help="Don't page through Paystack's transactions looking for unrecorded charges.")
+
+    def handle(self, *args, **options):
+        if not paystack_enabled():
+            raise CommandError('PAYSTACK_BASE_URL is not set')
+
+        since = None
+        if options['since']:
+            since = parse_query_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO 8601 date or datetime')
+
+        if options['restart']:
+            ReconciliationCheckpoint.objects.filter(name=options['run']).delete()
+        checkpoint, created = ReconciliationCheckpoint.objects.get_or_create(name=options['run'])
+        if checkpoint.finished_at:
+            raise CommandError(f"run '{checkpoint.name}' finished at {checkpoint.finished_at}, pass --restart")
+        if not created:
+            self.stdout.write(f'Resuming after log {checkpoint.last_id}, provider page {checkpoint.last_page}')
+
+        reconcile_pending_logs(checkpoint, options['chunk_size'], options['workers'], since)
+
+        if not options['skip_unrecorded']:
+            try:
+                for charge in find_unrecorded_charges(checkpoint, options['workers'], since):
+                    self.stdout.write(
+                        f"Unrecorded charge {charge['reference']}: {charge.get('amount')} {charge.get('currency')}")
+            except PaystackError as e:
+                raise CommandError(f'paystack transaction list failed, rerun to resume: {e}')
+
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=['finished_at', 'updated_at'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checkpoint.checked} pending logs: {checkpoint.settled} settled, '
+            f'{checkpoint.requeued} requeued, {checkpoint.errors} unresolved. '
+            f'{checkpoint.unrecorded} unrecorded charges'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from transactions.models import TicketHold
+from utils.constants import TICKET_HOLD_SWEEP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Release expired ticket holds back into inventory. Run on a schedule, e.g. every minute.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=TICKET_HOLD_SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        released = TicketHold.release_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired ticket holds'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    ## build on large live tables without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('events', '0004_event_query_indexes'),
+        ('transactions', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transactionlog',
+            index=models.Index(fields=['payed_by', '-created_at', '-id'], name='tx_logs_payer_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transactionlog',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='tx_logs_creator_created_idx'),
+        ),
+    ]
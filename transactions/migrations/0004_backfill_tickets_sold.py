@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:50
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_tickets_sold(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    TransactionLog = apps.get_model('transactions', 'TransactionLog')
+
+    ## pending payments still hold their tickets
+    sold = TransactionLog.objects.filter(
+        event=OuterRef('pk')
+    ).exclude(status='FAILED').order_by().values('event').annotate(total=Sum('quantity')).values('total')
+
+    Event.objects.update(tickets_sold=Coalesce(Subquery(sold), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_event_tickets_sold'),
+        ('transactions', '0003_transactionlog_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_tickets_sold, migrations.RunPython.noop),
+    ]
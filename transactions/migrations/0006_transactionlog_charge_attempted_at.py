@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:47
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('events', '0011_event_tickets_held'),
+        ('transactions', '0005_ticket_holds'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionlog',
+            name='charge_attempted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='transactionlog',
+            index=models.Index(condition=models.Q(('charge_attempted_at__isnull', True), ('status', 'PENDING')), fields=['created_at'], name='tx_logs_unclaimed_idx'),
+        ),
+    ]
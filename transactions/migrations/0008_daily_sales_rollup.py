@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_event_tickets_held'),
+        ('transactions', '0007_idempotency_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('USD', 'US Dollar'), ('EUR', 'Euro'), ('NGN', 'Nigerian Naira'), ('GBP', 'British Pound'), ('KES', 'Kenyan Shilling')], max_length=10)),
+                ('day', models.DateField()),
+                ('amount', models.PositiveBigIntegerField(default=0)),
+                ('fee', models.PositiveBigIntegerField(default=0)),
+                ('quantity', models.PositiveBigIntegerField(default=0)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='events.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'daily_sales_rollup',
+                'indexes': [models.Index(fields=['user', 'day'], name='daily_sales_rollup_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'event', 'currency', 'day'), name='daily_sales_rollup_key')],
+            },
+        ),
+    ]
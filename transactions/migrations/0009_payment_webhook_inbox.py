@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('events', '0011_event_tickets_held'),
+        ('transactions', '0008_daily_sales_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=64)),
+                ('reference', models.CharField(blank=True, default='', max_length=256)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'payment_webhook_inbox',
+            },
+        ),
+        ## build the index without blocking writes, then promote it to the constraint
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS tx_logs_reference_unique '
+                        'ON transaction_logs (reference)',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS tx_logs_reference_unique',
+                ),
+                migrations.RunSQL(
+                    sql='ALTER TABLE transaction_logs ADD CONSTRAINT tx_logs_reference_unique '
+                        'UNIQUE USING INDEX tx_logs_reference_unique',
+                    reverse_sql='ALTER TABLE transaction_logs DROP CONSTRAINT tx_logs_reference_unique',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='transactionlog',
+                    constraint=models.UniqueConstraint(fields=('reference',), name='tx_logs_reference_unique'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='paymentwebhookevent',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='webhook_inbox_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,123 @@
+from datetime import date, datetime, timezone
+
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+
+
+## months created past the current one, manage_transaction_partitions keeps this topped up
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def partition_transaction_logs(apps, schema_editor):
+    """
+    Rebuild transaction_logs as a table range partitioned by month on created_at.
+    Rows are copied into the new table, then the indexes, checks and foreign keys
+    of the old one are recreated under their names. Postgres needs the partition
+    key in every unique constraint, so the primary key becomes (id, created_at)
+    and reference is unique per created_at. id moves from an identity column,
+    which partitioned tables don't support, to an owned sequence.
+
+    Needs a maintenance window: the migration is one transaction holding an
+    ACCESS EXCLUSIVE lock on transaction_logs from start to end, so every read
+    and write of the table (purchases, history, the payment and webhook
+    workers) waits for the whole copy plus the index builds. Stop the workers
+    first and time a run against a restored production snapshot.
+
+    Reference stops being unique across the table here; migration 0012 brings
+    that back with the transaction_references lookup table, which also lets
+    lookups by reference read a single partition.
+
+    Irreversible, see unpartition_transaction_logs.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        ## taken up front: a write committed while the copy runs would be dropped with the old table
+        cursor.execute('LOCK TABLE transaction_logs IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'transaction_logs' "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = 'transaction_logs'::regclass)")
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = 'transaction_logs'::regclass AND contype IN ('c', 'f')")
+        constraints = cursor.fetchall()
+
+        cursor.execute("SELECT min(created_at), max(created_at), now() FROM transaction_logs")
+        oldest, newest, now = cursor.fetchone()
+        first_month = (oldest or now).astimezone(timezone.utc).date().replace(day=1)
+        last_month = _add_months(max(newest or now, now).astimezone(timezone.utc).date().replace(day=1),
+                                 PARTITIONS_AHEAD)
+
+        cursor.execute(
+            'CREATE TABLE transaction_logs_partitioned (LIKE transaction_logs INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (created_at)')
+        month = first_month
+        while month <= last_month:
+            cursor.execute(
+                f'CREATE TABLE transaction_logs_y{month.year:04d}m{month.month:02d} '
+                f'PARTITION OF transaction_logs_partitioned FOR VALUES FROM (%s) TO (%s)',
+                [_bound(month), _bound(_add_months(month, 1))])
+            month = _add_months(month, 1)
+        ## catches rows outside every monthly partition instead of failing the insert
+        cursor.execute('CREATE TABLE transaction_logs_default PARTITION OF transaction_logs_partitioned DEFAULT')
+
+        cursor.execute('INSERT INTO transaction_logs_partitioned SELECT * FROM transaction_logs')
+        cursor.execute('DROP TABLE transaction_logs')
+        cursor.execute('ALTER TABLE transaction_logs_partitioned RENAME TO transaction_logs')
+
+        cursor.execute('CREATE SEQUENCE transaction_logs_id_seq OWNED BY transaction_logs.id')
+        cursor.execute("SELECT setval('transaction_logs_id_seq', COALESCE(max(id), 0) + 1, false) FROM transaction_logs")
+        cursor.execute("ALTER TABLE transaction_logs ALTER COLUMN id SET DEFAULT nextval('transaction_logs_id_seq')")
+
+        cursor.execute('ALTER TABLE transaction_logs ADD CONSTRAINT transaction_logs_pkey PRIMARY KEY (id, created_at)')
+        cursor.execute(
+            'ALTER TABLE transaction_logs ADD CONSTRAINT tx_logs_reference_unique UNIQUE (reference, created_at)')
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE transaction_logs ADD CONSTRAINT {name} {definition}')
+
+
+def unpartition_transaction_logs(apps, schema_editor):
+    """
+    Not done on purpose: copying back would need the same maintenance window,
+    and references duplicated since would break the unique index on reference
+    alone. Restore the snapshot taken before migrating forward instead.
+    """
+    raise IrreversibleError(
+        'transactions 0010 partitioned transaction_logs and cannot be reversed, '
+        'restore the database snapshot taken before it')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_payment_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(partition_transaction_logs, unpartition_transaction_logs),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name='transactionlog',
+                    name='tx_logs_reference_unique',
+                ),
+                migrations.AddConstraint(
+                    model_name='transactionlog',
+                    constraint=models.UniqueConstraint(
+                        fields=('reference', 'created_at'), name='tx_logs_reference_unique'),
+                ),
+            ],
+        ),
+    ]
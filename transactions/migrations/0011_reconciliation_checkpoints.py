@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_partition_transaction_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('last_id', models.PositiveBigIntegerField(default=0)),
+                ('last_page', models.PositiveIntegerField(default=0)),
+                ('checked', models.PositiveBigIntegerField(default=0)),
+                ('settled', models.PositiveBigIntegerField(default=0)),
+                ('requeued', models.PositiveBigIntegerField(default=0)),
+                ('unrecorded', models.PositiveBigIntegerField(default=0)),
+                ('errors', models.PositiveBigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'reconciliation_checkpoints',
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+## keep transaction_references in step with every write to transaction_logs, including
+## bulk inserts and raw SQL. A duplicate reference fails the insert of the log.
+REFERENCE_TRIGGERS = """
+CREATE FUNCTION transaction_references_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM transaction_references WHERE reference = OLD.reference;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO transaction_references (reference, log_id, created_at)
+        VALUES (NEW.reference, NEW.id, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER transaction_references_insert AFTER INSERT ON transaction_logs
+    FOR EACH ROW EXECUTE FUNCTION transaction_references_sync();
+CREATE TRIGGER transaction_references_update AFTER UPDATE OF reference, created_at ON transaction_logs
+    FOR EACH ROW EXECUTE FUNCTION transaction_references_sync();
+CREATE TRIGGER transaction_references_delete AFTER DELETE ON transaction_logs
+    FOR EACH ROW EXECUTE FUNCTION transaction_references_sync();
+"""
+
+## CREATE TRIGGER holds off writes until the migration commits, so no log lands between the
+## triggers and the backfill; reads carry on. Fails on references duplicated while only
+## (reference, created_at) was unique, fix those first.
+BACKFILL = """
+INSERT INTO transaction_references (reference, log_id, created_at)
+SELECT reference, id, created_at FROM transaction_logs;
+"""
+
+DROP_REFERENCE_TRIGGERS = """
+DROP TRIGGER transaction_references_insert ON transaction_logs;
+DROP TRIGGER transaction_references_update ON transaction_logs;
+DROP TRIGGER transaction_references_delete ON transaction_logs;
+DROP FUNCTION transaction_references_sync();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_reconciliation_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionReference',
+            fields=[
+                ('reference', models.CharField(max_length=256, primary_key=True, serialize=False)),
+                ('log_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'transaction_references',
+            },
+        ),
+        migrations.RunSQL(sql=REFERENCE_TRIGGERS + BACKFILL, reverse_sql=DROP_REFERENCE_TRIGGERS),
+    ]
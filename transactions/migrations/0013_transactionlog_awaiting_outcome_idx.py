@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_event_tickets_held'),
+        ('transactions', '0012_transaction_references'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        ## CONCURRENTLY can't build on a partitioned table. Writes wait while each partition is
+        ## scanned, the index itself only holds the few claimed logs still PENDING
+        migrations.AddIndex(
+            model_name='transactionlog',
+            index=models.Index(condition=models.Q(('charge_attempted_at__isnull', False), ('status', 'PENDING')), fields=['id'], name='tx_logs_awaiting_outcome_idx'),
+        ),
+    ]
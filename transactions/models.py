@@ -1,8 +1,16 @@
-from django.db import models
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
 
 from events.models import CURRENCY_CHOICES
 from users.models import User
 from events.models import Event
+from notifications.models import Notifications
+from utils.constants import (IDEMPOTENCY_KEY_PURGE_BATCH_SIZE, IDEMPOTENCY_KEY_TTL_HOURS, MAXIMUM_ACTIVE_HOLDS_PER_EVENT,
+                             MAXIMUM_IDEMPOTENCY_KEY_LENGTH, TICKET_HOLD_MINUTES, TICKET_HOLD_SWEEP_BATCH_SIZE)
 
 CHOICES_FOR_STATUS = [
     ("PENDING", "Pending Payment"),
@@ -34,12 +42,397 @@ class TransactionLog(models.Model):
         choices= CHOICES_FOR_PAYMENT_METHOD,
         default = CHOICES_FOR_PAYMENT_METHOD[0][0])
     error_message_from_payment_service = models.TextField(null=True, blank=True)
+    ## set when a payment worker picks the log up, PENDING logs with it set await the provider
+    charge_attempted_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "transaction_logs"
+        ## range partitioned by month on created_at (migration 0010), so unique
+        ## constraints carry created_at and the primary key is (id, created_at) in the database.
+        ## References are unique across partitions through TransactionReference
+        constraints = [
+            models.UniqueConstraint(fields=['reference', 'created_at'], name='tx_logs_reference_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['payed_by', '-created_at', '-id'], name='tx_logs_payer_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='tx_logs_creator_created_idx'),
+            ## the payment queue, only unclaimed logs
+            models.Index(
+                fields=['created_at'],
+                condition=Q(status=CHOICES_FOR_STATUS[0][0], charge_attempted_at__isnull=True),
+                name='tx_logs_unclaimed_idx'),
+            ## claimed logs still waiting for their outcome, walked by id by reconcile_payments
+            models.Index(
+                fields=['id'],
+                condition=Q(status=CHOICES_FOR_STATUS[0][0], charge_attempted_at__isnull=False),
+                name='tx_logs_awaiting_outcome_idx'),
+        ]
 
-        
+    @property
+    def key(self) -> tuple:
+        """(id, created_at), the primary key of the row in the partitioned table."""
+        return self.id, self.created_at
 
+    @classmethod
+    def for_keys(cls, keys):
+        """
+        Logs by (id, created_at) keys. The created_at values let Postgres read
+        only the partitions they fall in, an id alone is looked up in every one.
+        """
+        keys = list(keys)
+        return cls.objects.filter(
+            id__in={log_id for log_id, _ in keys}, created_at__in={created_at for _, created_at in keys})
+
+    @classmethod
+    def for_references(cls, references):
+        """Logs by reference, located through TransactionReference so only their partitions are read."""
+        return cls.for_keys(TransactionReference.objects.filter(
+            reference__in=list(references)).values_list('log_id', 'created_at'))
+
+    @classmethod
+    @transaction.atomic
+    def apply_payment_results(cls, results: dict) -> list:
+        """
+        Settle PENDING logs from payment provider responses, {log key: response}
+        (see TransactionLog.key). Failed payments hand their tickets back; payer
+        and creator are notified. Logs that are no longer PENDING are skipped, so
+        results can be replayed.
+        """
+        pending, failed = CHOICES_FOR_STATUS[0][0], CHOICES_FOR_STATUS[2][0]
+        logs = cls.for_keys(results).select_for_update(of=('self',)).select_related('user', 'payed_by').filter(
+            status=pending)
+
+        settled, released, notifications = [], Counter(), []
+        now = timezone.now()
+        for log in logs:
+            response = results[log.key]
+            status = response.get('status')
+            if status == pending:
+                continue
+
+            log.status = status
+            log.fee = response.get('fee', log.fee)
+            log.payment_method = response.get('payment_method', log.payment_method)
+            log.error_message_from_payment_service = response.get('error_message_from_payment_service')
+            log.updated_at = now
+            settled.append(log)
+
+            if status == failed:
+                released[log.event_id] += log.quantity
+
+            notification_message = f'{status} transaction for event {log.event_id}'
+            notifications.extend([
+                {"user": log.payed_by, "message": notification_message}, ##notify consumer
+                {"user": log.user, "message": notification_message} ##notify creator
+            ])
+
+        if not settled:
+            return settled
+
+        ## bulk_update filters the queryset it's called on by id, created_at keeps it to their partitions
+        cls.objects.filter(created_at__in={log.created_at for log in settled}).bulk_update(settled, [
+            'status', 'fee', 'payment_method', 'error_message_from_payment_service', 'updated_at'])
+        for event_id, quantity in released.items():
+            Event.release_tickets(event_id, quantity)
+        DailySalesRollup.add_sales(log for log in settled if log.status == CHOICES_FOR_STATUS[1][0])
+        Notifications.new_bulk_entry(notifications)
+
+        return settled
+
+
+class TransactionReference(models.Model):
+    """
+    reference => (id, created_at) of its transaction log. transaction_logs can
+    only enforce uniqueness per partition, so this table keeps references unique
+    across all of them and turns a lookup by reference into one that reads a
+    single partition. Maintained by triggers on transaction_logs (migration 0012),
+    whatever writes the rows. References of archived partitions stay taken.
+    """
+
+    reference = models.CharField(max_length=256, primary_key=True)
+    log_id = models.BigIntegerField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'transaction_references'
+
+
+class TicketHold(models.Model):
+    """
+    Tickets set aside for a consumer while they pay. Event.tickets_held is the
+    running total of these rows, so availability never needs a SUM over holds.
+    """
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'ticket_holds'
+        indexes = [
+            models.Index(fields=['expires_at'], name='ticket_holds_expires_idx'),
+        ]
+
+    class LimitReached(Exception):
+        """The user already has MAXIMUM_ACTIVE_HOLDS_PER_EVENT active holds on the event."""
+
+    @classmethod
+    @transaction.atomic
+    def place(cls, event_id, user, quantity: int):
+        """
+        Hold `quantity` tickets for TICKET_HOLD_MINUTES, None when they are not available.
+        Raises LimitReached when the user already holds MAXIMUM_ACTIVE_HOLDS_PER_EVENT
+        times on the event, so one account can't take a sale off the market.
+        """
+        ## the user's row serializes their concurrent holds, so two can't both pass the count
+        User.objects.select_for_update().filter(id=user.id).values_list('id').first()
+        active = cls.objects.filter(event_id=event_id, user=user, expires_at__gt=timezone.now()).count()
+        if active >= MAXIMUM_ACTIVE_HOLDS_PER_EVENT:
+            raise cls.LimitReached()
+
+        if not Event.hold_tickets(event_id, quantity):
+            return None
+
+        return cls.objects.create(
+            event_id=event_id, user=user, quantity=quantity,
+            expires_at=timezone.now() + timedelta(minutes=TICKET_HOLD_MINUTES))
+
+    @classmethod
+    def release(cls, hold_id, user) -> bool:
+        """Give up a hold early, its tickets go back on sale."""
+        return cls._drop(sold=False, id=hold_id, user=user)
+
+    @classmethod
+    def convert(cls, hold_id, user, event_id, quantity: int) -> bool:
+        """Turn a hold into a purchase, its tickets move from held to sold."""
+        return cls._drop(sold=True, id=hold_id, user=user, event_id=event_id, quantity=quantity)
+
+    @classmethod
+    @transaction.atomic
+    def _drop(cls, sold: bool, **lookup) -> bool:
+        """False when the hold is gone (expired, swept or already used)."""
+        ## a hold the sweeper has locked is waited on, then found deleted
+        hold = cls.objects.select_for_update().filter(
+            expires_at__gt=timezone.now(), **lookup).first()
+        if hold is None:
+            return False
+
+        hold.delete()
+        counters = {'tickets_held': F('tickets_held') - hold.quantity}
+        if sold:
+            counters['tickets_sold'] = F('tickets_sold') + hold.quantity
+        Event.objects.filter(id=hold.event_id).update(**counters)
+        return True
+
+    @classmethod
+    def release_expired(cls, batch_size: int = TICKET_HOLD_SWEEP_BATCH_SIZE) -> int:
+        """
+        Sweep expired holds in batches: one locked read, one DELETE and one UPDATE
+        of the event counters per batch. Returns the number of holds released.
+        """
+        released = 0
+        while True:
+            with transaction.atomic():
+                expired = list(cls.objects.select_for_update(skip_locked=True).filter(
+                    expires_at__lte=timezone.now()
+                ).values_list('id', 'event_id', 'quantity')[:batch_size])
+                if not expired:
+                    return released
+
+                held = Counter()
+                for _, event_id, quantity in expired:
+                    held[event_id] += quantity
+
+                cls.objects.filter(id__in=[hold_id for hold_id, _, _ in expired]).delete()
+                Event.objects.filter(id__in=held).update(tickets_held=F('tickets_held') - Case(
+                    *[When(id=event_id, then=Value(quantity)) for event_id, quantity in held.items()],
+                    output_field=models.PositiveIntegerField()))
+
+            released += len(expired)
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response of a purchase, stored under the client's Idempotency-Key so a
+    retried request replays it instead of buying again. Kept for at least
+    IDEMPOTENCY_KEY_TTL_HOURS, then removed by the purge_idempotency_keys command.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=MAXIMUM_IDEMPOTENCY_KEY_LENGTH)
+    ## sha256 of the request body, a key can't be reused for a different request
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    response_headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_keys_user_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_keys_created_idx'),
+        ]
+
+    @classmethod
+    def purge_expired(cls, batch_size: int = IDEMPOTENCY_KEY_PURGE_BATCH_SIZE) -> int:
+        """Delete keys past their TTL in short batches. Returns the number deleted."""
+        cutoff = timezone.now() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+        purged = 0
+        while True:
+            ids = list(cls.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return purged
+            purged += cls.objects.filter(id__in=ids).delete()[0]
+
+
+
+class PaymentWebhookEvent(models.Model):
+    """
+    A verified Paystack webhook, stored as received so the endpoint can ack at
+    once. drain_payment_webhooks settles the logs they name in batches.
+    """
+
+    event = models.CharField(max_length=64)
+    reference = models.CharField(max_length=256, blank=True, default='')
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'payment_webhook_inbox'
+        indexes = [
+            ## the drain queue, only unprocessed events
+            models.Index(fields=['id'], condition=Q(processed_at__isnull=True),
+                         name='webhook_inbox_pending_idx'),
+        ]
+
+
+class DailySalesRollup(models.Model):
+    """
+    Successful sales per creator, event, currency and day (UTC, by purchase
+    time). Kept current by TransactionLog.apply_payment_results and rebuilt from
+    transaction_logs by the rebuild_sales_rollup command.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='+')
+    currency = models.CharField(max_length=10, choices=CURRENCY_CHOICES)
+    day = models.DateField()
+    amount = models.PositiveBigIntegerField(default=0)
+    fee = models.PositiveBigIntegerField(default=0)
+    quantity = models.PositiveBigIntegerField(default=0)
+    transactions = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_sales_rollup'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'event', 'currency', 'day'], name='daily_sales_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='daily_sales_rollup_user_idx'),
+        ]
+
+    UPSERT_SQL = """
+        INSERT INTO daily_sales_rollup
+            (user_id, event_id, currency, day, amount, fee, quantity, transactions, updated_at)
+        VALUES {values}
+        ON CONFLICT (user_id, event_id, currency, day) DO UPDATE SET
+            amount = daily_sales_rollup.amount + EXCLUDED.amount,
+            fee = daily_sales_rollup.fee + EXCLUDED.fee,
+            quantity = daily_sales_rollup.quantity + EXCLUDED.quantity,
+            transactions = daily_sales_rollup.transactions + EXCLUDED.transactions,
+            updated_at = EXCLUDED.updated_at
+    """
+
+    REBUILD_SQL = """
+        INSERT INTO daily_sales_rollup
+            (user_id, event_id, currency, day, amount, fee, quantity, transactions, updated_at)
+        SELECT user_id, event_id, currency, (created_at AT TIME ZONE 'UTC')::date,
+               SUM(amount), SUM(fee), SUM(quantity), COUNT(*), now()
+        FROM transaction_logs
+        WHERE status = %s AND created_at >= %s
+        GROUP BY 1, 2, 3, 4
+    """
+
+    @classmethod
+    def add_sales(cls, logs):
+        """
+        Fold SUCCESS logs into the rollup with one upsert. Must run in the
+        transaction that marks them SUCCESS so every sale is counted once.
+        """
+        totals = {}
+        for log in logs:
+            key = (log.user_id, log.event_id, log.currency, log.created_at.astimezone(dt_timezone.utc).date())
+            row = totals.setdefault(key, [0, 0, 0, 0])
+            row[0] += log.amount
+            row[1] += log.fee
+            row[2] += log.quantity
+            row[3] += 1
+
+        if not totals:
+            return
+
+        ## a fixed order keeps concurrent workers from deadlocking on each other's rows
+        now = timezone.now()
+        params = []
+        for key in sorted(totals):
+            params.extend([*key, *totals[key], now])
+
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(totals))
+        with connection.cursor() as cursor:
+            cursor.execute(cls.UPSERT_SQL.format(values=placeholders), params)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, since=None) -> int:
+        """
+        Recompute the rollup from transaction_logs, for every day from `since`
+        (a date) or for all time. Returns the number of rollup rows written.
+        """
+        ## blocks add_sales until we commit. Sales committed before the lock are in
+        ## our snapshot, the ones waiting on it are added on top afterwards
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {cls._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+
+        rollups = cls.objects.all()
+        start = datetime.min.replace(tzinfo=dt_timezone.utc)
+        if since is not None:
+            rollups = rollups.filter(day__gte=since)
+            start = datetime.combine(since, time.min, tzinfo=dt_timezone.utc)
+        rollups.delete()
+
+        with connection.cursor() as cursor:
+            cursor.execute(cls.REBUILD_SQL, [CHOICES_FOR_STATUS[1][0], start])
+            return cursor.rowcount
+
+
+class ReconciliationCheckpoint(models.Model):
+    """
+    Progress of a reconcile_payments run, saved after every chunk so an
+    interrupted run resumes where it stopped.
+    """
+
+    name = models.CharField(max_length=64, unique=True)
+    ## keyset position of the walk over transaction_logs, by id
+    last_id = models.PositiveBigIntegerField(default=0)
+    ## provider transaction list pages already compared
+    last_page = models.PositiveIntegerField(default=0)
+    checked = models.PositiveBigIntegerField(default=0)
+    settled = models.PositiveBigIntegerField(default=0)
+    requeued = models.PositiveBigIntegerField(default=0)
+    unrecorded = models.PositiveBigIntegerField(default=0)
+    errors = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'reconciliation_checkpoints'
@@ -0,0 +1,123 @@
+import gzip
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import TransactionLog
+
+
+## transaction_logs is range partitioned by month on created_at (UTC), see migration 0010
+PARENT_TABLE = TransactionLog._meta.db_table
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_NAME_PATTERN = re.compile(rf'^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def month_start(day) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def _bound(month: date) -> str:
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc).isoformat()
+
+
+def list_partitions() -> list:
+    """The months that have a partition, oldest first. The default partition is left out."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s", [PARENT_TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME_PATTERN.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+@transaction.atomic
+def create_partition(month: date) -> bool:
+    """
+    Create the partition of `month`. Rows that already landed in the default
+    partition for that month are moved into it. Returns False if it exists.
+    """
+    if month in list_partitions():
+        return False
+
+    name, start, end = partition_name(month), _bound(month), _bound(add_months(month, 1))
+    with connection.cursor() as cursor:
+        ## the default partition can't hold rows of a range that gets its own partition
+        cursor.execute(f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'CREATE TEMPORARY TABLE stray_transaction_logs (LIKE {PARENT_TABLE}) ON COMMIT DROP')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            f'INSERT INTO stray_transaction_logs SELECT * FROM moved', [start, end])
+        cursor.execute(
+            f'CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM (%s) TO (%s)', [start, end])
+        cursor.execute(f'INSERT INTO {name} SELECT * FROM stray_transaction_logs')
+        cursor.execute('DROP TABLE stray_transaction_logs')
+    return True
+
+
+def ensure_partitions(months_ahead: int) -> list:
+    """Create any missing partition from this month to `months_ahead` months out. Returns the new months."""
+    this_month = month_start(timezone.now().astimezone(dt_timezone.utc))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(this_month, offset)
+        if create_partition(month):
+            created.append(month)
+    return created
+
+
+def archive_partition(month: date, directory: str) -> int:
+    """
+    Write the partition of `month` to `<directory>/<partition>.csv.gz`, then
+    detach and drop it. Writes to the partition are blocked while it is copied,
+    and nothing is dropped unless the file holds every row. Returns the row count.
+    """
+    name = partition_name(month)
+    path = os.path.join(directory, f'{name}.csv.gz')
+    partial_path = f'{path}.partial'
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {name} IN SHARE MODE')
+        cursor.execute(f'SELECT count(*) FROM {name}')
+        expected = cursor.fetchone()[0]
+
+        with open(partial_path, 'wb') as raw:
+            with gzip.open(raw, 'wt', newline='') as archive:
+                cursor.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+                written = cursor.rowcount
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        if written != expected:
+            os.remove(partial_path)
+            raise RuntimeError(f'{name}: archived {written} of {expected} rows, partition kept')
+
+        cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'DROP TABLE {name}')
+
+    os.replace(partial_path, path)
+    return expected
+
+
+def detach_partition(month: date):
+    """Detach the partition of `month` and keep it as a plain table."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition_name(month)}')
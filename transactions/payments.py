@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CHOICES_FOR_STATUS, TransactionLog
+from utils.constants import PAYMENT_WORKER_BATCH_SIZE
+from utils.paystack import PaystackError, PaystackUnavailable, chargeCard
+
+
+def claim_pending_payments(batch_size: int = PAYMENT_WORKER_BATCH_SIZE) -> list:
+    """
+    Mark the oldest unclaimed PENDING logs as attempted and return them.
+    SKIP LOCKED lets several workers drain the queue without taking the same log,
+    and the claim commits before any provider call is made.
+    """
+    with transaction.atomic():
+        keys = list(TransactionLog.objects.select_for_update(skip_locked=True).filter(
+            status=CHOICES_FOR_STATUS[0][0], charge_attempted_at__isnull=True
+        ).order_by('created_at').values_list('id', 'created_at')[:batch_size])
+
+        TransactionLog.for_keys(keys).update(charge_attempted_at=timezone.now())
+
+    return list(TransactionLog.for_keys(keys).select_related('payed_by').order_by('created_at'))
+
+
+def process_pending_payments(batch_size: int = PAYMENT_WORKER_BATCH_SIZE) -> int:
+    """
+    Charge one batch of queued purchases and settle the results. Logs whose
+    charge was never sent (Paystack unavailable) go back on the queue. A log
+    whose outcome is unknown, or that the provider still reports as PENDING,
+    stays claimed and is never charged twice.
+    Returns the number of logs charged, 0 when the queue is empty or Paystack is down.
+    """
+    logs = claim_pending_payments(batch_size)
+
+    results, requeue = {}, []
+    for log in logs:
+        try:
+            results[log.key] = chargeCard(log)
+        except PaystackUnavailable:
+            requeue.append(log.key)
+        except PaystackError:
+            continue
+
+    if requeue:
+        TransactionLog.for_keys(requeue).filter(status=CHOICES_FOR_STATUS[0][0]).update(charge_attempted_at=None)
+
+    TransactionLog.apply_payment_results(results)
+    return len(logs) - len(requeue)
@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CHOICES_FOR_STATUS, ReconciliationCheckpoint, TransactionLog, TransactionReference
+from utils.constants import (PAYSTACK_LIST_PAGE_SIZE, RECONCILIATION_CHUNK_SIZE, RECONCILIATION_GRACE_MINUTES,
+                             RECONCILIATION_WORKERS)
+from utils.paystack import PaystackDeclined, PaystackError, get_paystack_client, payment_result
+
+
+VERIFIED, NOT_FOUND, UNKNOWN = 'verified', 'not_found', 'unknown'
+
+
+def _verify(reference: str):
+    try:
+        return VERIFIED, get_paystack_client().verify(reference).get('data') or {}
+    except PaystackDeclined as e:
+        ## paystack answers 404 to a reference it never received, any other refusal
+        ## (400, 401, 403) says nothing about the charge and is counted as an error
+        if e.status_code == 404:
+            return NOT_FOUND, None
+        return UNKNOWN, None
+    except PaystackError:
+        return UNKNOWN, None
+
+
+def stale_pending_logs(after_id: int, chunk_size: int, since=None) -> list:
+    """
+    The next chunk, by id, of PENDING logs whose charge was attempted longer
+    than RECONCILIATION_GRACE_MINUTES ago: the worker is done with them but
+    their outcome never arrived.
+    """
+    logs = TransactionLog.objects.filter(
+        status=CHOICES_FOR_STATUS[0][0],
+        charge_attempted_at__lt=timezone.now() - timedelta(minutes=RECONCILIATION_GRACE_MINUTES),
+        id__gt=after_id)
+    if since is not None:
+        logs = logs.filter(created_at__gte=since)
+    return list(logs.order_by('id').only('id', 'reference', 'created_at')[:chunk_size])
+
+
+def settle_chunk(checkpoint: ReconciliationCheckpoint, logs: list, outcomes: list):
+    """
+    Settle the logs Paystack has an outcome for and put the ones it never
+    received back on the payment queue. The checkpoint moves in the same
+    transaction, so a resumed run neither skips nor repeats a chunk.
+    """
+    pending = CHOICES_FOR_STATUS[0][0]
+    results, requeue, errors = {}, [], 0
+    for log, (outcome, data) in zip(logs, outcomes):
+        if outcome == VERIFIED:
+            result = payment_result(data)
+            if result['status'] != pending:
+                results[log.key] = result
+        elif outcome == NOT_FOUND:
+            requeue.append(log.key)
+        else:
+            errors += 1
+
+    with transaction.atomic():
+        settled = TransactionLog.apply_payment_results(results)
+        requeued = TransactionLog.for_keys(requeue).filter(status=pending).update(charge_attempted_at=None)
+        ReconciliationCheckpoint.objects.filter(id=checkpoint.id).update(
+            last_id=logs[-1].id,
+            checked=F('checked') + len(logs),
+            settled=F('settled') + len(settled),
+            requeued=F('requeued') + requeued,
+            errors=F('errors') + errors,
+            updated_at=timezone.now())
+
+    checkpoint.refresh_from_db()
+
+
+def reconcile_pending_logs(checkpoint: ReconciliationCheckpoint, chunk_size: int = RECONCILIATION_CHUNK_SIZE,
+                           workers: int = RECONCILIATION_WORKERS, since=None):
+    """
+    Walk stale PENDING logs from the checkpoint and verify each with Paystack,
+    `workers` calls at a time. The next chunk is read while the current one is
+    being verified.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        logs = stale_pending_logs(checkpoint.last_id, chunk_size, since)
+        while logs:
+            outcomes = pool.map(_verify, [log.reference for log in logs])
+            next_logs = stale_pending_logs(logs[-1].id, chunk_size, since)
+            settle_chunk(checkpoint, logs, list(outcomes))
+            logs = next_logs
+
+
+def find_unrecorded_charges(checkpoint: ReconciliationCheckpoint, workers: int = RECONCILIATION_WORKERS,
+                            since=None):
+    """
+    Page through Paystack's transactions, `workers` pages at a time, and yield
+    the successful ones with no TransactionLog. The list ends at the run's start
+    so pages don't shift under a resumed run. Raises PaystackError when a page
+    can't be fetched, the checkpoint keeps the pages already compared.
+    """
+    client = get_paystack_client()
+    filters = {'to': checkpoint.started_at.isoformat()}
+    if since is not None:
+        filters['from'] = since.isoformat()
+
+    def fetch(page):
+        return client.list_transactions(page, PAYSTACK_LIST_PAGE_SIZE, **filters)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        page_count = None
+        while page_count is None or checkpoint.last_page < page_count:
+            first_page = checkpoint.last_page + 1
+            pages = range(first_page, first_page + (1 if page_count is None else workers))
+
+            for page, response in zip(pages, pool.map(fetch, pages)):
+                page_count = (response.get('meta') or {}).get('pageCount') or 0
+                charges = {charge['reference']: charge for charge in response.get('data') or []
+                           if charge.get('reference') and charge.get('status') == 'success'}
+                recorded = set(TransactionReference.objects.filter(
+                    reference__in=list(charges)).values_list('reference', flat=True))
+                unrecorded = [charge for reference, charge in charges.items() if reference not in recorded]
+
+                ## reported before the page is checkpointed, a resumed run may repeat but never miss one
+                yield from unrecorded
+                ReconciliationCheckpoint.objects.filter(id=checkpoint.id).update(
+                    last_page=page, unrecorded=F('unrecorded') + len(unrecorded), updated_at=timezone.now())
+                checkpoint.refresh_from_db()
+
+                if page >= page_count:
+                    break
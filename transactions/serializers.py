@@ -1,7 +1,10 @@
-from multiprocessing import Event
+from datetime import timedelta
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import TransactionLog
+from .models import DailySalesRollup, TicketHold, TransactionLog
+from events.models import CURRENCY_CHOICES, EVENT_STATUS_CHOICES, Event
+from utils.constants import DEFAULT_SALES_ANALYTICS_DAYS, MAXIMUM_SALES_ANALYTICS_DAYS, MAXIMUM_TICKETS_PER_HOLD
 
 
 class TransactionLogSerializer (serializers.ModelSerializer):
@@ -9,6 +12,7 @@ class TransactionLogSerializer (serializers.ModelSerializer):
     event_id = serializers.CharField(write_only=True)
     amount = serializers.DecimalField(max_digits=10, decimal_places=2, write_only=True)
     quantity = serializers.IntegerField(write_only=True)
+    hold_id = serializers.IntegerField(write_only=True, required=False)
     # firstname = serializers.CharField(write_only=True, required=False)
     # lastname = serializers.CharField(write_only=True, required=False)
     # email = serializers.EmailField(write_only=True, required=False)
@@ -16,6 +20,8 @@ class TransactionLogSerializer (serializers.ModelSerializer):
     class Meta:
         model = TransactionLog
         fields = '__all__'
+        read_only_fields = ['event_name', 'reference', 'event', 'user', 'payed_by', 'currency', 'fee',
+                            'status', 'payment_method', 'error_message_from_payment_service']
 
     def validate(self, attrs):
         event_id = attrs.get('event_id', '')
@@ -32,6 +38,9 @@ class TransactionLogSerializer (serializers.ModelSerializer):
         if not event:
             raise serializers.ValidationError("event not found")
 
+        if event.status != EVENT_STATUS_CHOICES[1][0]:
+            raise serializers.ValidationError("event is not on sale")
+
         if amount <= 0:
             raise serializers.ValidationError("amount must be greater than zero")
 
@@ -62,6 +71,9 @@ class TransactionLogSerializer (serializers.ModelSerializer):
 
 class CreatorTransactionLogsListSerializer (serializers.ModelSerializer):
 
+    ## serialized from values() rows, where event is the raw id
+    event = serializers.UUIDField(read_only=True)
+
     class Meta:
         model = TransactionLog
         fields = ["reference", "event_name", "event",
@@ -70,10 +82,69 @@ class CreatorTransactionLogsListSerializer (serializers.ModelSerializer):
 
 class ConsumerTransactionLogsListSerializer (serializers.ModelSerializer):
 
+    ## serialized from values() rows, where event is the raw id
+    event = serializers.UUIDField(read_only=True)
+
     class Meta:
         model = TransactionLog
         fields = ["reference", "event_name", "event",
                   "status", "amount", "quantity", "created_at"]
 
 
+class TransactionStatusSerializer (serializers.ModelSerializer):
+
+    class Meta:
+        model = TransactionLog
+        fields = ["reference", "event_name", "event", "status", "amount", "fee", "currency",
+                  "quantity", "error_message_from_payment_service", "created_at", "updated_at"]
+
+
+class TicketHoldSerializer (serializers.ModelSerializer):
+
+    event_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAXIMUM_TICKETS_PER_HOLD)
+
+    class Meta:
+        model = TicketHold
+        fields = ['id', 'event_id', 'quantity', 'expires_at']
+        read_only_fields = ['id', 'expires_at']
+
+    def validate(self, attrs):
+        event = Event.objects.filter(id=attrs['event_id']).only('status').first()
+        if not event:
+            raise serializers.ValidationError("event not found")
+
+        if event.status != EVENT_STATUS_CHOICES[1][0]:
+            raise serializers.ValidationError("event is not on sale")
+
+        return attrs
+
+
+class SalesAnalyticsQuerySerializer (serializers.Serializer):
+
+    ## days are UTC and both ends are inclusive, the last DEFAULT_SALES_ANALYTICS_DAYS by default
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    event = serializers.UUIDField(required=False)
+    currency = serializers.ChoiceField(choices=CURRENCY_CHOICES, required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.now().date())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=DEFAULT_SALES_ANALYTICS_DAYS - 1))
 
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end")
+        if (attrs['end'] - attrs['start']).days >= MAXIMUM_SALES_ANALYTICS_DAYS:
+            raise serializers.ValidationError(f"at most {MAXIMUM_SALES_ANALYTICS_DAYS} days can be requested")
+
+        return attrs
+
+
+class DailySalesRollupSerializer (serializers.ModelSerializer):
+
+    ## serialized from values() rows, where event is the raw id
+    event = serializers.UUIDField(read_only=True)
+
+    class Meta:
+        model = DailySalesRollup
+        fields = ["day", "event", "currency", "amount", "fee", "quantity", "transactions"]
@@ -1,3 +1,641 @@
-from django.test import TestCase
+import csv
+import hashlib
+import hmac
+import json
+import queue
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+import requests
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from . import idempotency
+from .models import (CHOICES_FOR_STATUS, IdempotencyKey, PaymentWebhookEvent, ReconciliationCheckpoint, TicketHold,
+                     TransactionLog)
+from .partitions import DEFAULT_PARTITION, add_months, create_partition, month_start, partition_name
+from .payments import claim_pending_payments
+from .reconciliation import NOT_FOUND, UNKNOWN, VERIFIED, _verify, settle_chunk, stale_pending_logs
+from .webhooks import drain_payment_webhooks
+from events.models import EVENT_STATUS_CHOICES, Event
+from notifications.models import Notifications
+from users.models import User
+from utils.paystack import CircuitBreaker, PaystackClient, PaystackError, chargeCard
+from utils.constants import MAXIMUM_ACTIVE_HOLDS_PER_EVENT
+from utils.paystack_stub import PaystackStubServer
+from utils.testing import QueryPlanAssertions
+
+
+def create_event(creator, **fields):
+    return Event.objects.create(
+        title='Lagos music night', user=creator, address='1 Broad Street', state='Lagos', country='Nigeria',
+        **fields)
+
+
+class TransactionLogQueryPlanTests(QueryPlanAssertions, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creators = [User.objects.create_user(email=f'creator{index}@example.com', role='CREATOR')
+                    for index in range(20)]
+        cls.creator = creators[0]
+        cls.consumers = [User.objects.create_user(email=f'consumer{index}@example.com', role='CONSUMER')
+                         for index in range(20)]
+        events = [create_event(creator) for creator in creators]
+        statuses = [choice[0] for choice in CHOICES_FOR_STATUS]
+        TransactionLog.objects.bulk_create([
+            TransactionLog(event=events[index % 20], event_name='Lagos music night', reference=f'ref-{index}',
+                           user=creators[index % 20], payed_by=cls.consumers[index // 20 % 20], amount=5000,
+                           fee=75, quantity=1, status=statuses[index % len(statuses)])
+            for index in range(4000)
+        ])
+        ## most of the queue has been claimed already, like in production
+        TransactionLog.objects.filter(id__lt=3800).update(charge_attempted_at=timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE transaction_logs')
+
+    def get(self, user, path, data=None, indexes=()):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = self.assertSelectsUseIndexes(lambda: client.get(path, data), *indexes)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_consumer_history_uses_indexes(self):
+        self.get(self.consumers[0], '/api/v1/transactions/consumer/', indexes=['tx_logs_payer_created_idx'])
+
+    def test_creator_history_uses_indexes(self):
+        response = self.get(self.creator, '/api/v1/transactions/creator/', indexes=['tx_logs_creator_created_idx'])
+        self.get(self.creator, response.data['links']['next'], indexes=['tx_logs_creator_created_idx'])
+
+    def test_payment_queue_claim_uses_indexes(self):
+        logs = self.assertSelectsUseIndexes(lambda: claim_pending_payments(50), 'tx_logs_unclaimed_idx')
+        self.assertEqual(len(logs), 50)
+
+    def test_reconciliation_walk_uses_indexes(self):
+        TransactionLog.objects.update(charge_attempted_at=timezone.now() - timedelta(hours=1))
+        logs = self.assertSelectsUseIndexes(lambda: stale_pending_logs(0, 50), 'tx_logs_awaiting_outcome_idx')
+        self.assertEqual(len(logs), 50)
+
+
+class TransactionLogPartitionPruningTests(QueryPlanAssertions, TestCase):
+    """Queries bounded on created_at must only read the partitions of those months."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        consumer = User.objects.create_user(email='consumer@example.com', role='CONSUMER')
+        event = create_event(cls.creator)
+
+        cls.this_month = month_start(timezone.now().astimezone(dt_timezone.utc))
+        cls.months = [add_months(cls.this_month, offset) for offset in (-2, -1, 0)]
+        for month in cls.months:
+            create_partition(month)
+            logs = TransactionLog.objects.bulk_create([
+                TransactionLog(event=event, event_name=event.title, reference=f'ref-{month}-{index}',
+                               user=cls.creator, payed_by=consumer, amount=5000, fee=75, quantity=1)
+                for index in range(30)
+            ])
+            TransactionLog.objects.filter(id__in=[log.id for log in logs]).update(
+                created_at=cls.bound(month).replace(day=10))
+
+    @staticmethod
+    def bound(month):
+        return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+    def scanned_partitions(self, plan):
+        names = [partition_name(month) for month in self.months + [add_months(self.this_month, 1)]]
+        return {name for name in names + [DEFAULT_PARTITION] if name in plan}
+
+    def creator_history_plans(self, data):
+        client = APIClient()
+        client.force_authenticate(self.creator)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/v1/transactions/creator/', data)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, [self.explain(query['sql']) for query in queries.captured_queries
+                          if 'transaction_logs' in query['sql']]
+
+    def test_created_range_reads_one_partition(self):
+        last_month = self.months[1]
+        response, plans = self.creator_history_plans({
+            'created_after': self.bound(last_month).isoformat(),
+            'created_before': self.bound(self.this_month).isoformat(),
+            'limit': 50,
+        })
+        self.assertEqual(len(response.data['results']), 30)
+        self.assertEqual([self.scanned_partitions(plan) for plan in plans], [{partition_name(last_month)}])
+
+    def test_next_cursor_page_skips_newer_partitions(self):
+        response, _ = self.creator_history_plans({'limit': 30})
+        ## the first page is exactly this month's logs, the next one starts before it
+        client = APIClient()
+        client.force_authenticate(self.creator)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(response.data['links']['next'])
+        self.assertEqual(response.status_code, 200, response.content)
+        [sql] = [query['sql'] for query in queries.captured_queries if 'transaction_logs' in query['sql']]
+        self.assertNotIn(partition_name(add_months(self.this_month, 1)), self.explain(sql))
+
+    def test_reference_lookup_reads_one_partition(self):
+        last_month = self.months[1]
+        ## the logs were moved into their month after insert, the references followed
+        logs = TransactionLog.for_references([f'ref-{last_month}-1'])
+        self.assertEqual([log.created_at for log in logs], [self.bound(last_month).replace(day=10)])
+
+        plan = self.explain(*logs.query.sql_with_params())
+        self.assertEqual(self.scanned_partitions(plan), {partition_name(last_month)})
+
+        ## what the payment worker and the settle queries read by
+        plan = self.explain(*TransactionLog.for_keys([logs[0].key]).query.sql_with_params())
+        self.assertEqual(self.scanned_partitions(plan), {partition_name(last_month)})
+
+    def test_reference_is_unique_across_partitions(self):
+        log = TransactionLog.for_references([f'ref-{self.months[0]}-1']).get()
+        log.pk = None
+        log.created_at = timezone.now()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TransactionLog.objects.bulk_create([log])
+
+
+class TransactionExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator, other_creator = [
+            User.objects.create_user(email=f'creator{index}@example.com', role='CREATOR') for index in range(2)]
+        consumer = User.objects.create_user(email='consumer@example.com', role='CONSUMER')
+        cls.staff = User.objects.create_user(email='finance@example.com', role='CONSUMER')
+        User.objects.filter(id=cls.staff.id).update(is_staff=True)
+        cls.staff.is_staff = True
+        statuses = [choice[0] for choice in CHOICES_FOR_STATUS]
+        for creator in (cls.creator, other_creator):
+            event = create_event(creator)
+            TransactionLog.objects.bulk_create([
+                TransactionLog(event=event, event_name=event.title, reference=f'ref-{creator.id}-{index}',
+                               user=creator, payed_by=consumer, amount=5000 + index, fee=75, quantity=1,
+                               status=statuses[index % len(statuses)])
+                for index in range(25)
+            ])
+        ## half of the logs are from last year
+        last_year = TransactionLog.objects.filter(user=cls.creator).order_by('id').values('id')[:12]
+        TransactionLog.objects.filter(id__in=last_year).update(created_at=timezone.now() - timedelta(days=365))
+        cls.since = timezone.now() - timedelta(days=30)
+
+    def export(self, user, data):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/v1/transactions/export/', data)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def expected(self):
+        return TransactionLog.objects.filter(
+            user=self.creator, status=CHOICES_FOR_STATUS[1][0], created_at__gte=self.since
+        ).order_by('created_at', 'id')
+
+    def test_csv_is_the_filtered_rows(self):
+        content = self.export(self.creator, {
+            'status': CHOICES_FOR_STATUS[1][0], 'created_after': self.since.isoformat()})
+        rows = list(csv.DictReader(content.splitlines()))
+        expected = self.expected()
+
+        self.assertTrue(expected)
+        self.assertEqual([row['reference'] for row in rows], [log.reference for log in expected])
+        self.assertEqual([int(row['amount']) for row in rows], [log.amount for log in expected])
+        self.assertEqual({row['user_id'] for row in rows}, {str(self.creator.id)})
+
+    def test_ndjson_is_the_filtered_rows(self):
+        content = self.export(self.creator, {
+            'type': 'ndjson', 'status': CHOICES_FOR_STATUS[1][0], 'created_after': self.since.isoformat()})
+        rows = [json.loads(line) for line in content.splitlines()]
+
+        self.assertEqual([(row['reference'], row['created_at']) for row in rows],
+                         [(log.reference, DjangoJSONEncoder().default(log.created_at)) for log in self.expected()])
+
+    def test_staff_export_one_creator_at_a_time(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        self.assertEqual(client.get('/api/v1/transactions/export/').status_code, 400)
+
+        content = self.export(self.staff, {'user': self.creator.id})
+        self.assertEqual(len(list(csv.DictReader(content.splitlines()))), 25)
+
+
+class ParallelPurchaseTests(TransactionTestCase):
+    """
+    Buyers racing for the last tickets. `workers` threads, each on its own
+    connection, buy for every buyer in turn; Postgres' default max_connections
+    is 100, so there are fewer of them than buyers.
+    """
+
+    buyers = 300
+    workers = 50
+    total_tickets = 250
+
+    def setUp(self):
+        creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        self.event = create_event(creator, status=EVENT_STATUS_CHOICES[1][0], price=5000,
+                                  total_tickets=self.total_tickets)
+        self.consumers = User.objects.bulk_create([
+            User(email=f'consumer{index}@example.com', role='CONSUMER') for index in range(self.buyers)])
+
+    def purchase_in_parallel(self, quantities):
+        start = threading.Barrier(self.workers)
+        buyers = queue.SimpleQueue()
+        for index, quantity in enumerate(quantities):
+            buyers.put((index, quantity))
+        statuses = [None] * len(quantities)
+
+        def purchase():
+            try:
+                client = APIClient()
+                start.wait()
+                while True:
+                    try:
+                        index, quantity = buyers.get_nowait()
+                    except queue.Empty:
+                        return
+                    client.force_authenticate(self.consumers[index])
+                    statuses[index] = client.post('/api/v1/transactions/event-purchase/', {
+                        'event_id': str(self.event.id), 'amount': 5000, 'quantity': quantity}).status_code
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=purchase) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_parallel_purchases_never_oversell(self):
+        quantities = [1 + index % 2 for index in range(self.buyers)]
+        statuses = self.purchase_in_parallel(quantities)
+
+        self.assertEqual(set(statuses), {202, 409})
+        self.event.refresh_from_db()
+        sold = TransactionLog.objects.filter(event=self.event).aggregate(sold=Sum('quantity'))['sold']
+        self.assertEqual(sold, self.event.tickets_sold)
+        self.assertLessEqual(self.event.tickets_sold, self.total_tickets)
+        self.assertEqual(sold, sum(quantity for quantity, status in zip(quantities, statuses) if status == 202))
+        ## a buyer was only turned away when their quantity no longer fit
+        smallest_refused = min(quantity for quantity, status in zip(quantities, statuses) if status == 409)
+        self.assertGreater(self.event.tickets_sold + smallest_refused, self.total_tickets)
+
+
+class TicketHoldTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        cls.consumer = User.objects.create_user(email='consumer@example.com', role='CONSUMER')
+        cls.event = create_event(creator, status=EVENT_STATUS_CHOICES[1][0], price=5000, total_tickets=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.consumer)
+
+    def place(self, quantity):
+        return self.client.post('/api/v1/transactions/ticket-holds/',
+                                {'event_id': str(self.event.id), 'quantity': quantity})
+
+    def purchase(self, hold_id, quantity):
+        return self.client.post('/api/v1/transactions/event-purchase/', {
+            'event_id': str(self.event.id), 'amount': 5000, 'quantity': quantity, 'hold_id': hold_id})
+
+    def assertTickets(self, held, sold):
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.tickets_held, self.event.tickets_sold), (held, sold))
+
+    def test_place_and_release(self):
+        response = self.place(3)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTickets(held=3, sold=0)
+
+        self.assertEqual(self.client.delete(f"/api/v1/transactions/ticket-holds/{response.data['id']}/")
+                         .status_code, 204)
+        self.assertTickets(held=0, sold=0)
+        ## a hold is only released once
+        self.assertEqual(self.client.delete(f"/api/v1/transactions/ticket-holds/{response.data['id']}/")
+                         .status_code, 400)
+
+    def test_place_fails_without_enough_tickets(self):
+        self.assertEqual(self.place(8).status_code, 201)
+        self.assertEqual(self.place(3).status_code, 409)
+        self.assertTickets(held=8, sold=0)
+
+    def test_active_holds_per_event_are_limited(self):
+        for _ in range(MAXIMUM_ACTIVE_HOLDS_PER_EVENT):
+            self.assertEqual(self.place(1).status_code, 201)
+        self.assertEqual(self.place(1).status_code, 409)
+        self.assertTickets(held=MAXIMUM_ACTIVE_HOLDS_PER_EVENT, sold=0)
+
+        ## expired holds don't count
+        TicketHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.place(1).status_code, 201)
+
+    def test_convert_moves_held_tickets_to_sold(self):
+        hold_id = self.place(2).data['id']
+        response = self.purchase(hold_id, 2)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertTickets(held=0, sold=2)
+        self.assertFalse(TicketHold.objects.filter(id=hold_id).exists())
+
+    def test_converting_an_expired_hold_is_a_conflict(self):
+        hold_id = self.place(2).data['id']
+        TicketHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.purchase(hold_id, 2).status_code, 409)
+        self.assertTickets(held=2, sold=0)
+        self.assertFalse(TransactionLog.objects.exists())
+
+    def test_sweep_returns_expired_holds_to_inventory(self):
+        self.place(2)
+        live_id = self.place(3).data['id']
+        TicketHold.objects.exclude(id=live_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        output = StringIO()
+        call_command('release_expired_holds', '--batch-size', '1', stdout=output)
+        self.assertIn('Released 1 expired ticket holds', output.getvalue())
+        self.assertTickets(held=3, sold=0)
+        self.assertEqual(list(TicketHold.objects.values_list('id', flat=True)), [live_id])
+
+
+class IdempotentPurchaseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        cls.consumer = User.objects.create_user(email='consumer@example.com', role='CONSUMER')
+        cls.event = create_event(creator, status=EVENT_STATUS_CHOICES[1][0], price=5000, total_tickets=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.consumer)
+
+    def purchase(self, quantity=2, key='purchase-1'):
+        return self.client.post('/api/v1/transactions/event-purchase/', {
+            'event_id': str(self.event.id), 'amount': 5000, 'quantity': quantity}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def assertBoughtOnce(self, quantity=2):
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, quantity)
+        self.assertEqual(TransactionLog.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_replay_returns_the_original_response(self):
+        first = self.purchase()
+        self.assertEqual(first.status_code, 202, first.content)
+
+        replayed = self.purchase()
+        self.assertEqual(replayed.status_code, 202)
+        self.assertEqual(replayed.json(), first.json())
+        self.assertEqual(replayed['Location'], first['Location'])
+        self.assertEqual(replayed[idempotency.REPLAYED_HEADER], 'true')
+        self.assertBoughtOnce()
+
+        ## another key is another purchase
+        self.assertEqual(self.purchase(key='purchase-2').status_code, 202)
+        self.assertEqual(TransactionLog.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.purchase()
+        response = self.purchase(quantity=3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(idempotency.IDEMPOTENCY_HEADER, response.data['error'])
+        self.assertBoughtOnce()
+
+    def test_request_losing_the_race_for_its_key_replays_the_winner(self):
+        first = self.purchase()
+
+        ## the key wasn't stored yet when this request checked, it was when it stored its own
+        checks = []
+
+        def replay_response(request, key):
+            checks.append(key)
+            return idempotency.replay_response(request, key) if len(checks) > 1 else None
+
+        with mock.patch('transactions.views.replay_response', side_effect=replay_response):
+            response = self.purchase()
+        self.assertEqual(len(checks), 2)
+
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json(), first.json())
+        self.assertEqual(response[idempotency.REPLAYED_HEADER], 'true')
+        ## the losing request's tickets and log were rolled back
+        self.assertBoughtOnce()
+
+
+class PaystackWebhookTests(TestCase):
+
+    secret_key = 'sk_test_webhooks'
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        consumer = User.objects.create_user(email='consumer@example.com', role='CONSUMER')
+        cls.event = create_event(creator, status=EVENT_STATUS_CHOICES[1][0], price=5000, total_tickets=20)
+        TransactionLog.objects.bulk_create([
+            TransactionLog(event=cls.event, event_name=cls.event.title, reference=f'ref-{index}', user=creator,
+                           payed_by=consumer, amount=500000, fee=0, quantity=2)
+            for index in range(5)
+        ])
+        Event.objects.filter(id=cls.event.id).update(tickets_sold=10)
+
+    def setUp(self):
+        patcher = mock.patch('utils.paystack.PAYSTACK_SECRET_KEY', self.secret_key)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def deliver(self, event, reference, signature=None):
+        body = json.dumps({'event': event, 'data': {
+            'reference': reference, 'status': event.split('.')[1], 'fees': 7500,
+            'gateway_response': 'Declined'}}).encode()
+        if signature is None:
+            signature = hmac.new(self.secret_key.encode(), body, hashlib.sha512).hexdigest()
+        return APIClient().post('/api/v1/transactions/paystack-webhook/', body, content_type='application/json',
+                                HTTP_X_PAYSTACK_SIGNATURE=signature)
+
+    def drain(self, batch_size):
+        output = StringIO()
+        call_command('drain_payment_webhooks', '--once', '--batch-size', str(batch_size), stdout=output)
+        return output.getvalue()
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.deliver('charge.success', 'ref-0', signature='0' * 128).status_code, 403)
+        self.assertEqual(self.deliver('charge.success', 'ref-0', signature='').status_code, 403)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
+
+    def test_replayed_reference_is_applied_once(self):
+        for _ in range(2):
+            self.assertEqual(self.deliver('charge.failed', 'ref-0').status_code, 200)
+        self.drain(batch_size=1)
+        ## and once more after the log was settled
+        self.deliver('charge.failed', 'ref-0')
+        self.drain(batch_size=10)
+
+        log = TransactionLog.objects.get(reference='ref-0')
+        self.assertEqual(log.status, CHOICES_FOR_STATUS[2][0])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 8)
+        ## one notification each for the payer and the creator
+        self.assertEqual(Notifications.objects.count(), 2)
+
+    def test_drain_settles_in_batches(self):
+        for index in range(5):
+            self.deliver('charge.success', f'ref-{index}')
+        self.deliver('subscription.create', '')
+
+        with mock.patch('transactions.management.commands.drain_payment_webhooks.drain_payment_webhooks',
+                        wraps=drain_payment_webhooks) as drain:
+            self.assertIn('Processed 6 webhooks', self.drain(batch_size=2))
+        self.assertEqual([call.args for call in drain.call_args_list], [(2,)] * 4)
+
+        self.assertFalse(PaymentWebhookEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(set(TransactionLog.objects.values_list('status', 'fee')), {(CHOICES_FOR_STATUS[1][0], 7500)})
+
+
+class ReconcilePaymentsTests(TestCase):
+    """reconcile_payments against the Paystack stub."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(email='creator@example.com', role='CREATOR')
+        consumer = User.objects.create_user(email='consumer@example.com', role='CONSUMER')
+        cls.event = create_event(creator, status=EVENT_STATUS_CHOICES[1][0], price=5000, total_tickets=20)
+        TransactionLog.objects.bulk_create([
+            TransactionLog(event=cls.event, event_name=cls.event.title, reference=f'ref-{index}', user=creator,
+                           payed_by=consumer, amount=500000, fee=0, quantity=1)
+            for index in range(7)
+        ])
+        Event.objects.filter(id=cls.event.id).update(tickets_sold=7)
+        ## ref-6 was only just claimed, its charge may still be in flight
+        TransactionLog.objects.exclude(reference='ref-6').update(
+            charge_attempted_at=timezone.now() - timedelta(hours=1))
+        TransactionLog.objects.filter(reference='ref-6').update(charge_attempted_at=timezone.now())
+
+    def setUp(self):
+        self.stub = PaystackStubServer().start()
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        client = PaystackClient(base_url=self.stub.url, max_retries=0)
+        for name, value in (('PAYSTACK_BASE_URL', self.stub.url), ('_client', client)):
+            patcher = mock.patch(f'utils.paystack.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        ## ref-4 and ref-5 never reached Paystack, it has a charge we have no log of
+        for reference, status in (('ref-0', 'success'), ('ref-1', 'success'), ('ref-2', 'failed'),
+                                  ('ref-3', 'success'), ('unrecorded-1', 'success')):
+            self.stub.transactions[reference] = {
+                'reference': reference, 'amount': 500000, 'currency': 'NGN', 'status': status,
+                'gateway_response': 'Approved' if status == 'success' else 'Declined', 'fees': 7500}
+
+    def reconcile(self):
+        output = StringIO()
+        call_command('reconcile_payments', '--chunk-size', '2', '--workers', '2', stdout=output)
+        return output.getvalue()
+
+    def test_interrupted_run_resumes_from_its_checkpoint(self):
+        chunks = []
+
+        def settle_two_chunks(*args):
+            chunks.append(args[1])
+            if len(chunks) > 2:
+                raise RuntimeError('worker killed')
+            settle_chunk(*args)
+
+        with mock.patch('transactions.reconciliation.settle_chunk', side_effect=settle_two_chunks):
+            with self.assertRaises(RuntimeError):
+                self.reconcile()
+        checkpoint = ReconciliationCheckpoint.objects.get()
+        self.assertEqual((checkpoint.checked, checkpoint.last_id), (4, chunks[1][-1].id))
+
+        output = self.reconcile()
+        self.assertIn(f'Resuming after log {checkpoint.last_id}', output)
+        self.assertIn('Unrecorded charge unrecorded-1', output)
+        self.assertIn('Checked 6 pending logs: 4 settled, 2 requeued, 0 unresolved. 1 unrecorded charges', output)
+
+        statuses = dict(TransactionLog.objects.values_list('reference', 'status'))
+        pending, success, failed = (choice[0] for choice in CHOICES_FOR_STATUS)
+        self.assertEqual(statuses, {'ref-0': success, 'ref-1': success, 'ref-2': failed, 'ref-3': success,
+                                    'ref-4': pending, 'ref-5': pending, 'ref-6': pending})
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 6)
+
+    def test_logs_paystack_never_received_go_back_on_the_queue(self):
+        self.reconcile()
+        self.assertEqual(
+            sorted(TransactionLog.objects.filter(charge_attempted_at__isnull=True).values_list('reference', flat=True)),
+            ['ref-4', 'ref-5'])
+        ## and the payment worker picks them up again
+        self.assertEqual(sorted(log.reference for log in claim_pending_payments(10)), ['ref-4', 'ref-5'])
+
+
+def paystack_response(status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body.encode()
+    return response
+
+
+class PaystackClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = PaystackStubServer().start()
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        self.client = PaystackClient(base_url=self.stub.url, max_retries=0, breaker=CircuitBreaker(
+            failure_threshold=1, reset_timeout=0))
+        for name, value in (('PAYSTACK_BASE_URL', self.stub.url), ('_client', self.client)):
+            patcher = mock.patch(f'utils.paystack.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.log = SimpleNamespace(payed_by=SimpleNamespace(email='consumer@example.com'), amount=500000,
+                                   reference='ref-1', currency='NGN')
+
+    def test_broken_body_on_a_trial_call_leaves_the_breaker_usable(self):
+        self.client.breaker.record_failure()
+        broken_body = requests.exceptions.ChunkedEncodingError()
+        with mock.patch.object(self.client.session, 'request', side_effect=broken_body):
+            with self.assertRaises(PaystackError):
+                self.client.verify('ref-1')
+        self.assertFalse(self.client.breaker.trial_running)
+
+        ## the next trial call goes through
+        with mock.patch.object(self.client.session, 'request', return_value=paystack_response(200, 'not json')):
+            self.assertEqual(self.client.verify('ref-1'), {})
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_duplicate_reference_is_not_a_decline(self):
+        self.assertEqual(chargeCard(self.log)['status'], CHOICES_FOR_STATUS[1][0])
+        with self.assertRaises(PaystackError):
+            chargeCard(self.log)
+
+    def test_failed_charge_answer_is_a_decline(self):
+        body = '{"status": false, "message": "Declined", "data": {"status": "failed", "gateway_response": "Declined"}}'
+        with mock.patch.object(self.client.session, 'request', return_value=paystack_response(400, body)):
+            self.assertEqual(chargeCard(self.log)['status'], CHOICES_FOR_STATUS[2][0])
+
+    def test_development_charges_succeed_or_fail(self):
+        with mock.patch('utils.paystack.PAYSTACK_BASE_URL', None):
+            statuses = {chargeCard(self.log)['status'] for _ in range(50)}
+        self.assertEqual(statuses, {CHOICES_FOR_STATUS[1][0], CHOICES_FOR_STATUS[2][0]})
+
+    def test_reconciliation_only_requeues_references_paystack_never_received(self):
+        self.assertEqual(_verify('ref-1'), (NOT_FOUND, None))
+        chargeCard(self.log)
+        self.assertEqual(_verify('ref-1')[0], VERIFIED)
+
+        body = '{"status": false, "message": "Invalid key"}'
+        with mock.patch.object(self.client.session, 'request', return_value=paystack_response(401, body)):
+            self.assertEqual(_verify('ref-1'), (UNKNOWN, None))
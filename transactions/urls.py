@@ -1,9 +1,18 @@
 from django.urls import path
 from .views import (PurchaseEventAPIView, CreatorTransactionLogsListView,
-                    ConsumerTransactionLogsListView)
+                    ConsumerTransactionLogsListView, TicketHoldView, ReleaseTicketHoldView,
+                    TransactionStatusView, PaystackStatsView, ExportTransactionLogsView,
+                    SalesAnalyticsView, PaystackWebhookView)
 
 urlpatterns = [
     path('creator/', CreatorTransactionLogsListView.as_view(), name='creator_transactions_list'),
     path('consumer/', ConsumerTransactionLogsListView.as_view(), name='consumer_transactions_list'),
+    path('export/', ExportTransactionLogsView.as_view(), name='export_transactions'),
+    path('analytics/', SalesAnalyticsView.as_view(), name='sales_analytics'),
     path('event-purchase/', PurchaseEventAPIView.as_view(), name='purchase_event'),
+    path('status/<reference>/', TransactionStatusView.as_view(), name='transaction_status'),
+    path('paystack-webhook/', PaystackWebhookView.as_view(), name='paystack_webhook'),
+    path('paystack-stats/', PaystackStatsView.as_view(), name='paystack_stats'),
+    path('ticket-holds/', TicketHoldView.as_view(), name='ticket_hold'),
+    path('ticket-holds/<int:hold_id>/', ReleaseTicketHoldView.as_view(), name='release_ticket_hold'),
 ]
@@ -1,44 +1,100 @@
-from asyncio import Event
-from rest_framework import (views, permissions)
+import json
+from rest_framework import (generics, views, permissions)
+from rest_framework.exceptions import AuthenticationFailed, ParseError
 from rest_framework.response import Response
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.urls import reverse
 
 
 from .serializers import (
     ConsumerTransactionLogsListSerializer,
+    DailySalesRollupSerializer,
+    SalesAnalyticsQuerySerializer,
     CreatorTransactionLogsListSerializer, 
-    TransactionLogSerializer)
-from .models import TransactionLog
-from utils.paystack import chargeCard, generateTransactionReference
-from notifications.models import Notifications
+    TicketHoldSerializer,
+    TransactionLogSerializer,
+    TransactionStatusSerializer)
+from .exports import EXPORT_TYPES, export_chunks, export_queryset
+from .filters import TransactionLogFilter
+from .idempotency import get_idempotency_key, replay_response, store_response
+from .models import CHOICES_FOR_STATUS, DailySalesRollup, PaymentWebhookEvent, TicketHold, TransactionLog
+from events.models import Event
+from utils.exceptions import Conflict
+from utils.pagination import PAGINATION_MODE_CURSOR, CustomPagination
+from utils.paystack import generateTransactionReference, get_paystack_stats, verify_webhook_signature
+
+class TransactionLogsListView(generics.ListAPIView):
+    """
+    A user's transaction history, newest first, one cursor page at a time.
+    Rows are read with values() so no model instances are built.
+    """
 
-class ConsumerTransactionLogsListView(views.APIView):
-
-    serializer_class = ConsumerTransactionLogsListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [TransactionLogFilter]
+    pagination_class = CustomPagination
+    pagination_mode = PAGINATION_MODE_CURSOR
+    ## `user` for the creator, `payed_by` for the consumer
+    owner_field = None
 
-    def get(self,request):
+    def get_queryset(self):
+        fields = ['id', *self.serializer_class.Meta.fields]
+        return TransactionLog.objects.filter(
+            **{self.owner_field: self.request.user}
+        ).values(*fields).order_by('-created_at', '-id')
 
-        tx_logs = TransactionLog.objects.filter(payed_by=request.user).order_by("-created_at")
 
-        serializer = self.serializer_class(tx_logs, many=True)
-
-        return Response(serializer.data, status=200)
+class ConsumerTransactionLogsListView(TransactionLogsListView):
 
+    serializer_class = ConsumerTransactionLogsListSerializer
+    owner_field = 'payed_by'
 
 
-class CreatorTransactionLogsListView(views.APIView):
+class CreatorTransactionLogsListView(TransactionLogsListView):
 
     serializer_class = CreatorTransactionLogsListSerializer
+    owner_field = 'user'
+
+
+
+class ExportTransactionLogsView(generics.GenericAPIView):
+    """
+    Stream a creator's whole history as `?type=csv` (default) or `?type=ndjson`.
+    Staff (finance) export one creator with `?user=<id>`. Accepts the same
+    filters as the history list. Every creator at once (millions of rows) takes
+    longer than a web worker may spend on a request, finance runs the
+    export_transactions command for that.
+    """
+
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [TransactionLogFilter]
 
-    def get(self, request):
+    def get_queryset(self):
+        if not self.request.user.is_staff:
+            return export_queryset(self.request.user)
 
-        tx_logs = TransactionLog.objects.filter(user=request.user).order_by("-created_at")
+        user = self.request.query_params.get('user')
+        if not user:
+            raise ParseError("'user' is required, export every creator with the export_transactions command")
+        if not user.isdigit():
+            raise ParseError("'user' must be a user ID")
+        return export_queryset().filter(user_id=int(user))
 
-        serializer = self.serializer_class(tx_logs, many=True)
+    def get(self, request):
+        ## `format` is taken by DRF's content negotiation
+        export_type = request.query_params.get('type', 'csv')
+        if export_type not in EXPORT_TYPES:
+            raise ParseError(f"'type' must be one of {', '.join(EXPORT_TYPES)}")
 
-        return Response(serializer.data, status=200)
+        queryset = self.filter_queryset(self.get_queryset())
+
+        response = StreamingHttpResponse(
+            export_chunks(queryset, export_type), content_type=EXPORT_TYPES[export_type])
+        filename = f'transactions-{timezone.now():%Y%m%d%H%M%S}.{export_type}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
 
@@ -49,50 +105,180 @@ class PurchaseEventAPIView(views.APIView):
 
     def post(self, request):
 
+        ## a retried request gets the original response back, nothing is bought twice
+        idempotency_key = get_idempotency_key(request)
+        if idempotency_key:
+            replayed = replay_response(request, idempotency_key)
+            if replayed:
+                return replayed
+
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        with transaction.atomic():
-            bulkLogs, notificationsList = [], []
-            event = serializer.validated_data['event']
-
-            ## generate referenceId
-            referenceId = generateTransactionReference()
-
-            # Queue Transaction
-            payment_service_response = chargeCard()
-
-            ## create Transaction Logs for owner
-            bulkLogs.append(
-                TransactionLog(**{
-                    "event_name": event.title,
-                    "reference": referenceId,
-                    "event": event,
-                    "user": event.user,
-                    "payed_by": request.user,
-                    "quantity": serializer.validated_data['quantity'],
-                    "amount": event.price * 100,
-                    "currency": event.currency,
-                    "fee": payment_service_response.get('fee'),
-                    **payment_service_response
-                }))
-
-            ## save notifications object
-            payment_status = payment_service_response.get('status')
-            notification_message = f'{payment_status} transaction for event {event.id}'
-            notificationsList.extend([
-                {"user": request.user, "message": notification_message}, ##notify consumer
-                {"user": event.user, "message": notification_message} ##notify creator
-                ])
-
-            transactionLogs = TransactionLog.objects.create(bulkLogs)
-
-            ## send notifications
-            Notifications.new_bulk_entry(notificationsList)
-
-            serializer = self.serializer_class(transactionLogs, many=True)
+        event = serializer.validated_data['event']
+        quantity = serializer.validated_data['quantity']
+        hold_id = serializer.validated_data.get('hold_id')
+
+        ## the tickets are taken with the PENDING log, the worker hands them back
+        ## if the charge fails. No provider call happens inside this transaction.
+        try:
+            with transaction.atomic():
+                if hold_id is not None:
+                    if not TicketHold.convert(hold_id, request.user, event.id, quantity):
+                        raise Conflict('ticket hold expired or not found')
+                elif not Event.reserve_tickets(event.id, quantity):
+                    raise Conflict('not enough tickets left for this event')
+
+                ## charged later by the process_payments worker
+                transactionLog = TransactionLog.objects.create(
+                    event_name=event.title,
+                    reference=generateTransactionReference(),
+                    event=event,
+                    user_id=event.user_id,
+                    payed_by=request.user,
+                    quantity=quantity,
+                    amount=event.price * quantity * 100,
+                    currency=event.currency,
+                    fee=0,
+                    status=CHOICES_FOR_STATUS[0][0])
+
+                serializer = self.serializer_class(transactionLog)
+                response = Response(serializer.data, status=202, headers={
+                    'Location': reverse('transaction_status', args=[transactionLog.reference])})
+
+                if idempotency_key:
+                    store_response(request, idempotency_key, response)
+
+        except IntegrityError:
+            ## a concurrent request with the same key committed first, this one rolled back
+            replayed = idempotency_key and replay_response(request, idempotency_key)
+            if not replayed:
+                raise
+            return replayed
+
+        return response
+
+
+class TransactionStatusView(views.APIView):
+
+    serializer_class = TransactionStatusSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, reference):
+
+        tx_log = TransactionLog.for_references([reference]).filter(payed_by=request.user).first()
+        if tx_log is None:
+            return Response({
+                'status_code': 400,
+                'error': 'No transaction with that reference',
+                'payload': ['No transaction with that reference']}, status=400)
+
+        serializer = self.serializer_class(tx_log)
 
         return Response(serializer.data, status=200)
 
 
+class TicketHoldView(views.APIView):
+
+    serializer_class = TicketHoldSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            hold = TicketHold.place(
+                serializer.validated_data['event_id'], request.user, serializer.validated_data['quantity'])
+        except TicketHold.LimitReached:
+            raise Conflict('you already have the maximum number of active holds for this event')
+        if hold is None:
+            raise Conflict('not enough tickets left for this event')
+
+        return Response(self.serializer_class(hold).data, status=201)
 
+
+class ReleaseTicketHoldView(views.APIView):
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def delete(self, request, hold_id):
+
+        if not TicketHold.release(hold_id, request.user):
+            return Response({
+                'status_code': 400,
+                'error': 'No active ticket hold with that ID',
+                'payload': ['No active ticket hold with that ID']}, status=400)
+
+        return Response(status=204)
+
+
+class PaystackStatsView(views.APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_paystack_stats(), status=200)
+
+
+
+class SalesAnalyticsView(views.APIView):
+    """
+    A creator's successful sales per event, currency and day, with totals per
+    currency. Read from the daily rollup only, never from transaction_logs.
+    """
+
+    serializer_class = DailySalesRollupSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = SalesAnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        rollups = DailySalesRollup.objects.filter(
+            user=request.user, day__gte=params['start'], day__lte=params['end'])
+        if 'event' in params:
+            rollups = rollups.filter(event_id=params['event'])
+        if 'currency' in params:
+            rollups = rollups.filter(currency=params['currency'])
+
+        daily = rollups.values(*self.serializer_class.Meta.fields).order_by('day', 'event', 'currency')
+        totals = rollups.values('currency').annotate(
+            amount=Sum('amount'), fee=Sum('fee'), quantity=Sum('quantity'), transactions=Sum('transactions')
+        ).order_by('currency')
+
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'totals': list(totals),
+            'daily': self.serializer_class(daily, many=True).data,
+        }, status=200)
+
+
+
+class PaystackWebhookView(views.APIView):
+    """
+    Paystack webhooks. The signed body is stored in the inbox and acked at once,
+    drain_payment_webhooks settles the logs in batches.
+    """
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        body = request.body
+        if not verify_webhook_signature(body, request.META.get('HTTP_X_PAYSTACK_SIGNATURE', '')):
+            raise AuthenticationFailed('invalid signature')
+
+        try:
+            payload = json.loads(body)
+            data = payload.get('data') or {}
+            event = str(payload.get('event', ''))[:64]
+            reference = str(data.get('reference') or '')[:256]
+        except (ValueError, AttributeError):
+            raise ParseError('webhook body must be a JSON object')
+
+        PaymentWebhookEvent.objects.create(event=event, reference=reference, payload=payload)
+        return Response(status=200)
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PaymentWebhookEvent, TransactionLog
+from utils.constants import PAYMENT_WEBHOOK_BATCH_SIZE
+from utils.paystack import payment_result
+
+
+## webhook events that carry the outcome of a charge, the rest are acked and dropped
+PAYMENT_WEBHOOK_EVENTS = {'charge.success', 'charge.failed'}
+
+
+def drain_payment_webhooks(batch_size: int = PAYMENT_WEBHOOK_BATCH_SIZE) -> int:
+    """
+    Settle the logs named by one batch of unprocessed webhooks, oldest first.
+    SKIP LOCKED lets several drainers run side by side. Logs are matched by
+    reference and settled through TransactionLog.apply_payment_results, which
+    skips logs that are no longer PENDING, so duplicate deliveries are no-ops.
+    Returns the number of webhooks processed, 0 when the inbox is empty.
+    """
+    with transaction.atomic():
+        inbox = list(PaymentWebhookEvent.objects.select_for_update(skip_locked=True).filter(
+            processed_at__isnull=True).order_by('id').only('event', 'reference', 'payload')[:batch_size])
+        if not inbox:
+            return 0
+
+        payments = [event for event in inbox if event.event in PAYMENT_WEBHOOK_EVENTS and event.reference]
+        log_keys = {log.reference: log.key for log in TransactionLog.for_references(
+            {event.reference for event in payments}).only('id', 'reference', 'created_at')}
+
+        ## the latest delivery for a reference wins
+        results = {}
+        for event in payments:
+            if event.reference in log_keys:
+                results[log_keys[event.reference]] = payment_result(event.payload.get('data') or {})
+
+        TransactionLog.apply_payment_results(results)
+        PaymentWebhookEvent.objects.filter(id__in=[event.id for event in inbox]).update(
+            processed_at=timezone.now())
+
+    return len(inbox)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_listed_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='display_photo_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
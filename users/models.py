@@ -59,6 +59,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     country = models.CharField(max_length=255, null=True)
     job_type = models.CharField(max_length=255, choices=CREATOR_TYPE_CHOICES, null=True)
     display_photo = models.ImageField(upload_to="display_photo/", null=True)
+    ## {variant: {format: storage name}}, filled in by utils.images
+    display_photo_variants = models.JSONField(default=dict, blank=True)
+    ## number of ACTIVE events created by this user, maintained by events.models.Event
+    listed_events = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -4,6 +4,14 @@ from django.utils import timezone, dateparse
 dateparse.parse_date
 
 from .models import User, CREATOR_TYPE_CHOICES
+from utils.db import update_returning
+from utils.exceptions import PreconditionFailed
+from utils.images import ImageVariantField
+
+
+PROFILE_VALUE_FIELDS = ['id', 'display_name', 'email', 'city', 'country', 'job_name',
+                        'job_description', 'summary', 'role', 'job_type', 'display_photo',
+                        'updated_at']
 
 
 class UpdateProfileSerializer(serializers.ModelSerializer):
@@ -18,11 +26,13 @@ class UpdateProfileSerializer(serializers.ModelSerializer):
     city = serializers.CharField(max_length=255, required=False)
     country = serializers.CharField(max_length=255, required=False)
     job_type = serializers.ChoiceField(choices=CREATOR_TYPE_CHOICES, required=False)
+    avatar = ImageVariantField('display_photo', 'thumbnail')
+    photo = ImageVariantField('display_photo', 'full')
 
     class Meta:
         model = User
         fields = ['email', 'display_photo', 'display_name', 'city', 'country',
-                  'summary', 'job_description', 'job_name', 'job_type',
+                  'summary', 'job_description', 'job_name', 'job_type', 'avatar', 'photo',
                   ]
 
     def validate(self, attrs):
@@ -44,16 +54,35 @@ class UpdateProfileSerializer(serializers.ModelSerializer):
         return attrs
 
     def update(self, instance: User, validated_data):
-
+        """
+        One UPDATE ... RETURNING, guarded by context['if_match'] like
+        NewEventSerializer.update. Returns the PROFILE_VALUE_FIELDS of the row.
+        """
         updatable_fields =  {}
 
         for key in validated_data:
             updatable_fields[key] = validated_data.get(key)
 
-        instance.save()
-        User.objects.filter(id=instance.id).update(**updatable_fields)
-
-        return instance
+        display_photo = updatable_fields.pop('display_photo', None)
+        if display_photo is not None:
+            ## update() skips FileField.pre_save, so store the upload first
+            instance.display_photo.save(display_photo.name, display_photo, save=False)
+            updatable_fields['display_photo'] = instance.display_photo.name
+            updatable_fields['display_photo_variants'] = {}
+
+        users = User.objects.filter(id=instance.id)
+        versions = self.context.get('if_match')
+        if versions is not None:
+            users = users.filter(updated_at__in=versions)
+
+        updatable_fields['updated_at'] = timezone.now()
+        rows = update_returning(users, PROFILE_VALUE_FIELDS, **updatable_fields)
+        if not rows:
+            if display_photo is not None:
+                instance.display_photo.delete(save=False)
+            raise PreconditionFailed()
+
+        return rows[0]
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,3 +1,28 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import User
+
+
+class ProfileValidatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='user@example.com', role='CONSUMER')
+
+    def test_photo_variants_change_the_etag_but_not_the_version(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        etag = client.get('/api/v1/user/profile/')['ETag']
+
+        ## what ImageVariantThread writes once the variants are built
+        User.objects.filter(id=self.user.id).update(
+            display_photo_variants={'thumbnail': {'webp': 'users/thumbnail.webp'}})
+
+        response = client.get('/api/v1/user/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = client.patch('/api/v1/user/profile/', {'city': 'Lagos'}, format='multipart',
+                                HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200, response.content)
@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import (Profile)
+from .views import (Profile, ProfilePhotoUploadSlotView, ProfilePhotoUploadConfirmView)
 
 urlpatterns = [
     path('profile/', Profile.as_view(), name='profile'),
+    path('profile/photo-upload/', ProfilePhotoUploadSlotView.as_view(), name='profile_photo_upload'),
+    path('profile/photo-upload/confirm/',
+         ProfilePhotoUploadConfirmView.as_view(), name='profile_photo_upload_confirm'),
 ]
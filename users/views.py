@@ -5,17 +5,25 @@ from rest_framework.filters import SearchFilter
 from rest_framework import (parsers,permissions,authentication)
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from django.db import transaction
+from django.utils import timezone
 # from rest_framework.decorators import permission_classes
 from django.db.models import Avg, Count
 
 from .models import User
-from .serializers import (UpdateProfileSerializer)
+from .serializers import (PROFILE_VALUE_FIELDS, UpdateProfileSerializer)
 from utils.pagination import CustomPagination
 from utils.constants import (NUMBER_OF_REVIEWS_TO_DISPLAY)
 from authentication.permissions import IsCustomer, IsAgent
+from utils.conditional import (if_match_versions, not_modified_response, set_validators,
+                               version_etag)
+from utils.db import update_returning
+from utils.images import schedule_image_variants
+from utils.upload_handlers import LimitedUploadMixin
+from utils.uploads import (UploadConfirmSerializer, UploadSlotSerializer, confirm_upload,
+                           create_upload_slot)
 
 
-class Profile(views.APIView):
+class Profile(LimitedUploadMixin, views.APIView):
 
     serializer_class = UpdateProfileSerializer
     parser_classes = [parsers.FormParser, parsers.MultiPartParser]
@@ -24,21 +32,19 @@ class Profile(views.APIView):
     def patch(self,request):
 
         user_id = request.user.id
-        user = User.objects.get(id=user_id)
 
-        serializer = self.serializer_class(user, data=request.data)
+        ## If-Match is checked by the UPDATE itself, a stale version writes nothing
+        serializer = self.serializer_class(
+            request.user, data=request.data, context={'if_match': if_match_versions(request)})
         serializer.is_valid(raise_exception=True)
 
+        previous_variants = request.user.display_photo_variants
         with transaction.atomic():
-            serializer.save()
-            # user.refresh_from_db()
-            user = User.objects.filter(id=user_id).values('id','display_name', 'email',
-                                        'city', 'country', 'job_name', 'job_description',
-                                        'summary', 'role', 'job_type', 'summary',
-                                        'display_photo'
-                                       )[0]
+            user = serializer.save()
+            if 'display_photo' in serializer.validated_data:
+                schedule_image_variants(User, user_id, 'display_photo', previous_variants)
 
-            return Response(user, status=200)
+            return set_validators(Response(user, status=200), version_etag(user['updated_at']))
 
 
     def get(self,request):
@@ -46,6 +52,54 @@ class Profile(views.APIView):
         user_id = request.GET.get('user_id') if request.GET.get('user_id') else request.user.id
         user = User.objects.get(id=user_id)
 
+        ## variants land after the upload without touching updated_at
+        etag = version_etag(user.updated_at, user.display_photo_variants)
+        not_modified = not_modified_response(request, etag, user.updated_at)
+        if not_modified:
+            return not_modified
+
         serializer = self.serializer_class(user)
 
-        return Response(serializer.data, status=200)
+        return set_validators(Response(serializer.data, status=200), etag, user.updated_at)
+
+
+class ProfilePhotoUploadSlotView(views.APIView):
+
+    serializer_class = UploadSlotSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        slot = create_upload_slot(
+            request.user,
+            target='display_photo',
+            directory=User._meta.get_field('display_photo').upload_to,
+            **serializer.validated_data)
+
+        return Response(slot, status=200)
+
+
+class ProfilePhotoUploadConfirmView(views.APIView):
+
+    serializer_class = UploadConfirmSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user_id = request.user.id
+        key = confirm_upload(request.user, 'display_photo', serializer.validated_data['token'])
+
+        previous_variants = request.user.display_photo_variants
+        with transaction.atomic():
+            user = update_returning(
+                User.objects.filter(id=user_id), PROFILE_VALUE_FIELDS,
+                display_photo=key, display_photo_variants={}, updated_at=timezone.now())[0]
+            schedule_image_variants(User, user_id, 'display_photo', previous_variants)
+
+        return set_validators(Response(user, status=200), version_etag(user['updated_at']))
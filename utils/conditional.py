@@ -0,0 +1,78 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from django.utils.cache import get_conditional_response, parse_etags, quote_etag
+from django.utils.http import http_date
+
+from utils.exceptions import PreconditionFailed
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag from the values a representation is built from (ids, updated_at,
+    a collection version), so it is known before anything is serialized.
+    """
+    raw = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def version_etag(updated_at, *parts) -> str:
+    """
+    ETag of a single row. The first segment is updated_at in microseconds so an
+    If-Match can be turned back into a version and checked inside the UPDATE.
+    """
+    version = str((updated_at - EPOCH) // timedelta(microseconds=1))
+    if parts:
+        version = f'{version}-{make_etag(*parts)[1:17]}'
+    return quote_etag(version)
+
+
+def if_match_versions(request):
+    """
+    updated_at values named by If-Match, None when the client sent no precondition
+    (or `*`). Validators that are not ours can never match, so they fail here.
+    """
+    etags = parse_etags(request.META.get('HTTP_IF_MATCH', ''))
+    if not etags or etags == ['*']:
+        return None
+
+    versions = []
+    for etag in etags:
+        ## If-Match uses strong comparison, weak validators never match
+        if etag.startswith('W/'):
+            continue
+        try:
+            versions.append(EPOCH + timedelta(microseconds=int(etag.strip('"').split('-')[0])))
+        except (ValueError, OverflowError):
+            continue
+
+    if not versions:
+        raise PreconditionFailed()
+    return versions
+
+
+def _timestamp(last_modified):
+    ## http dates have second precision
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    return response
+
+
+def not_modified_response(request, etag=None, last_modified=None):
+    """
+    Evaluate If-None-Match / If-Modified-Since (and If-Match / If-Unmodified-Since)
+    against the validators. Returns the 304/412 response, or None to serve the body.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=_timestamp(last_modified))
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
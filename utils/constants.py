@@ -13,3 +13,41 @@ STAGES_OF_KYC_VERIFICATION = {
         'business': False,
     }
 ALLOWABLE_DOCUMENT_TYPES = ['application/pdf', 'image/jpeg', 'image/jpg', 'image/png', 'application/octet-stream']
+EVENT_LISTING_CACHE_TTL = 60 * 5
+SIMILAR_EVENTS_CANDIDATE_POOL = 200
+EVENT_GEOHASH_PRECISION = 9
+DEFAULT_EVENT_SEARCH_RADIUS_KM = 25
+MAXIMUM_EVENT_SEARCH_RADIUS_KM = 500
+EVENT_SEARCH_CANDIDATES = 200
+UPCOMING_FEED_DAYS = 7
+UPCOMING_FEED_SIZE = 50
+IMAGE_VARIANT_SIZES = {'thumbnail': 160, 'card': 640, 'full': 1600}
+MAXIMUM_IMAGE_UPLOAD_SIZE = 8388608
+ALLOWABLE_IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png']
+PRESIGNED_UPLOAD_EXPIRY_SECONDS = 60 * 15
+MAXIMUM_BULK_EVENT_IDS = 100
+TICKET_HOLD_MINUTES = 10
+MAXIMUM_TICKETS_PER_HOLD = 10
+MAXIMUM_ACTIVE_HOLDS_PER_EVENT = 2
+TICKET_HOLD_SWEEP_BATCH_SIZE = 1000
+PAYMENT_WORKER_BATCH_SIZE = 50
+PAYMENT_WORKER_POLL_SECONDS = 1
+PAYSTACK_CONNECT_TIMEOUT_SECONDS = 3.05
+PAYSTACK_READ_TIMEOUT_SECONDS = 15
+PAYSTACK_MAX_RETRIES = 3
+PAYSTACK_RETRY_BACKOFF_SECONDS = 0.25
+PAYSTACK_POOL_SIZE = 20
+PAYSTACK_CIRCUIT_FAILURE_THRESHOLD = 5
+PAYSTACK_CIRCUIT_RESET_SECONDS = 30
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_KEY_PURGE_BATCH_SIZE = 5000
+MAXIMUM_IDEMPOTENCY_KEY_LENGTH = 255
+TRANSACTION_EXPORT_CHUNK_SIZE = 2000
+MAXIMUM_SALES_ANALYTICS_DAYS = 366
+DEFAULT_SALES_ANALYTICS_DAYS = 30
+PAYMENT_WEBHOOK_BATCH_SIZE = 500
+TRANSACTION_LOG_PARTITIONS_AHEAD = 3
+RECONCILIATION_CHUNK_SIZE = 500
+RECONCILIATION_WORKERS = 8
+RECONCILIATION_GRACE_MINUTES = 15
+PAYSTACK_LIST_PAGE_SIZE = 100
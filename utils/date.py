@@ -1,6 +1,6 @@
-from django.utils import timezone
-from datetime import datetime
-from typing import Union
+from django.utils import dateparse, timezone
+from datetime import datetime, time
+from typing import Optional, Union
 
 
 def greater_than_today(input_date: Union[datetime, str] ) -> bool :
@@ -32,3 +32,21 @@ def convert_datetime_to_readable_date(input_date: Union[datetime.date, str]) ->
 
     except Exception as e:
         raise e
+
+
+def parse_query_datetime(value: str) -> Optional[datetime]:
+    """Parse an ISO date or datetime from a query param into an aware datetime, None if invalid."""
+    try:
+        parsed = dateparse.parse_datetime(value)
+        if parsed is None:
+            parsed_date = dateparse.parse_date(value)
+            if parsed_date is None:
+                return None
+            parsed = datetime.combine(parsed_date, time.min)
+
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    except ValueError:
+        return None
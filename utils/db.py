@@ -0,0 +1,39 @@
+from django.db import connections
+from django.db.models.sql import UpdateQuery
+
+
+def update_returning(queryset, fields, **values) -> list:
+    """
+    queryset.update(**values) as one UPDATE ... RETURNING, so the written rows come
+    back without a second SELECT. Returns dicts of `fields` (attnames), like values().
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    query.annotations = {}
+    statement, params = query.get_compiler(queryset.db).as_sql()
+    if not statement:
+        return []
+
+    columns = [model._meta.get_field(name).get_col(model._meta.db_table) for name in fields]
+    converters = [
+        connection.ops.get_db_converters(column) + column.get_db_converters(connection)
+        for column in columns
+    ]
+    returning = ', '.join(connection.ops.quote_name(column.target.column) for column in columns)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'{statement} RETURNING {returning}', params)
+        rows = cursor.fetchall()
+
+    results = []
+    for row in rows:
+        result = {}
+        for name, column, value, column_converters in zip(fields, columns, row, converters):
+            for converter in column_converters:
+                value = converter(value, column, connection)
+            result[name] = value
+        results.append(result)
+    return results
@@ -0,0 +1,26 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body is too large.'
+    default_code = 'request_entity_too_large'
+
+
+class UnsupportedFileType(APIException):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_detail = 'Unsupported file type.'
+    default_code = 'unsupported_file_type'
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The request conflicts with the current state of the resource.'
+    default_code = 'conflict'
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource was modified since it was fetched, reload it and retry.'
+    default_code = 'precondition_failed'
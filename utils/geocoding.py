@@ -0,0 +1,56 @@
+from typing import Optional, Tuple
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+Coordinates = Tuple[float, float]
+
+
+class BaseGeocoder:
+    """
+    Resolve an event location to (latitude, longitude).
+    Set GEOCODER_BACKEND to the dotted path of a subclass to plug in a real provider.
+    """
+
+    def geocode(self, address: str = None, city: str = None,
+                state: str = None, country: str = None) -> Optional[Coordinates]:
+        raise NotImplementedError
+
+
+class StubGeocoder(BaseGeocoder):
+    """Offline geocoder for development and tests, resolves a fixed set of cities by name."""
+
+    KNOWN_PLACES = {
+        'lagos': (6.5244, 3.3792),
+        'ikeja': (6.6018, 3.3515),
+        'lekki': (6.4698, 3.5852),
+        'abuja': (9.0765, 7.3986),
+        'fct': (9.0765, 7.3986),
+        'ibadan': (7.3775, 3.9470),
+        'port harcourt': (4.8156, 7.0498),
+        'rivers': (4.8156, 7.0498),
+        'kano': (12.0022, 8.5920),
+        'enugu': (6.5244, 7.5170),
+        'accra': (5.6037, -0.1870),
+        'nairobi': (-1.2921, 36.8219),
+        'mombasa': (-4.0435, 39.6682),
+        'kampala': (0.3476, 32.5825),
+        'johannesburg': (-26.2041, 28.0473),
+        'cape town': (-33.9249, 18.4241),
+        'london': (51.5072, -0.1276),
+        'manchester': (53.4808, -2.2426),
+        'paris': (48.8566, 2.3522),
+        'berlin': (52.5200, 13.4050),
+        'new york': (40.7128, -74.0060),
+        'san francisco': (37.7749, -122.4194),
+    }
+
+    def geocode(self, address=None, city=None, state=None, country=None):
+        for place in (city, state):
+            if place and place.strip().lower() in self.KNOWN_PLACES:
+                return self.KNOWN_PLACES[place.strip().lower()]
+        return None
+
+
+def get_geocoder() -> BaseGeocoder:
+    return import_string(settings.GEOCODER_BACKEND)()
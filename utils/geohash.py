@@ -0,0 +1,71 @@
+import math
+from typing import List, Tuple
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+MAXIMUM_PRECISION = 12
+
+
+def encode(latitude: float, longitude: float, precision: int = MAXIMUM_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, bit_count, even = [], 0, 0, True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits, lon_range[0] = (bits << 1) | 1, mid
+            else:
+                bits, lon_range[1] = bits << 1, mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits, lat_range[0] = (bits << 1) | 1, mid
+            else:
+                bits, lat_range[1] = bits << 1, mid
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits, bit_count = 0, 0
+
+    return ''.join(geohash)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(latitude, longitude) height and width in degrees of a cell at `precision`."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def precision_for_radius(latitude: float, radius_km: float) -> int:
+    """Finest precision whose cells are at least `radius_km` across, so 3x3 cells cover the circle."""
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    for precision in range(MAXIMUM_PRECISION, 0, -1):
+        lat_degrees, lon_degrees = cell_size(precision)
+        height = lat_degrees * km_per_degree
+        width = lon_degrees * km_per_degree * max(math.cos(math.radians(latitude)), 0.01)
+        if min(height, width) >= radius_km:
+            return precision
+    return 1
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """The cell holding the point plus its eight neighbours, at a precision matched to the radius."""
+    precision = precision_for_radius(latitude, radius_km)
+    lat_degrees, lon_degrees = cell_size(precision)
+
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        for lon_step in (-1, 0, 1):
+            lat = latitude + lat_step * lat_degrees
+            if lat > 90 or lat < -90:
+                continue
+            lon = (longitude + lon_step * lon_degrees + 180) % 360 - 180
+            cells.add(encode(lat, lon, precision))
+
+    return sorted(cells)
+
@@ -0,0 +1,141 @@
+import os
+import threading
+from io import BytesIO
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from rest_framework import serializers
+
+from utils.constants import IMAGE_VARIANT_SIZES
+
+
+## name: (pillow format, save options)
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def build_image_variants(image_file) -> dict:
+    """
+    Resize an uploaded image into every IMAGE_VARIANT_SIZES variant, in WebP and JPEG.
+    Images are re-encoded from pixels only, so EXIF and other metadata are dropped.
+    Returns {variant: {format: storage name}}.
+    """
+    storage = image_file.storage
+    with image_file.open('rb') as source:
+        image = Image.open(source)
+        ## apply the camera orientation before the EXIF block is thrown away
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    base_name, _ = os.path.splitext(image_file.name)
+    variants = {}
+    for variant, size in IMAGE_VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+        for extension, (image_format, options) in IMAGE_VARIANT_FORMATS.items():
+            encoded = resized
+            if image_format == 'JPEG' and resized.mode == 'RGBA':
+                encoded = Image.new('RGB', resized.size, (255, 255, 255))
+                encoded.paste(resized, mask=resized.getchannel('A'))
+
+            buffer = BytesIO()
+            encoded.save(buffer, image_format, **options)
+            name = storage.save(f'{base_name}/{variant}.{extension}', ContentFile(buffer.getvalue()))
+            variants.setdefault(variant, {})[extension] = name
+
+    return variants
+
+
+def delete_image_variants(storage, variants) -> None:
+    """Delete the files of a {variant: {format: storage name}} map."""
+    for names in (variants or {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def generate_image_variants(model, pk, field_name) -> bool:
+    """
+    Build the variants of `model.<field_name>` and record them on the row, then
+    delete the variants they replace. Returns False when there was nothing to do
+    or a newer upload replaced the image meanwhile.
+    """
+    variants_field = f'{field_name}_variants'
+    instance = model.objects.only(field_name, variants_field).filter(pk=pk).first()
+    image = getattr(instance, field_name, None)
+    if not image:
+        return False
+
+    previous = getattr(instance, variants_field)
+    variants = build_image_variants(image)
+
+    ## skip the write if a newer upload replaced the image meanwhile. updated_at is
+    ## left alone, it's the If-Match version and the owner didn't change anything;
+    ## GET ETags include the variants instead
+    written = model.objects.filter(pk=pk, **{field_name: image.name}).update(**{
+        variants_field: variants,
+    })
+    delete_image_variants(image.storage, previous if written else variants)
+    return bool(written)
+
+
+class ImageVariantThread(threading.Thread):
+    """Run generate_image_variants off the request."""
+
+    def __init__(self, model, pk, field_name):
+        self.model = model
+        self.pk = pk
+        self.field_name = field_name
+        threading.Thread.__init__(self, daemon=True)
+
+    def run(self):
+        try:
+            generate_image_variants(self.model, self.pk, self.field_name)
+        finally:
+            connections.close_all()
+
+
+def schedule_image_variants(model, pk, field_name, replaced_variants=None):
+    """
+    Start the variant pipeline once the upload is committed. `replaced_variants`
+    are the variants of the image the upload replaced, their files are deleted.
+    """
+    def start():
+        delete_image_variants(getattr(model, field_name).field.storage, replaced_variants)
+        ImageVariantThread(model, pk, field_name).start()
+
+    transaction.on_commit(start)
+
+
+def image_variant_urls(instance, field_name, variant):
+    image = getattr(instance, field_name)
+    if not image:
+        return None
+
+    storage = image.storage
+    names = (getattr(instance, f'{field_name}_variants', None) or {}).get(variant, {})
+    urls = {extension: storage.url(names[extension]) if extension in names else None
+            for extension in IMAGE_VARIANT_FORMATS}
+    urls['original'] = image.url
+    return urls
+
+
+class ImageVariantField(serializers.ReadOnlyField):
+    """
+    Serialize one size of an image as {'webp': url, 'jpeg': url, 'original': url}.
+    webp and jpeg are null until the variant pipeline has run.
+    """
+
+    def __init__(self, image_field, variant, **kwargs):
+        self.image_field = image_field
+        self.variant = variant
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return image_variant_urls(instance, self.image_field, self.variant)
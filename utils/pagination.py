@@ -1,19 +1,116 @@
 import math
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.settings import api_settings
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+PAGINATION_MODE_PAGE = 'page'
+PAGINATION_MODE_CURSOR = 'cursor'
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Page number pagination by default.
+
+    Cursor (keyset) mode walks the queryset on (created_at, id) descending and
+    never runs a COUNT, so deep pages cost the same as the first one. A view opts
+    in with `pagination_mode = 'cursor'`, a request with `?pagination=cursor`
+    or by sending back a `cursor` it was given. A queryset ordered on anything
+    else first (e.g. search rank) can't be walked that way and is refused.
+    """
 
     page_size_query_param = 'limit'
     max_page_size = 1000
 
+    cursor_query_param = 'cursor'
+    pagination_mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+    unordered_cursor_message = "cursor pagination only follows newest first, use '?pagination=page' here"
+
+    def get_pagination_mode(self, request, view=None):
+        mode = request.query_params.get(self.pagination_mode_query_param)
+        if mode in (PAGINATION_MODE_PAGE, PAGINATION_MODE_CURSOR):
+            return mode
+
+        if request.query_params.get(self.cursor_query_param):
+            return PAGINATION_MODE_CURSOR
+
+        return getattr(view, 'pagination_mode', PAGINATION_MODE_PAGE)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = self.get_pagination_mode(request, view)
+
+        if self.mode == PAGINATION_MODE_CURSOR:
+            return self.paginate_keyset(queryset, request)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_keyset(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if page_size is None:
+            page_size = api_settings.PAGE_SIZE
+
+        ## the keyset order would silently replace e.g. EventSearchFilter's rank ordering
+        ordering = queryset.query.order_by
+        if ordering and ordering[0] not in ('created_at', '-created_at'):
+            raise ParseError(self.unordered_cursor_message)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+
+        if cursor is not None:
+            created_at = cursor['created_at']
+            try:
+                id = queryset.model._meta.pk.to_python(cursor['id'])
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+
+            if reverse:
+                position = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=id)
+            else:
+                position = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id)
+            queryset = queryset.filter(position)
+
+        ordering = ('created_at', 'id') if reverse else ('-created_at', '-id')
+
+        ## fetch one extra row to know whether there is another page
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.rows = rows
+        return rows
+
     def get_paginated_response(self, data):
         page_size = self.get_page_size(self.request)
         if page_size is None:
             page_size = api_settings.PAGE_SIZE
 
+        if self.mode == PAGINATION_MODE_CURSOR:
+            return Response({
+                'links': {
+                    'next': self.get_next_cursor_link(),
+                    'previous': self.get_previous_cursor_link()
+                },
+                'limit': page_size,
+                'results': data
+            })
+
         return Response({
             'links': {
                 'next': self.get_next_link(),
@@ -24,3 +121,62 @@ class CustomPagination(PageNumberPagination):
             'pages': math.ceil(self.page.paginator.count / page_size ),
             'results': data
         })
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return row['created_at'], row['id']
+        return row.created_at, row.id
+
+    def encode_cursor(self, row, reverse):
+        created_at, id = self.get_position(row)
+        payload = json.dumps([created_at.isoformat(), str(id), int(reverse)])
+        cursor = urlsafe_b64encode(payload.encode()).decode()
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            created_at, id, reverse = json.loads(urlsafe_b64decode(encoded.encode()))
+            created_at = parse_datetime(created_at)
+            if created_at is None or timezone.is_naive(created_at):
+                raise ValueError(encoded)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return {'created_at': created_at, 'id': id, 'reverse': bool(reverse)}
+
+    def get_next_cursor_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_cursor_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.extend([
+            {
+                'name': self.pagination_mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "'page' (default) or 'cursor' for keyset pagination without totals.",
+                'schema': {'type': 'string', 'enum': [PAGINATION_MODE_PAGE, PAGINATION_MODE_CURSOR]},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor taken from links.next or links.previous.',
+                'schema': {'type': 'string'},
+            },
+        ])
+        return parameters
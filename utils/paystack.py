@@ -1,42 +1,338 @@
+import hashlib
+import hmac
+import random
+import threading
+import time
 from os import environ
 import requests
 from random import randint
+from django.core.cache import cache
+from django.utils.crypto import get_random_string
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
 from rest_framework.exceptions import ParseError
 
 from transactions.models import CHOICES_FOR_STATUS, CHOICES_FOR_PAYMENT_METHOD
-from users.models import User
+from utils.constants import (
+    PAYSTACK_CIRCUIT_FAILURE_THRESHOLD, PAYSTACK_CIRCUIT_RESET_SECONDS, PAYSTACK_CONNECT_TIMEOUT_SECONDS,
+    PAYSTACK_MAX_RETRIES, PAYSTACK_POOL_SIZE, PAYSTACK_READ_TIMEOUT_SECONDS, PAYSTACK_RETRY_BACKOFF_SECONDS)
 
 
 PAYSTACK_SECRET_KEY = environ.get('PAYSTACK_SECRET_KEY', '')
 PAYSTACK_BASE_URL = environ.get('PAYSTACK_BASE_URL', '')
 
+## upper bounds in ms, the last bucket takes everything slower
+PAYSTACK_LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500]
+PAYSTACK_STATS_KEY = 'paystack:stats:{name}'
+PAYSTACK_STATS = ['calls', 'errors', 'retries', 'short_circuited', 'latency_ms_total']
 
-def chargeCard():
+
+class PaystackError(Exception):
+    """The call may or may not have reached Paystack, the outcome is unknown."""
+
+
+class PaystackDeclined(PaystackError):
+    """Paystack answered and refused the request with a 4xx."""
+
+    def __init__(self, message, response=None, status_code=None):
+        super().__init__(message)
+        self.response = response or {}
+        self.status_code = status_code
+
+
+class PaystackUnavailable(PaystackError):
+    """The request was never sent (circuit open or no connection), safe to retry later."""
+
+
+def _incr(name: str, delta: int = 1):
+    key = PAYSTACK_STATS_KEY.format(name=name)
+    ## incr fails on a missing key, add() is a no-op on an existing one
+    cache.add(key, 0, timeout=None)
     try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def record_latency(latency_ms: float):
+    _incr('latency_ms_total', int(latency_ms))
+    for bound in PAYSTACK_LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            _incr(f'latency_le_{bound}')
+            return
+    _incr(f'latency_gt_{PAYSTACK_LATENCY_BUCKETS_MS[-1]}')
+
+
+def get_paystack_stats() -> dict:
+    """
+    Counters are shared by every web and worker process through the cache, which
+    settings require to be a shared one (CACHE_URL) outside DEBUG.
+    """
+    stats = {name: cache.get(PAYSTACK_STATS_KEY.format(name=name), 0) for name in PAYSTACK_STATS}
+    buckets = [f'latency_le_{bound}' for bound in PAYSTACK_LATENCY_BUCKETS_MS]
+    buckets.append(f'latency_gt_{PAYSTACK_LATENCY_BUCKETS_MS[-1]}')
+    stats['latency_buckets'] = {name: cache.get(PAYSTACK_STATS_KEY.format(name=name), 0) for name in buckets}
+    stats['latency_ms_mean'] = round(stats['latency_ms_total'] / stats['calls'], 2) if stats['calls'] else None
+    stats['error_ratio'] = round(stats['errors'] / stats['calls'], 4) if stats['calls'] else None
+    stats['circuit'] = get_paystack_client().breaker.state
+    return stats
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half open).
+    State is per process.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=PAYSTACK_CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=PAYSTACK_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def end_trial(self):
+        """A call that was let through ended without an outcome (an unexpected error)."""
+        with self.lock:
+            self.trial_running = False
+
+
+def _never_sent(error: requests.ConnectionError) -> bool:
+    """Connect timeouts and refused connections fail before the request is written."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    ## urllib3's NewConnectionError (refused, DNS) is a ConnectTimeoutError
+    return isinstance(reason, ConnectTimeoutError)
+
+
+class PaystackClient:
+    """
+    Paystack API client over one pooled keep-alive session. Every call has a
+    connect and read timeout. Idempotent calls are retried with jittered
+    exponential backoff on timeouts, connection errors, 429 and 5xx. Other calls
+    are only retried when the connection was never made.
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, secret_key=PAYSTACK_SECRET_KEY, base_url=PAYSTACK_BASE_URL,
+                 timeout=(PAYSTACK_CONNECT_TIMEOUT_SECONDS, PAYSTACK_READ_TIMEOUT_SECONDS),
+                 max_retries=PAYSTACK_MAX_RETRIES, backoff=PAYSTACK_RETRY_BACKOFF_SECONDS,
+                 pool_size=PAYSTACK_POOL_SIZE, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {secret_key}',
+            'Content-Type': 'application/json',
+        })
+
+    def _sleep_before_retry(self, attempt: int):
+        ## full jitter, keeps retrying workers from hitting Paystack in lockstep
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def request(self, method: str, path: str, idempotent: bool = False, **kwargs) -> dict:
+        url = f'{self.base_url}/{path.lstrip("/")}'
 
-        # data={}
-        # headers = {'Authorization': f'Bearer {PAYSTACK_SECRET_KEY}'}
-        # url = f'{PAYSTACK_BASE_URL}/charge'
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                _incr('short_circuited')
+                raise PaystackUnavailable('paystack circuit is open')
 
-        # requests.post(
-        #     url,
-        #     data,
-        #     headers,
-        # )
-        index = randint(0,2)
+            ## whatever escapes, a half open breaker must not stay stuck on this trial call
+            try:
+                if attempt:
+                    _incr('retries')
+                _incr('calls')
+                started = time.monotonic()
+                try:
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                except requests.RequestException as e:
+                    record_latency((time.monotonic() - started) * 1000)
+                    _incr('errors')
+                    self.breaker.record_failure()
+
+                    ## a read timeout or a body cut short (ChunkedEncodingError) means it was sent
+                    never_sent = isinstance(e, requests.ConnectionError) and _never_sent(e)
+                    if attempt < self.max_retries and (idempotent or never_sent):
+                        self._sleep_before_retry(attempt)
+                        continue
+                    if never_sent:
+                        raise PaystackUnavailable(str(e)) from e
+                    raise PaystackError(str(e)) from e
+
+                record_latency((time.monotonic() - started) * 1000)
+
+                if response.status_code in self.RETRY_STATUS_CODES:
+                    _incr('errors')
+                    self.breaker.record_failure()
+                    if attempt < self.max_retries and idempotent:
+                        self._sleep_before_retry(attempt)
+                        continue
+                    raise PaystackError(f'paystack returned {response.status_code}')
+
+                self.breaker.record_success()
+                try:
+                    body = response.json()
+                except (ValueError, requests.RequestException):
+                    body = {}
+                if not isinstance(body, dict):
+                    body = {}
+
+                if response.status_code >= 400:
+                    _incr('errors')
+                    raise PaystackDeclined(body.get('message') or f'paystack returned {response.status_code}',
+                                           body, response.status_code)
+                return body
+            finally:
+                self.breaker.end_trial()
+
+    def charge(self, email: str, amount: int, reference: str, currency: str = None, **extra) -> dict:
+        data = {'email': email, 'amount': amount, 'reference': reference, **extra}
+        if currency:
+            data['currency'] = currency
+        return self.request('POST', '/charge', json=data)
+
+    def verify(self, reference: str) -> dict:
+        return self.request('GET', f'/transaction/verify/{reference}', idempotent=True)
+
+    def list_transactions(self, page: int = 1, per_page: int = 50, **filters) -> dict:
+        """One page of transactions, `meta.pageCount` says how many there are. Filters: from, to, status."""
+        params = {'page': page, 'perPage': per_page, **filters}
+        return self.request('GET', '/transaction', idempotent=True, params=params)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_paystack_client() -> PaystackClient:
+    """One client, and so one connection pool, per process."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PaystackClient()
+    return _client
+
+
+def paystack_enabled() -> bool:
+    return bool(PAYSTACK_BASE_URL)
+
+
+## paystack transaction status => TransactionLog status, anything else is still pending
+PAYSTACK_STATUSES = {
+    'success': CHOICES_FOR_STATUS[1][0],
+    'failed': CHOICES_FOR_STATUS[2][0],
+    'abandoned': CHOICES_FOR_STATUS[2][0],
+    'reversed': CHOICES_FOR_STATUS[2][0],
+}
+
+
+def payment_result(data: dict) -> dict:
+    """Map the `data` of a charge/verify response (or webhook) onto TransactionLog fields."""
+    return {
+        "status": PAYSTACK_STATUSES.get(data.get('status'), CHOICES_FOR_STATUS[0][0]),
+        "fee": data.get('fees') or 0,
+        "payment_method": CHOICES_FOR_PAYMENT_METHOD[0][0],
+        "error_message_from_payment_service": (
+            data.get('gateway_response') if data.get('status') != 'success' else None),
+    }
+
+
+def verify_webhook_signature(body: bytes, signature: str) -> bool:
+    """Paystack signs the raw webhook body with HMAC SHA512 of the secret key."""
+    if not PAYSTACK_SECRET_KEY or not signature:
+        return False
+    expected = hmac.new(PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def chargeCard(transactionLog=None):
+    """
+    Charge a PENDING TransactionLog. Without PAYSTACK_BASE_URL (development) the
+    outcome is a random SUCCESS or FAILED. Raises PaystackUnavailable when the charge can be retried
+    later and PaystackError when its outcome is unknown, which includes a 4xx
+    that isn't a decline.
+    """
+    if not paystack_enabled() or transactionLog is None:
+        ## a charge answer is final, PENDING is only the state of a log nobody charged yet
+        index = randint(1,2)
         return {
-            "status": CHOICES_FOR_STATUS[index][0], 
+            "status": CHOICES_FOR_STATUS[index][0],
             "fee": 50,
             "payment_method": CHOICES_FOR_PAYMENT_METHOD[0][0]
         }
 
-    except Exception as e:
-        raise ParseError(e.args)
+    try:
+        response = get_paystack_client().charge(
+            email=transactionLog.payed_by.email,
+            amount=transactionLog.amount,
+            reference=transactionLog.reference,
+            currency=transactionLog.currency)
+    except PaystackDeclined as e:
+        data = e.response.get('data') or {}
+        ## only a charge answer saying it failed is a decline, any other 4xx
+        ## (e.g. "Duplicate Transaction Reference") says nothing about the charge
+        if data.get('status') != 'failed':
+            raise PaystackError(str(e)) from e
+        return {
+            **payment_result(data),
+            "status": CHOICES_FOR_STATUS[2][0],
+            "error_message_from_payment_service": str(e),
+        }
+
+    return payment_result(response.get('data') or {})
+
 
 def generateTransactionReference():
     try:
-        token = User.objects.make_random_password(
-            length=10, 
+        token = get_random_string(
+            length=10,
             allowed_chars=f'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789abcdefghijklmnopqrstuvwxyz')
 
         return f'rfb_{token}'
@@ -0,0 +1,151 @@
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class PaystackStubHandler(BaseHTTPRequestHandler):
+    """
+    Just enough of the Paystack API for local runs, tests and benchmarks:
+    POST /charge, GET /transaction/verify/<reference> and GET /transaction
+    (the paginated list). Latency and failure
+    rates come from the server, see PaystackStubServer.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    ## headers and body go out as separate writes, on keep-alive connections
+    ## Nagle would hold the body back for the client's delayed ACK
+    disable_nagle_algorithm = True
+    verify_path = re.compile(r'^/transaction/verify/(?P<reference>[\w-]+)$')
+    list_path = '/transaction'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status_code: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            ## the client timed out and went away
+            pass
+
+    def simulate(self) -> bool:
+        """Apply latency and the error rate, False when a 5xx was sent."""
+        self.server.count_request()
+        if self.server.latency_ms:
+            time.sleep(random.uniform(0.5, 1.5) * self.server.latency_ms / 1000)
+        if random.random() < self.server.error_rate:
+            self.send_json(503, {'status': False, 'message': 'Service unavailable'})
+            return False
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            data = None
+
+        if not self.simulate():
+            return
+        if self.path != '/charge':
+            return self.send_json(404, {'status': False, 'message': 'Not found'})
+        if not data or not data.get('email') or not data.get('amount') or not data.get('reference'):
+            return self.send_json(400, {'status': False, 'message': 'Invalid charge request'})
+
+        reference = data['reference']
+        with self.server.lock:
+            if reference in self.server.transactions:
+                return self.send_json(400, {'status': False, 'message': 'Duplicate Transaction Reference'})
+
+            declined = random.random() < self.server.decline_rate
+            transaction = {
+                'reference': reference,
+                'amount': data['amount'],
+                'currency': data.get('currency', 'NGN'),
+                'status': 'failed' if declined else 'success',
+                'gateway_response': 'Declined' if declined else 'Approved',
+                'fees': min(int(data['amount'] * 0.015), 200000),
+            }
+            self.server.transactions[reference] = transaction
+
+        self.send_json(200, {'status': True, 'message': 'Charge attempted', 'data': transaction})
+
+    def list_transactions(self, query: dict):
+        try:
+            page = max(int(query.get('page', ['1'])[0]), 1)
+            per_page = max(int(query.get('perPage', ['50'])[0]), 1)
+        except ValueError:
+            return self.send_json(400, {'status': False, 'message': 'Invalid pagination'})
+
+        with self.server.lock:
+            transactions = list(self.server.transactions.values())
+        total = len(transactions)
+        self.send_json(200, {
+            'status': True,
+            'message': 'Transactions retrieved',
+            'data': transactions[(page - 1) * per_page:page * per_page],
+            'meta': {'total': total, 'perPage': per_page, 'page': page,
+                     'pageCount': (total + per_page - 1) // per_page},
+        })
+
+    def do_GET(self):
+        if not self.simulate():
+            return
+
+        url = urlsplit(self.path)
+        if url.path == self.list_path:
+            return self.list_transactions(parse_qs(url.query))
+
+        match = self.verify_path.match(self.path)
+        transaction = match and self.server.transactions.get(match.group('reference'))
+        if not transaction:
+            return self.send_json(404, {'status': False, 'message': 'Transaction reference not found'})
+
+        self.send_json(200, {'status': True, 'message': 'Verification successful', 'data': transaction})
+
+
+class PaystackStubServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency_ms=0, error_rate=0.0,
+                 decline_rate=0.0, verbose=False):
+        super().__init__(address, PaystackStubHandler)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.decline_rate = decline_rate
+        self.verbose = verbose
+        self.transactions = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def handle_error(self, request, client_address):
+        ## clients that time out or are killed mid-request are expected
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def start(self) -> 'PaystackStubServer':
+        """Serve from a background thread, for tests and benchmarks."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,101 @@
+import json
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+INDEX_SCAN_NODES = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+
+
+class QueryPlanAssertions:
+    """
+    TestCase mixin for checking that the queries behind an endpoint stay on
+    their indexes. Sequential scans are priced out for the test's transaction,
+    so small test tables plan like big ones. That alone would let a full scan
+    of some index pass, so the expected indexes must also be searched with an
+    index condition.
+    """
+
+    def disable_seqscan(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def explain(self, sql: str, params=None) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def explain_nodes(self, sql: str, params=None) -> list:
+        """Every node of the plan of `sql`, flattened."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        nodes, pending = [], [plan[0]['Plan']]
+        while pending:
+            node = pending.pop()
+            nodes.append(node)
+            pending.extend(node.get('Plans', []))
+        return nodes
+
+    @staticmethod
+    def index_parents() -> dict:
+        """Index name => the partitioned index it belongs to, for indexes of partitions."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT child.relname, parent.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "WHERE child.relkind = 'i'")
+            return dict(cursor.fetchall())
+
+    @staticmethod
+    def partial_indexes() -> set:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT index_class.relname FROM pg_index "
+                "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid "
+                "WHERE pg_index.indpred IS NOT NULL")
+            return {row[0] for row in cursor.fetchall()}
+
+    def used_indexes(self, sql: str, params=None) -> set:
+        """
+        Indexes the plan of `sql` searches: scanned with an index condition, or
+        partial (the predicate is the condition). A full scan of an index that
+        ignores the filter doesn't count. Fails on a sequential scan.
+        """
+        nodes = self.explain_nodes(sql, params)
+        seq_scans = [node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan']
+        self.assertFalse(
+            seq_scans, f'sequential scan of {seq_scans} in the plan of:\n{sql}\n{self.explain(sql, params)}')
+
+        parents, partial = self.index_parents(), self.partial_indexes()
+        used = set()
+        for node in nodes:
+            if node['Node Type'] not in INDEX_SCAN_NODES:
+                continue
+            name = node['Index Name']
+            if 'Index Cond' in node or name in partial:
+                used.add(parents.get(name, name))
+        return used
+
+    def assertSelectsUseIndexes(self, call, *indexes):
+        """
+        Run `call()` and assert none of its SELECTs plans a sequential scan and
+        that `indexes` are searched by them. An entry of `indexes` can be a tuple
+        of indexes any of which will do. Returns what `call()` returned.
+        """
+        self.disable_seqscan()
+        with CaptureQueriesContext(connection) as queries:
+            result = call()
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects, 'no SELECT was run')
+
+        used = set()
+        for sql in selects:
+            used |= self.used_indexes(sql)
+        missing = [index for index in indexes if not used & set(index if isinstance(index, tuple) else [index])]
+        self.assertFalse(missing, f'{missing} not used, the plans searched {sorted(used)}:\n'
+                                  + '\n\n'.join(f'{sql}\n{self.explain(sql)}' for sql in selects))
+        return result
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler
+
+from utils.constants import ALLOWABLE_DOCUMENT_TYPES, ALLOWABLE_IMAGE_TYPES, MAXIMUM_IMAGE_UPLOAD_SIZE
+from utils.exceptions import RequestEntityTooLarge, UnsupportedFileType
+from utils.uploads import MAGIC_NUMBER_LENGTH, sniff_content_type
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """
+    Guard placed in front of the handler that actually stores the file.
+
+    Rejects the request from its Content-Length before the body is read, checks
+    the file's magic number as soon as the first bytes arrive and aborts the
+    moment a file crosses `max_size`. Chunks are only passed through, so memory
+    per upload stays at one chunk whatever the file size.
+    """
+
+    def __init__(self, request=None, max_size=MAXIMUM_IMAGE_UPLOAD_SIZE,
+                 allowed_types=ALLOWABLE_DOCUMENT_TYPES):
+        super().__init__(request)
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        ## non-file fields are already capped by DATA_UPLOAD_MAX_MEMORY_SIZE
+        if content_length and content_length > self.max_size + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise RequestEntityTooLarge(f'Maximum file size is {self.max_size // (1024 * 1024)}MB')
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.head = b''
+        self.sniffed = False
+
+    def check_type(self):
+        content_type = sniff_content_type(self.head)
+        if content_type is None or content_type not in self.allowed_types:
+            raise UnsupportedFileType(f'Allowed file types are {", ".join(self.allowed_types)}')
+        self.sniffed = True
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            raise RequestEntityTooLarge(f'Maximum file size is {self.max_size // (1024 * 1024)}MB')
+
+        if not self.sniffed:
+            self.head += raw_data[:MAGIC_NUMBER_LENGTH - len(self.head)]
+            if len(self.head) >= MAGIC_NUMBER_LENGTH:
+                self.check_type()
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        ## files shorter than the longest magic number
+        if not self.sniffed:
+            self.check_type()
+        return None
+
+
+class LimitedUploadMixin:
+    """
+    APIView mixin installing LimitedUploadHandler ahead of Django's temporary file
+    handler, so uploads go to disk chunk by chunk and never sit in memory.
+    """
+
+    upload_max_size = MAXIMUM_IMAGE_UPLOAD_SIZE
+    upload_allowed_types = ALLOWABLE_IMAGE_TYPES
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [
+            LimitedUploadHandler(request, self.upload_max_size, self.upload_allowed_types),
+            TemporaryFileUploadHandler(request),
+        ]
+        return super().initialize_request(request, *args, **kwargs)
@@ -0,0 +1,122 @@
+import os
+import uuid
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+
+from utils.constants import (ALLOWABLE_IMAGE_TYPES, MAXIMUM_IMAGE_UPLOAD_SIZE,
+                             PRESIGNED_UPLOAD_EXPIRY_SECONDS)
+
+
+UPLOAD_TOKEN_SALT = 'utils.uploads'
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'application/pdf': '.pdf',
+}
+## leading bytes => content type
+MAGIC_NUMBERS = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'%PDF-', 'application/pdf'),
+]
+MAGIC_NUMBER_LENGTH = max(len(magic) for magic, _ in MAGIC_NUMBERS)
+
+
+def sniff_content_type(head: bytes):
+    for magic, content_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+
+def same_content_type(declared: str, sniffed: str) -> bool:
+    aliases = {'image/jpg': 'image/jpeg'}
+    return aliases.get(declared, declared) == aliases.get(sniffed, sniffed)
+
+
+class UploadSlotSerializer(serializers.Serializer):
+    content_type = serializers.ChoiceField(choices=ALLOWABLE_IMAGE_TYPES)
+    size = serializers.IntegerField(min_value=1, max_value=MAXIMUM_IMAGE_UPLOAD_SIZE)
+
+
+class UploadConfirmSerializer(serializers.Serializer):
+    token = serializers.CharField()
+
+
+def presigned_uploads_enabled() -> bool:
+    return settings.FILE_UPLOAD_STORAGE == 's3'
+
+
+def _s3_client():
+    return default_storage.connection.meta.client
+
+
+def create_upload_slot(user, target: str, directory: str, content_type: str, size: int) -> dict:
+    """
+    Presign a single PUT of exactly `size` bytes of `content_type` to a fresh key.
+    The returned token ties the key to the user and target and is required to confirm.
+    """
+    if not presigned_uploads_enabled():
+        raise ParseError('direct uploads require s3 storage, upload the file as multipart instead')
+
+    key = os.path.join(directory, f'{uuid.uuid4().hex}{CONTENT_TYPE_EXTENSIONS[content_type]}')
+    upload_url = _s3_client().generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': default_storage.bucket_name,
+            'Key': key,
+            'ContentType': content_type,
+            'ContentLength': size,
+        },
+        ExpiresIn=PRESIGNED_UPLOAD_EXPIRY_SECONDS,
+        HttpMethod='PUT',
+    )
+    token = signing.dumps(
+        {'key': key, 'user': user.id, 'target': target, 'content_type': content_type, 'size': size},
+        salt=UPLOAD_TOKEN_SALT)
+
+    return {
+        'upload_url': upload_url,
+        'method': 'PUT',
+        'headers': {'Content-Type': content_type, 'Content-Length': str(size)},
+        'token': token,
+        'expires_in': PRESIGNED_UPLOAD_EXPIRY_SECONDS,
+    }
+
+
+def confirm_upload(user, target: str, token: str) -> str:
+    """
+    Check the object the client PUT against what was presigned: size, declared type
+    and the file's magic number. Returns the storage key, bad uploads are deleted.
+    """
+    if not presigned_uploads_enabled():
+        raise ParseError('direct uploads require s3 storage, upload the file as multipart instead')
+
+    try:
+        slot = signing.loads(token, salt=UPLOAD_TOKEN_SALT, max_age=PRESIGNED_UPLOAD_EXPIRY_SECONDS * 2)
+    except signing.BadSignature:
+        raise ParseError('invalid or expired upload token')
+
+    if slot['user'] != user.id or slot['target'] != target:
+        raise ParseError('invalid or expired upload token')
+
+    client, bucket, key = _s3_client(), default_storage.bucket_name, slot['key']
+    try:
+        head = client.head_object(Bucket=bucket, Key=key)
+        first_bytes = client.get_object(
+            Bucket=bucket, Key=key, Range=f'bytes=0-{MAGIC_NUMBER_LENGTH - 1}')['Body'].read()
+    except ClientError:
+        raise ParseError('upload not found, PUT the file to upload_url first')
+
+    sniffed = sniff_content_type(first_bytes)
+    if head['ContentLength'] != slot['size'] or head['ContentLength'] > MAXIMUM_IMAGE_UPLOAD_SIZE \
+            or not sniffed or not same_content_type(slot['content_type'], sniffed):
+        client.delete_object(Bucket=bucket, Key=key)
+        raise ParseError('uploaded file does not match the declared size or type')
+
+    return key